@@ -0,0 +1,381 @@
+"""
+Activity Index - Exercise recognition by nearest neighbours over normalized pose embeddings
+
+Usage:
+    python activity_index.py /data/exercises --output /data/activity_index
+
+The dataset directory holds one subdirectory per exercise label containing
+videos or landmark sidecars (*.landmarks.jsonl). The index is written as .npy
+arrays that are memory-mapped when loaded, so every worker process shares one
+copy through the page cache.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from collections import Counter, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_VERSION = 1
+
+# Shoulders, elbows, wrists, hips, knees and ankles of the MediaPipe skeleton
+EMBEDDING_LANDMARKS = [11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28]
+LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP = 0, 1, 6, 7  # Positions within EMBEDDING_LANDMARKS
+
+DEFAULT_DIMENSIONS = 8
+DEFAULT_LEAF_SIZE = 32
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm'}
+SIDECAR_SUFFIX = '.landmarks.jsonl'
+
+
+def embed_pose(points: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Normalize a pose into a translation, scale and rotation invariant vector.
+
+    The body is centred on the hip midpoint, scaled by torso length and
+    rotated so the torso points straight up.
+
+    Args:
+        points: (len(EMBEDDING_LANDMARKS), 2) pixel coordinates of the embedding landmarks
+
+    Returns:
+        Flattened normalized coordinates, or None for a degenerate pose
+    """
+    hips = (points[LEFT_HIP] + points[RIGHT_HIP]) / 2
+    torso = (points[LEFT_SHOULDER] + points[RIGHT_SHOULDER]) / 2 - hips
+    length = np.hypot(torso[0], torso[1])
+    if length < 1e-6:
+        return None
+
+    # Rotation taking the torso direction onto (0, -1), i.e. up in image coordinates
+    sin, cos = -torso[0] / length, -torso[1] / length
+    rotation = np.array([[cos, -sin], [sin, cos]]) / length
+    return ((points - hips) @ rotation.T).ravel()
+
+
+def embed_landmarks(landmarks: Sequence, width: float, height: float) -> Optional[np.ndarray]:
+    """Embed MediaPipe landmarks (objects with x and y) from a frame of the given size."""
+    points = np.array([[landmarks[i].x * width, landmarks[i].y * height] for i in EMBEDDING_LANDMARKS])
+    return embed_pose(points)
+
+
+def build_kdtree(points: np.ndarray, leaf_size: int = DEFAULT_LEAF_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build a KD-tree as flat arrays.
+
+    Args:
+        points: (N, D) points
+        leaf_size: Maximum points per leaf
+
+    Returns:
+        Tuple of the point order (points[order] is stored contiguously per node),
+        the (M, 5) int32 node table [start, end, left, right, split_dim] with
+        left = right = -1 for leaves, and the (M,) split values
+    """
+    order = np.arange(len(points))
+    nodes = []
+    splits = []
+
+    def build(start: int, end: int) -> int:
+        node = len(nodes)
+        nodes.append([start, end, -1, -1, -1])
+        splits.append(0.0)
+        if end - start <= leaf_size:
+            return node
+
+        subset = points[order[start:end]]
+        dim = int(np.argmax(subset.max(axis=0) - subset.min(axis=0)))
+        middle = (end - start) // 2
+        partition = np.argpartition(subset[:, dim], middle)
+        order[start:end] = order[start:end][partition]
+
+        nodes[node][4] = dim
+        splits[node] = float(points[order[start + middle], dim])
+        left = build(start, start + middle)
+        right = build(start + middle, end)
+        nodes[node][2] = left
+        nodes[node][3] = right
+        return node
+
+    build(0, len(points))
+    return order, np.array(nodes, dtype=np.int32), np.array(splits, dtype=np.float32)
+
+
+class ActivityIndex:
+    """Labelled pose embeddings with PCA projection and a KD-tree for k-NN queries."""
+
+    def __init__(self, labels: List[str], mean: np.ndarray, components: np.ndarray, points: np.ndarray,
+                 point_labels: np.ndarray, nodes: np.ndarray, splits: np.ndarray):
+        self.labels = labels
+        self.mean = mean
+        self.components = components
+        self.points = points
+        self.point_labels = point_labels
+        self.nodes = nodes
+        self.splits = splits
+
+        # The tree is walked node by node in Python, where list access is much
+        # faster than indexing arrays; it is small next to the points
+        self._node_list = nodes.tolist()
+        self._split_list = splits.tolist()
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, labels: Sequence[str], dimensions: int = DEFAULT_DIMENSIONS,
+              leaf_size: int = DEFAULT_LEAF_SIZE) -> 'ActivityIndex':
+        """
+        Build an index from labelled embeddings.
+
+        Args:
+            embeddings: (N, F) pose embeddings from embed_pose
+            labels: Exercise label of each embedding
+            dimensions: PCA dimensions kept for the tree
+            leaf_size: Maximum points per KD-tree leaf
+
+        Returns:
+            The index
+        """
+        names = sorted(set(labels))
+        label_ids = np.array([names.index(label) for label in labels], dtype=np.int16)
+
+        mean = embeddings.mean(axis=0)
+        _, _, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        components = vt[:dimensions]
+        projected = ((embeddings - mean) @ components.T).astype(np.float32)
+
+        order, nodes, splits = build_kdtree(projected, leaf_size)
+        return cls(names, mean.astype(np.float32), components.astype(np.float32),
+                   projected[order], label_ids[order], nodes, splits)
+
+    def save(self, directory: str) -> None:
+        """Write the index as .npy arrays plus a JSON header."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ('mean', 'components', 'points', 'point_labels', 'nodes', 'splits'):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'labels': self.labels, 'size': len(self.points)}, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str) -> 'ActivityIndex':
+        """Memory-map an index written by save()."""
+        with open(os.path.join(directory, 'index.json')) as f:
+            header = json.load(f)
+        if header.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported activity index version: {header.get('version')}")
+
+        # Plain ndarray views of the mappings avoid np.memmap overhead on every slice
+        arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r'))
+                  for name in ('mean', 'components', 'points', 'point_labels', 'nodes', 'splits')}
+        return cls(header['labels'], **arrays)
+
+    def project(self, embedding: np.ndarray) -> np.ndarray:
+        return (embedding - self.mean) @ self.components.T
+
+    def query(self, embedding: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest labelled poses.
+
+        Args:
+            embedding: Pose embedding from embed_pose
+            k: Number of neighbours
+
+        Returns:
+            Tuple of squared distances (ascending) and label ids of the neighbours
+        """
+        target = self.project(embedding).astype(np.float32)
+        coordinates = target.tolist()
+        best_distances = np.full(k, np.inf)
+        best_labels = np.full(k, -1, dtype=np.int64)
+        worst = np.inf
+
+        # Depth-first search, nearer child first, skipping nodes beyond the k-th distance
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound >= worst:
+                continue
+
+            start, end, left, right, dim = self._node_list[node]
+            if left < 0:
+                diff = self.points[start:end] - target
+                distances = np.einsum('ij,ij->i', diff, diff)
+                if distances.min() < worst:
+                    merged = np.concatenate([best_distances, distances])
+                    nearest = np.argsort(merged)[:k]
+                    best_labels = np.concatenate([best_labels, self.point_labels[start:end]])[nearest]
+                    best_distances = merged[nearest]
+                    worst = best_distances[-1]
+                continue
+
+            offset = coordinates[dim] - self._split_list[node]
+            near, far = (left, right) if offset < 0 else (right, left)
+            stack.append((far, max(bound, offset * offset)))
+            stack.append((near, bound))
+
+        return best_distances, best_labels
+
+
+class ActivityRecognizer:
+    """
+    Classifies the exercise being performed from a stream of poses.
+
+    Each frame votes for the label of its nearest neighbours; the activity is
+    the label with most votes over a sliding window, so single misclassified
+    frames do not flip the result.
+    """
+
+    def __init__(self, index: ActivityIndex, k: int = 5, window: int = 30,
+                 min_confidence: float = 0.5, max_distance: float = 0.25):
+        """
+        Initialize the recognizer.
+
+        Args:
+            index: Labelled pose index
+            k: Neighbours per frame
+            window: Frames in the voting window
+            min_confidence: Fraction of window votes needed to report an activity
+            max_distance: Frames whose nearest neighbour is farther than this (in
+                torso lengths) vote for no activity
+        """
+        self.index = index
+        self.k = k
+        self.window = window
+        self.min_confidence = min_confidence
+        self.max_distance_sq = max_distance * max_distance
+        self.votes = {}
+        self.frames_by_activity = Counter()
+
+    def reset(self) -> None:
+        self.votes = {}
+        self.frames_by_activity.clear()
+
+    def update(self, person_id: int, embedding: Optional[np.ndarray]) -> Dict:
+        """
+        Add one frame for a person and return their current activity.
+
+        Args:
+            person_id: Tracked person the pose belongs to
+            embedding: Pose embedding from embed_pose, or None if degenerate
+
+        Returns:
+            Dictionary with the activity label (None if unknown), its confidence
+            and the vote counts in the window
+        """
+        vote = None
+        if embedding is not None:
+            distances, label_ids = self.index.query(embedding, self.k)
+            if distances[0] <= self.max_distance_sq:
+                vote = self.index.labels[Counter(label_ids.tolist()).most_common(1)[0][0]]
+
+        votes = self.votes.get(person_id)
+        if votes is None:
+            votes = self.votes[person_id] = deque(maxlen=self.window)
+        votes.append(vote)
+
+        counts = Counter(label for label in votes if label is not None)
+        activity, confidence = None, 0.0
+        if counts:
+            label, count = counts.most_common(1)[0]
+            if count / len(votes) >= self.min_confidence:
+                activity, confidence = label, count / len(votes)
+
+        self.frames_by_activity[activity] += 1
+        return {
+            'activity': activity,
+            'confidence': confidence,
+            'votes': dict(counts)
+        }
+
+    def get_summary(self) -> Dict:
+        """Frames attributed to each activity over the session."""
+        return {
+            'frames_by_activity': {label if label is not None else 'unknown': count
+                                   for label, count in self.frames_by_activity.items()}
+        }
+
+
+def _embeddings_from_sidecar(sidecar_path: str) -> List[np.ndarray]:
+    from openpose_analyzer import read_sidecar
+
+    header, records = read_sidecar(sidecar_path)
+    size = np.array([header['width'], header['height']], dtype=np.float64)
+    embeddings = []
+    for record in records:
+        points = np.array([record['landmarks'][i][:2] for i in EMBEDDING_LANDMARKS]) * size
+        embedding = embed_pose(points)
+        if embedding is not None:
+            embeddings.append(embedding)
+    return embeddings
+
+
+def build_from_dataset(dataset: str, output: str, dimensions: int = DEFAULT_DIMENSIONS,
+                       leaf_size: int = DEFAULT_LEAF_SIZE, model_complexity: int = 1) -> Dict:
+    """
+    Build and save an index from a directory of labelled recordings.
+
+    Args:
+        dataset: Directory with one subdirectory of videos or sidecars per label
+        output: Directory to write the index to
+        dimensions: PCA dimensions kept for the tree
+        leaf_size: Maximum points per KD-tree leaf
+        model_complexity: MediaPipe model complexity for analyzing videos
+
+    Returns:
+        Number of poses per label
+    """
+    analyzer = None
+    embeddings = []
+    labels = []
+
+    for label in sorted(os.listdir(dataset)):
+        label_dir = os.path.join(dataset, label)
+        if not os.path.isdir(label_dir):
+            continue
+
+        for name in sorted(os.listdir(label_dir)):
+            path = os.path.join(label_dir, name)
+            if name.endswith(SIDECAR_SUFFIX):
+                found = _embeddings_from_sidecar(path)
+            elif '.' in name and name.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS:
+                if analyzer is None:
+                    from openpose_analyzer import OpenPoseAnalyzer
+                    analyzer = OpenPoseAnalyzer(model_complexity=model_complexity, keep_history=False)
+                with tempfile.TemporaryDirectory() as work_dir:
+                    sidecar_path = os.path.join(work_dir, 'poses' + SIDECAR_SUFFIX)
+                    analyzer.analyze_video(path, sidecar_path=sidecar_path)
+                    found = _embeddings_from_sidecar(sidecar_path)
+            else:
+                continue
+
+            embeddings.extend(found)
+            labels.extend([label] * len(found))
+            print(f"{label}: {len(found)} poses from {name}", file=sys.stderr)
+
+    if not embeddings:
+        raise ValueError(f"No labelled poses found in {dataset}")
+
+    index = ActivityIndex.build(np.array(embeddings), labels, dimensions, leaf_size)
+    index.save(output)
+    return dict(Counter(labels))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Build the exercise recognition index')
+    parser.add_argument('dataset', help='Directory with one subdirectory of videos or sidecars per exercise')
+    parser.add_argument('--output', required=True, help='Directory to write the index to')
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_DIMENSIONS, help='PCA dimensions of the index')
+    parser.add_argument('--leaf-size', type=int, default=DEFAULT_LEAF_SIZE)
+    parser.add_argument('--model-complexity', type=int, default=1, choices=[0, 1, 2])
+    args = parser.parse_args(argv)
+
+    counts = build_from_dataset(args.dataset, args.output, args.dimensions, args.leaf_size, args.model_complexity)
+    print(json.dumps(counts, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,17 +8,40 @@ import cv2
 import numpy as np
 import base64
 import os
+import re
 import tempfile
 import time
 import threading
+import uuid
+from collections import deque
+from datetime import datetime
 from werkzeug.utils import secure_filename
 from openpose_analyzer import OpenPoseAnalyzer
+from activity_index import ActivityIndex, ActivityRecognizer
+from frame_ring import FrameWorkerPool
+from frame_sources import open_frame_source
+from hls_writer import find_h264_encoder
+from motion_gate import MotionGate
+from pose_backends import create_backend
+from progress_store import ProgressStore
+from motion_templates import DEFAULT_JOINTS, TemplateLibrary
+import telemetry
+from serving import FrameBroadcaster, is_cooperative, offload, start_background
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Initialize OpenPose Analyzer
-analyzer = OpenPoseAnalyzer(model_complexity=1)
+# OpenPose Analyzer, created per worker process by init_worker() so the
+# MediaPipe graph is never built in a pre-fork master and shared across forks
+analyzer = None
+analyzer_lock = threading.Lock()
+analyzer_ready = threading.Event()
+
+# Longitudinal store of session summaries and reps, opened per worker process
+progress_store = None
+
+# Patient and exercise of the live session, given to /api/start_analysis
+live_session = {}
 
 # Global variables for webcam streaming
 webcam = None
@@ -26,60 +49,303 @@ webcam_lock = threading.Lock()
 is_streaming = False
 stream_thread = None
 
+# One capture loop reads and analyzes the webcam; every viewer of
+# /api/webcam_stream receives its latest JPEG from the broadcaster
+stream = FrameBroadcaster()
+stream_lock = threading.Lock()
+stream_viewers = 0
+
 # Temporary directory for uploaded videos
 UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'openpose_analyzer')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Default output for uploaded videos: 'video' re-encodes an annotated MP4,
+# 'hls' writes annotated HLS segments that are playable while processing, and
+# 'sidecar' keeps the original and writes per-frame landmarks for the frontend
+app.config['VIDEO_OUTPUT_MODE'] = os.environ.get('OPENPOSE_VIDEO_OUTPUT', 'video')
+
+# Whether the analyzer keeps per-frame results for /api/export_results. Set
+# OPENPOSE_KEEP_HISTORY=0 for long live sessions; summaries come from constant-
+# memory running statistics either way.
+app.config['KEEP_HISTORY'] = os.environ.get('OPENPOSE_KEEP_HISTORY', '1').lower() not in ('0', 'false', 'no')
+
+# Reference motions that every rep is compared against
+app.config['TEMPLATE_FOLDER'] = os.environ.get('OPENPOSE_TEMPLATES', os.path.join(UPLOAD_FOLDER, 'templates'))
+
+# Exercise recognition index built with activity_index.py; recognition is off if unset
+app.config['ACTIVITY_INDEX'] = os.environ.get('OPENPOSE_ACTIVITY_INDEX')
+
+# Analyzer processes that webcam frames and uploaded videos are handed to through
+# shared memory; 0 analyzes in the worker process itself
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('OPENPOSE_INFERENCE_WORKERS', '0'))
+
+# Source of the live stream: a camera index, or a recorded video replayed as if
+# it were live at OPENPOSE_REPLAY_SPEED (0 = as fast as possible). Set
+# OPENPOSE_RECORD_PATH to record the live frames for later replay.
+app.config['FRAME_SOURCE'] = os.environ.get('OPENPOSE_FRAME_SOURCE', '0')
+app.config['REPLAY_SPEED'] = float(os.environ.get('OPENPOSE_REPLAY_SPEED', '1.0'))
+app.config['RECORD_PATH'] = os.environ.get('OPENPOSE_RECORD_PATH')
+
+# Persistent data directory, kept apart from UPLOAD_FOLDER: that is temporary
+# and its files can be fetched through /api/download_results
+DATA_FOLDER = os.environ.get('OPENPOSE_DATA_DIR', os.path.join(os.path.expanduser('~'), '.openpose_analyzer'))
+
+# SQLite database of analyzed sessions per patient. Sessions are stored when
+# a patient_id is given to /api/start_analysis or /api/upload_video.
+app.config['PROGRESS_DB'] = os.environ.get('OPENPOSE_PROGRESS_DB', os.path.join(DATA_FOLDER, 'progress.sqlite3'))
+
+# Pose backend for uploaded videos (see pose_backends.py): 'mediapipe' runs the
+# analyzer's own graph, 'onnx' runs batched inference with ONNX Runtime
+app.config['POSE_BACKEND'] = os.environ.get('OPENPOSE_POSE_BACKEND', 'mediapipe')
+app.config['ONNX_MODEL'] = os.environ.get('OPENPOSE_ONNX_MODEL')
+app.config['ONNX_BATCH_SIZE'] = int(os.environ.get('OPENPOSE_ONNX_BATCH_SIZE', '8'))
+app.config['ONNX_THREADS'] = int(os.environ.get('OPENPOSE_ONNX_THREADS', '0'))
+
+# Skip pose inference on live frames where nothing moved, reusing the previous
+# result for at most OPENPOSE_MOTION_GATE_MAX_STALE frames in a row. Applies to
+# in-process analysis (OPENPOSE_INFERENCE_WORKERS=0).
+app.config['MOTION_GATE'] = os.environ.get('OPENPOSE_MOTION_GATE', '0').lower() in ('1', 'true', 'yes')
+app.config['MOTION_GATE_MAX_STALE'] = int(os.environ.get('OPENPOSE_MOTION_GATE_MAX_STALE', '10'))
+
+# Sidecar videos currently being rendered on demand
+render_jobs = set()
+render_jobs_lock = threading.Lock()
+
+def open_progress_store(path):
+    """
+    Open the progress database, creating its directory if needed.
+
+    Raises:
+        RuntimeError: If the database is inside UPLOAD_FOLDER, where the
+            download routes would serve it
+    """
+    upload_folder = os.path.realpath(app.config['UPLOAD_FOLDER'])
+    db_path = os.path.realpath(path)
+    if os.path.commonpath([upload_folder, db_path]) == upload_folder:
+        raise RuntimeError(f"OPENPOSE_PROGRESS_DB must be outside the upload folder {upload_folder}")
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    return ProgressStore(db_path)
+
+def init_worker(background=False):
+    """
+    Create the analyzer in this process and warm up its pose model.
+
+    Call once per worker after forking (see gunicorn.conf.py). With
+    background=True the warmup runs in a daemon thread and /api/ready reports
+    not ready until it finishes.
+    """
+    def warm_up():
+        global analyzer, progress_store
+
+        with analyzer_lock:
+            if analyzer is None:
+                instance = OpenPoseAnalyzer(model_complexity=1, keep_history=app.config['KEEP_HISTORY'])
+                instance.set_template_library(TemplateLibrary(app.config['TEMPLATE_FOLDER']))
+                if app.config['ACTIVITY_INDEX']:
+                    # Memory-mapped, so all workers share one copy of the index
+                    index = ActivityIndex.load(app.config['ACTIVITY_INDEX'])
+                    instance.set_activity_recognizer(ActivityRecognizer(index))
+                if app.config['MOTION_GATE']:
+                    instance.set_motion_gate(MotionGate(max_stale_frames=app.config['MOTION_GATE_MAX_STALE']))
+                instance.warmup()
+                progress_store = open_progress_store(app.config['PROGRESS_DB'])
+                if app.config['VIDEO_OUTPUT_MODE'] == 'hls' and find_h264_encoder() is None:
+                    raise RuntimeError("OPENPOSE_VIDEO_OUTPUT=hls needs an H.264 encoder: install "
+                                       "imageio-ffmpeg or ffmpeg with libx264, or set OPENPOSE_FFMPEG")
+                if app.config['POSE_BACKEND'] != 'mediapipe':
+                    # Fail at startup on a bad configuration and build the shared session
+                    pose_backend(app.config['POSE_BACKEND']).load()
+                analyzer = instance
+        analyzer_ready.set()
+
+    if background:
+        threading.Thread(target=warm_up, daemon=True).start()
+    else:
+        warm_up()
+
+def pose_backend(name):
+    """Create a pose backend for one video job; ONNX sessions are shared per process."""
+    return create_backend(name, app.config['ONNX_MODEL'], app.config['ONNX_BATCH_SIZE'],
+                          app.config['ONNX_THREADS'])
+
+@app.before_request
+def ensure_analyzer():
+    """Fall back to building the analyzer on demand if no worker hook ran."""
+    if analyzer is None and request.endpoint not in ('ready', 'metrics'):
+        init_worker()
+
+def parse_time(value):
+    """Parse an epoch-seconds or ISO 8601 time parameter; None stays None."""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+def store_session(patient_id, summary, reps, started_at=None, exercise=None, source=None):
+    """Add a finished session to the progress store; returns its id."""
+    return progress_store.add_session(patient_id, summary, reps, started_at=started_at,
+                                      exercise=exercise, source=source)
+
+ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm'}
+
+# Ids issued by upload_video: a random hex name with the upload's extension
+VIDEO_ID_PATTERN = re.compile(r'[0-9a-f]{32}\.(?:' + '|'.join(sorted(ALLOWED_EXTENSIONS)) + ')')
+
 def allowed_file(filename):
     """Check if the file extension is allowed."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'mp4', 'avi', 'mov', 'webm'}
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def encode_frame(frame):
-    """Encode a frame to base64 for sending over HTTP."""
-    _, buffer = cv2.imencode('.jpg', frame)
-    return base64.b64encode(buffer).decode('utf-8')
+def is_video_id(video_id):
+    """Check that a video id has the form upload_video issues, so routes never serve other files."""
+    return VIDEO_ID_PATTERN.fullmatch(video_id) is not None
 
-def webcam_stream():
-    """Generator function for webcam streaming."""
-    global webcam, is_streaming
+def video_not_found():
+    """404 response for an unknown video id."""
+    return jsonify({
+        'status': 'error',
+        'message': 'Video not found'
+    }), 404
 
-    if webcam is None:
+def encode_frame(frame):
+    """Encode a frame to base64 for sending over HTTP."""
+    return base64.b64encode(encode_jpeg(frame)).decode('utf-8')
+
+def encode_jpeg(frame):
+    """Encode a frame as JPEG bytes."""
+    with telemetry.ENCODE_SECONDS.time():
+        _, buffer = cv2.imencode('.jpg', frame)
+    return buffer.tobytes()
+
+def multipart_frame(jpeg, timestamp):
+    """
+    One part of the MJPEG stream, built once and shared by every viewer.
+
+    X-Sequence and X-Timestamp (capture time, epoch seconds) let clients such
+    as loadgen.py measure dropped frames and latency; browsers ignore them.
+    """
+    header = (f"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n"
+              f"X-Sequence: {stream.sequence + 1}\r\nX-Timestamp: {timestamp:.6f}\r\n\r\n")
+    return header.encode() + jpeg + b'\r\n'
+
+def broadcast(frame, captured_at):
+    """Encode a frame and publish it to every stream viewer."""
+    stream.publish(multipart_frame(offload(encode_jpeg, frame), captured_at), captured_at)
+
+def publish_results(pool, capture_times, height, width, block=False):
+    """Fold finished pool results into the session and broadcast their frames in order."""
+    result = offload(pool.next_result) if block else pool.next_result(block=False)
+    while result is not None:
+        analyzer.ingest_frame_result(result, width, height)
+        broadcast(result['frame'], capture_times.popleft())
+        pool.release(result['slot'])
+        result = pool.next_result(block=False)
+
+def capture_loop():
+    """Read, analyze and encode webcam frames for all stream viewers."""
+    global webcam
+
+    workers = app.config['INFERENCE_WORKERS']
+    pool = None
+    capture_times = deque()
+    # In-process frames are decoded into, annotated in and encoded from one
+    # buffer; viewers only ever receive the encoded JPEG
+    frame_buffer = None
+    try:
         with webcam_lock:
-            webcam = cv2.VideoCapture(0)
+            if webcam is None:
+                webcam = offload(open_frame_source, app.config['FRAME_SOURCE'],
+                                 app.config['REPLAY_SPEED'], app.config['RECORD_PATH'])
 
-    try:
-        while is_streaming:
+        while is_streaming and stream_viewers > 0:
+            slot = None
             with webcam_lock:
-                if not webcam.isOpened():
+                if webcam is None or not webcam.isOpened():
                     break
-
-                success, frame = webcam.read()
+                paced = getattr(webcam, 'paced', False)
+
+                if pool is not None and analyzer.is_analyzing:
+                    # Decode straight into a shared-memory slot of the worker pool
+                    slot = pool.acquire()
+                    success, frame = offload(webcam.read, pool.frame(slot))
+                else:
+                    success, frame = offload(webcam.read, frame_buffer)
+                    if success:
+                        frame_buffer = frame
+                captured_at = time.time()
                 if not success:
+                    if slot is not None:
+                        pool.release(slot)
+                    telemetry.FRAMES_DROPPED.labels('webcam').inc()
                     break
 
+            if workers and pool is None:
+                # Workers warm up while the stream is shown unanalyzed
+                pool = offload(FrameWorkerPool, frame.shape, analyzer.angle_joints, workers)
+
+            height, width = frame.shape[:2]
+            if slot is not None:
+                pool.submit(slot, captured_at - analyzer.start_time)
+                capture_times.append(captured_at)
+                # Keep one frame per worker in flight, so a slot is always free
+                publish_results(pool, capture_times, height, width, block=pool.pending > workers)
+            elif pool is not None and pool.pending:
+                # Analysis stopped; flush frames still in the pool
+                while pool.pending:
+                    publish_results(pool, capture_times, height, width, block=True)
+            else:
                 # Analyze the frame if analysis is active
                 if analyzer.is_analyzing:
-                    frame, joint_angles, accuracy = analyzer.analyze_frame(frame)
+                    frame, joint_angles, accuracy = offload(analyzer.analyze_frame, frame, in_place=True)
 
-            # Encode the frame
-            encoded_frame = encode_frame(frame)
+                broadcast(frame, captured_at)
 
-            # Yield the frame in multipart format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' +
-                   base64.b64decode(encoded_frame) + b'\r\n')
-
-            # Control the frame rate
-            time.sleep(0.03)  # ~30 FPS
+            # Control the frame rate, unless the source paces itself
+            if not paced:
+                time.sleep(0.03)  # ~30 FPS
 
     finally:
+        stream.close()
+
         # Clean up resources
+        if pool is not None:
+            offload(pool.close)
         with webcam_lock:
             if webcam is not None and webcam.isOpened():
                 webcam.release()
                 webcam = None
 
+def webcam_stream():
+    """Generator yielding the broadcast webcam frames to one viewer."""
+    global stream_thread, stream_viewers
+
+    with stream_lock:
+        stream_viewers += 1
+        if stream_thread is None or not stream_thread.is_alive():
+            stream.open()
+            stream_thread = threading.Thread(target=capture_loop, daemon=True)
+            stream_thread.start()
+
+    telemetry.ACTIVE_STREAMS.inc()
+    try:
+        sequence = 0
+        while is_streaming and not stream.closed:
+            sequence, part = stream.wait(sequence, timeout=1.0)
+            if part is None:
+                continue
+
+            # Each published frame is already a complete multipart part
+            yield part
+            telemetry.STREAM_FRAMES.inc()
+
+    finally:
+        telemetry.ACTIVE_STREAMS.dec()
+        with stream_lock:
+            stream_viewers -= 1
+
 @app.route('/api/start_webcam', methods=['POST'])
 def start_webcam():
     """Start the webcam stream."""
@@ -123,8 +389,24 @@ def get_webcam_stream():
 
 @app.route('/api/start_analysis', methods=['POST'])
 def start_analysis():
-    """Start pose analysis."""
-    analyzer.start_analysis()
+    """Start pose analysis, optionally choosing the joint used for rep counting."""
+    options = request.get_json(silent=True) or {}
+
+    try:
+        analyzer.start_analysis(primary_joint=options.get('primary_joint'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    # Remember who the session is for, so stop_analysis can store it
+    live_session.clear()
+    live_session.update({
+        'patient_id': options.get('patient_id'),
+        'exercise': options.get('exercise'),
+        'started_at': time.time()
+    })
 
     return jsonify({
         'status': 'success',
@@ -139,15 +421,38 @@ def stop_analysis():
     # Get analysis summary
     summary = analyzer.get_analysis_summary()
 
+    session_id = None
+    if live_session.get('patient_id') and analyzer.frame_count:
+        session_id = store_session(live_session['patient_id'], summary, analyzer.completed_reps,
+                                   live_session['started_at'], live_session['exercise'], 'live')
+    live_session.clear()
+
     return jsonify({
         'status': 'success',
         'message': 'Pose analysis stopped',
-        'summary': summary
+        'summary': summary,
+        'session_id': session_id
     })
 
 @app.route('/api/get_feedback', methods=['GET'])
 def get_feedback():
-    """Get current posture feedback."""
+    """
+    Get current posture feedback.
+
+    With ?after=<sequence>, long-polls until a webcam frame newer than that
+    sequence has been processed (up to ?timeout= seconds, default 25).
+    """
+    if 'after' in request.args:
+        try:
+            after = int(request.args['after'])
+            timeout = min(float(request.args.get('timeout', 25)), 60)
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': 'after and timeout must be numbers'
+            }), 400
+        stream.wait(after, timeout)
+
     # Extract messages from feedback objects
     feedback_messages = [item['message'] for item in analyzer.posture_feedback] if analyzer.posture_feedback else []
 
@@ -210,7 +515,13 @@ def get_feedback():
         'feedback': feedback_messages,
         'accuracy': analyzer.current_accuracy,
         'joint_angles': analyzer.joint_angles,
+        'joint_angles_3d': analyzer.joint_angles_3d.get(analyzer.current_person_id, {}),
         'confidence_scores': confidence_scores,
+        'repetitions': analyzer.rep_counter.get_state(),
+        'template_match': analyzer.template_match,
+        'activity': analyzer.activity_recognition.get(analyzer.current_person_id),
+        'sequence': stream.sequence,
+        'captured_at': stream.timestamp,
         'timestamp': time.time()
     })
 
@@ -237,48 +548,211 @@ def upload_video():
             'message': 'File type not allowed. Please upload MP4, AVI, MOV, or WEBM files.'
         }), 400
 
-    # Save the uploaded file
+    output_mode = request.form.get('output', app.config['VIDEO_OUTPUT_MODE'])
+    if output_mode not in ('video', 'hls', 'sidecar'):
+        return jsonify({
+            'status': 'error',
+            'message': "Output must be 'video', 'hls' or 'sidecar'."
+        }), 400
+
+    # HLS segments only play in browsers as H.264
+    if output_mode == 'hls' and find_h264_encoder() is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'HLS output needs an H.264 encoder: install imageio-ffmpeg or ffmpeg with libx264, '
+                       'or set OPENPOSE_FFMPEG'
+        }), 400
+
+    # Optionally store the result in the patient's progress history
+    patient_id = request.form.get('patient_id')
+    exercise = request.form.get('exercise')
+    try:
+        recorded_at = parse_time(request.form.get('recorded_at'))
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': 'recorded_at must be epoch seconds or an ISO 8601 time'
+        }), 400
+
+    # Save the uploaded file under a random id; the client's name is only kept
+    # as the session source
     filename = secure_filename(video_file.filename)
-    timestamp = int(time.time())
-    video_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{timestamp}_{filename}")
+    video_id = f"{uuid.uuid4().hex}.{video_file.filename.rsplit('.', 1)[1].lower()}"
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_id)
     video_file.save(video_path)
 
-    # Prepare output path
-    output_filename = f"analyzed_{timestamp}_{filename}"
+    # Prepare output paths
+    output_filename = f"analyzed_{video_id}"
     output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
+    sidecar_filename = f"{video_id}.landmarks.jsonl"
+    sidecar_path = os.path.join(app.config['UPLOAD_FOLDER'], sidecar_filename)
+    playlist_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{output_filename}_hls", 'index.m3u8')
+
+    workers = max(app.config['INFERENCE_WORKERS'], 1)
+    if is_cooperative():
+        # Under gevent the pool's queue feeder threads are greenlets, which never
+        # run on the native thread a background job uses, so the job would hang
+        workers = 1
+    backend = None
+    if app.config['POSE_BACKEND'] != 'mediapipe':
+        # Batched inference instead of the worker pool; each job tracks its own crop
+        backend = pose_backend(app.config['POSE_BACKEND'])
+        workers = 1
 
     # Analyze the video in a separate thread to avoid blocking
     def analyze_video_task():
+        telemetry.ACTIVE_VIDEO_JOBS.inc()
+        job_start = time.time()
         try:
-            summary = analyzer.analyze_video(video_path, output_path)
-            # Clean up the original video file
-            if os.path.exists(video_path):
-                os.remove(video_path)
+            if output_mode == 'sidecar':
+                # Keep the original; the frontend plays it under the landmark overlay
+                summary = analyzer.analyze_video(video_path, sidecar_path=sidecar_path, workers=workers, backend=backend)
+            else:
+                if output_mode == 'hls':
+                    summary = analyzer.analyze_video(video_path, playlist_path, workers=workers, backend=backend)
+                else:
+                    # Only expose the MP4 once it is finalized and playable
+                    partial_path = f"{output_path}.part.mp4"
+                    summary = analyzer.analyze_video(video_path, partial_path, workers=workers, backend=backend)
+                    os.replace(partial_path, output_path)
+                # Clean up the original video file
+                if os.path.exists(video_path):
+                    os.remove(video_path)
+            # The job's own reps: the shared analyzer's may already belong to
+            # another session
+            reps = summary.pop('completed_reps')
+            if patient_id:
+                store_session(patient_id, summary, reps,
+                              recorded_at if recorded_at is not None else job_start, exercise, filename)
+            telemetry.VIDEO_JOBS.labels('completed').inc()
         except Exception as e:
+            telemetry.VIDEO_JOBS.labels('failed').inc()
             print(f"Error analyzing video: {e}")
+        finally:
+            telemetry.ACTIVE_VIDEO_JOBS.dec()
+            telemetry.VIDEO_JOB_SECONDS.observe(time.time() - job_start)
 
-    threading.Thread(target=analyze_video_task).start()
+    start_background(analyze_video_task)
 
     return jsonify({
         'status': 'success',
         'message': 'Video uploaded and analysis started',
-        'video_id': f"{timestamp}_{filename}",
-        'output_video': output_filename
+        'video_id': video_id,
+        'output_mode': output_mode,
+        'output_video': output_filename,
+        'playlist': f"/api/video_hls/{video_id}/index.m3u8" if output_mode == 'hls' else None,
+        'sidecar': sidecar_filename if output_mode == 'sidecar' else None
     })
 
+def start_sidecar_render(video_id, video_path, sidecar_path, output_path):
+    """Render the annotated video from its sidecar in the background, once."""
+    with render_jobs_lock:
+        if video_id in render_jobs:
+            return
+        render_jobs.add(video_id)
+
+    def render_task():
+        partial_path = f"{output_path}.part.mp4"
+        try:
+            # Rendering only draws, so a private analyzer avoids touching shared state
+            OpenPoseAnalyzer().render_sidecar(video_path, sidecar_path, partial_path)
+            os.replace(partial_path, output_path)
+        except Exception as e:
+            print(f"Error rendering video: {e}")
+        finally:
+            with render_jobs_lock:
+                render_jobs.discard(video_id)
+
+    start_background(render_task)
+
 @app.route('/api/video_result/<video_id>', methods=['GET'])
 def get_video_result(video_id):
-    """Get the analyzed video result."""
+    """Get the analyzed video result, rendering it from the sidecar on first request."""
+    if not is_video_id(video_id):
+        return video_not_found()
+
     output_filename = f"analyzed_{video_id}"
     output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
 
     if not os.path.exists(output_path):
+        video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_id)
+        sidecar_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{video_id}.landmarks.jsonl")
+        playlist_path = os.path.join(app.config['UPLOAD_FOLDER'], f"analyzed_{video_id}_hls", 'index.m3u8')
+
+        if os.path.exists(playlist_path):
+            with open(playlist_path) as f:
+                completed = '#EXT-X-ENDLIST' in f.read()
+            return jsonify({
+                'status': 'completed' if completed else 'pending',
+                'message': 'Annotated video is available as HLS' if completed
+                           else 'Video analysis is in progress; completed segments are playable',
+                'playlist': f"/api/video_hls/{video_id}/index.m3u8"
+            })
+
+        if os.path.exists(sidecar_path) and os.path.exists(video_path):
+            start_sidecar_render(video_id, video_path, sidecar_path, output_path)
+            return jsonify({
+                'status': 'pending',
+                'message': 'Rendering annotated video from landmarks'
+            })
+
         return jsonify({
             'status': 'pending',
             'message': 'Video analysis is still in progress'
         })
 
-    return send_file(output_path, mimetype='video/mp4')
+    # Conditional responses support Range requests, so players can seek without a full download
+    return send_file(output_path, mimetype='video/mp4', conditional=True, max_age=3600)
+
+@app.route('/api/video_hls/<video_id>/<filename>', methods=['GET'])
+def get_video_hls(video_id, filename):
+    """Get the HLS playlist or one of its segments for a video being analyzed."""
+    if not is_video_id(video_id):
+        return video_not_found()
+
+    filename = secure_filename(filename)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"analyzed_{video_id}_hls", filename)
+
+    if not os.path.exists(file_path):
+        return jsonify({
+            'status': 'error',
+            'message': 'File not found'
+        }), 404
+
+    if filename.endswith('.m3u8'):
+        # The playlist grows while processing; clients revalidate with the ETag
+        return send_file(file_path, mimetype='application/vnd.apple.mpegurl', conditional=True, max_age=0)
+
+    # Completed segments never change
+    return send_file(file_path, mimetype='video/mp2t', conditional=True, max_age=86400)
+
+@app.route('/api/video_sidecar/<video_id>', methods=['GET'])
+def get_video_sidecar(video_id):
+    """Get the per-frame landmark sidecar (JSON Lines) for a video."""
+    if not is_video_id(video_id):
+        return video_not_found()
+
+    sidecar_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{video_id}.landmarks.jsonl")
+
+    if not os.path.exists(sidecar_path):
+        return jsonify({
+            'status': 'pending',
+            'message': 'Video analysis is still in progress'
+        })
+
+    return send_file(sidecar_path, mimetype='application/x-ndjson', conditional=True)
+
+@app.route('/api/video_source/<video_id>', methods=['GET'])
+def get_video_source(video_id):
+    """Get the original uploaded video of a sidecar analysis."""
+    if not is_video_id(video_id):
+        return video_not_found()
+
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_id)
+    if not os.path.exists(video_path):
+        return video_not_found()
+
+    return send_file(video_path, conditional=True)
 
 @app.route('/api/export_results', methods=['POST'])
 def export_results():
@@ -317,5 +791,227 @@ def download_results(filename):
 
     return send_file(file_path, mimetype=mime_type, as_attachment=True)
 
+@app.route('/api/templates', methods=['GET'])
+def list_templates():
+    """List the reference motions in the template library."""
+    library = analyzer.template_matcher.library
+    library.refresh()
+
+    return jsonify({
+        'status': 'success',
+        'templates': library.list_templates()
+    })
+
+@app.route('/api/templates', methods=['POST'])
+def create_template():
+    """Save the current session as a reference motion, one template per rep."""
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({
+            'status': 'error',
+            'message': 'Template name is required'
+        }), 400
+
+    try:
+        templates = analyzer.template_matcher.library.create_from_history(
+            name, analyzer.results_history, data.get('joints', DEFAULT_JOINTS),
+            analyzer.rep_counter.primary_joint, data.get('source'))
+    except (KeyError, ValueError) as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'message': f'Saved {len(templates)} template(s) for {name}',
+        'templates': [template.template_id for template in templates]
+    })
+
+@app.route('/api/match_templates', methods=['POST'])
+def match_templates():
+    """Compare every rep of the recorded session against the template library."""
+    try:
+        matches = analyzer.match_templates()
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'matches': matches
+    })
+
+@app.route('/api/patients/<patient_id>/sessions', methods=['GET'])
+def list_patient_sessions(patient_id):
+    """List a patient's sessions, newest first, optionally within ?start=&end=."""
+    try:
+        sessions = progress_store.list_sessions(patient_id, parse_time(request.args.get('start')),
+                                                parse_time(request.args.get('end')),
+                                                int(request.args.get('limit', 100)))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'sessions': sessions
+    })
+
+@app.route('/api/patients/<patient_id>/sessions', methods=['POST'])
+def add_patient_session(patient_id):
+    """Import a session summary, e.g. from batch analysis, into the patient's history."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('summary'), dict):
+        return jsonify({
+            'status': 'error',
+            'message': 'A session summary is required'
+        }), 400
+
+    try:
+        session_id = store_session(patient_id, data['summary'], data.get('reps'),
+                                   parse_time(data.get('started_at')), data.get('exercise'),
+                                   data.get('source'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'session_id': session_id
+    })
+
+@app.route('/api/patients/<patient_id>/trend', methods=['GET'])
+def patient_trend(patient_id):
+    """
+    Trend of a per-session statistic, e.g. ?metric=left_knee&field=rom&bucket=week.
+
+    metric is a joint or metric name from the summary statistics, or 'session'
+    with field one of duration, frame_count, accuracy, reps, sets or avg_rom.
+    bucket is day, week, month, year or none.
+    """
+    metric = request.args.get('metric')
+    if not metric:
+        return jsonify({
+            'status': 'error',
+            'message': 'metric is required'
+        }), 400
+
+    bucket = request.args.get('bucket', 'week')
+    try:
+        points = progress_store.trend(patient_id, metric, request.args.get('field', 'mean'),
+                                      None if bucket == 'none' else bucket,
+                                      parse_time(request.args.get('start')), parse_time(request.args.get('end')))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'trend': points
+    })
+
+@app.route('/api/patients/<patient_id>/rep_trend', methods=['GET'])
+def patient_rep_trend(patient_id):
+    """Trend of a per-rep value, e.g. ?field=rom&bucket=week&joint=left_knee."""
+    bucket = request.args.get('bucket', 'week')
+    try:
+        points = progress_store.rep_trend(patient_id, request.args.get('field', 'rom'),
+                                          None if bucket == 'none' else bucket,
+                                          parse_time(request.args.get('start')),
+                                          parse_time(request.args.get('end')),
+                                          request.args.get('joint'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'trend': points
+    })
+
+@app.route('/api/patients/<patient_id>/progress', methods=['GET'])
+def patient_progress(patient_id):
+    """Totals and averages over a patient's sessions, optionally within ?start=&end=."""
+    try:
+        progress = progress_store.aggregate(patient_id, parse_time(request.args.get('start')),
+                                            parse_time(request.args.get('end')))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'progress': progress
+    })
+
+@app.route('/api/sessions/<int:session_id>', methods=['GET'])
+def get_session(session_id):
+    """A stored session with its full summary."""
+    session = progress_store.get_session(session_id)
+    if session is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Session not found'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'session': session
+    })
+
+@app.route('/api/sessions/<int:session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Delete a stored session and its reps."""
+    if not progress_store.delete_session(session_id):
+        return jsonify({
+            'status': 'error',
+            'message': 'Session not found'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'message': 'Session deleted'
+    })
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Report whether this worker has finished warming up its pose model."""
+    if not analyzer_ready.is_set():
+        return jsonify({
+            'status': 'warming_up',
+            'message': 'Pose model is still loading'
+        }), 503
+
+    return jsonify({
+        'status': 'ready',
+        'message': 'Pose model loaded and warmed up'
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose analyzer and API metrics in the Prometheus text format."""
+    if not telemetry.REGISTRY.enabled:
+        return jsonify({
+            'status': 'error',
+            'message': 'Metrics are disabled (OPENPOSE_METRICS=0)'
+        }), 404
+
+    return Response(telemetry.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
+    init_worker(background=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,268 @@
+"""
+Batch Analyzer - Headless re-processing of video archives across a process pool
+
+Usage:
+    python batch_analyzer.py /data/videos --output /data/analysis --workers 8
+    python batch_analyzer.py videos.txt --output /data/analysis --sidecar
+    python batch_analyzer.py /data/videos --output /data/analysis --pose-backend onnx --onnx-model pose.onnx
+
+The input is a directory (searched recursively) or a manifest listing one video
+path per line. Progress is appended to <output>/manifest.jsonl; re-running the
+same command skips videos that already finished, so interrupted runs resume.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm'}
+MANIFEST_NAME = 'manifest.jsonl'
+
+# One analyzer and pose backend per worker process, created by _init_worker
+_worker_analyzer = None
+_worker_backend = None
+
+
+def find_videos(source: str) -> List[Tuple[str, str]]:
+    """
+    List the videos to process.
+
+    Args:
+        source: Directory to search recursively, or a text file with one path per line
+
+    Returns:
+        List of (video path, output subdirectory name) pairs
+    """
+    videos = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if '.' in name and name.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    relative = os.path.splitext(os.path.relpath(path, source))[0]
+                    videos.append((path, relative))
+    else:
+        with open(source) as f:
+            for line in f:
+                path = line.strip()
+                if not path or path.startswith('#'):
+                    continue
+                # Paths from a manifest may share a file name; keep their outputs apart
+                digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+                stem = os.path.splitext(os.path.basename(path))[0]
+                videos.append((path, f"{stem}_{digest}"))
+
+    return sorted(videos)
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Dict]:
+    """Read the progress manifest, keeping the latest entry per video."""
+    entries = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+                entries[entry['video']] = entry
+    return entries
+
+
+def is_done(entry: Optional[Dict], video_path: str) -> bool:
+    """Whether a manifest entry marks the video as processed in its current state."""
+    if not entry or entry.get('status') != 'done':
+        return False
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        # Gone or unreadable since; the worker records why
+        return False
+    return entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime
+
+
+def _init_worker(model_complexity: int, backend_options: Optional[Dict] = None) -> None:
+    """Create and warm up this worker's analyzer and, if configured, its pose backend."""
+    global _worker_analyzer, _worker_backend
+
+    import cv2
+    from openpose_analyzer import OpenPoseAnalyzer
+    from pose_backends import create_backend
+
+    # Parallelism comes from the pool; keep OpenCV from oversubscribing cores
+    cv2.setNumThreads(1)
+
+    _worker_analyzer = OpenPoseAnalyzer(model_complexity=model_complexity)
+    _worker_analyzer.warmup()
+    if backend_options:
+        _worker_backend = create_backend(model_complexity=model_complexity, **backend_options)
+        _worker_backend.load()
+
+
+def _analyze_one(video_path: str, output_dir: str, options: Dict) -> Dict:
+    """Analyze one video in a worker and write its outputs."""
+    entry = {
+        'video': video_path,
+        'output_dir': output_dir,
+        'pid': os.getpid()
+    }
+    start = time.time()
+
+    try:
+        stat = os.stat(video_path)
+        entry.update({'size': stat.st_size, 'mtime': stat.st_mtime})
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, 'analyzed.mp4') if options['video'] else None
+        sidecar_path = os.path.join(output_dir, 'landmarks.jsonl') if options['sidecar'] else None
+
+        # analyze_video reports progress with print(); keep worker output quiet
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            summary = _worker_analyzer.analyze_video(video_path, output_path, sidecar_path,
+                                                     backend=_worker_backend)
+            exports = [_worker_analyzer.export_results(output_dir, format_type)
+                       for format_type in options['formats'] if _worker_analyzer.results_history]
+
+        with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        entry.update({
+            'status': 'done',
+            'frames': summary['frames_processed'],
+            'detections': summary['frame_count'],
+            'outputs': [os.path.basename(path) for path in exports]
+        })
+    except Exception as e:
+        entry.update({'status': 'failed', 'error': str(e)})
+
+    entry['seconds'] = time.time() - start
+    return entry
+
+
+def run_batch(source: str, output_root: str, workers: int, model_complexity: int = 1,
+              formats: Tuple[str, ...] = ('json',), video: bool = False, sidecar: bool = False,
+              retry_failed: bool = False, backend_options: Optional[Dict] = None) -> Dict:
+    """
+    Analyze every video from a directory or manifest across a process pool.
+
+    Args:
+        source: Input directory or manifest file
+        output_root: Directory for per-video outputs and the progress manifest
+        workers: Number of worker processes
+        model_complexity: MediaPipe model complexity for every worker
+        formats: Export formats written per video ('json' and/or 'csv')
+        video: Also write an annotated video per input
+        sidecar: Also write a landmark sidecar per input
+        retry_failed: Retry videos recorded as failed in the manifest
+        backend_options: Arguments for pose_backends.create_backend() (name,
+            model_path, batch_size, intra_op_threads); None uses the analyzer's
+            own MediaPipe graph
+
+    Returns:
+        Aggregate statistics for the run
+    """
+    os.makedirs(output_root, exist_ok=True)
+    manifest_path = os.path.join(output_root, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+
+    pending = []
+    skipped = 0
+    for video_path, name in find_videos(source):
+        entry = previous.get(video_path)
+        if is_done(entry, video_path) or (entry and entry.get('status') == 'failed' and not retry_failed):
+            skipped += 1
+            continue
+        pending.append((video_path, os.path.join(output_root, name)))
+
+    options = {'formats': formats, 'video': video, 'sidecar': sidecar}
+    stats = {'total': len(pending) + skipped, 'skipped': skipped, 'done': 0, 'failed': 0, 'frames': 0}
+    start = time.time()
+
+    with open(manifest_path, 'a') as manifest, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(model_complexity, backend_options)) as executor:
+        futures = {executor.submit(_analyze_one, video_path, output_dir, options): (video_path, output_dir)
+                   for video_path, output_dir in pending}
+
+        try:
+            for future in as_completed(futures):
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    # The worker itself failed, e.g. it crashed or the result could not be returned
+                    video_path, output_dir = futures[future]
+                    entry = {'video': video_path, 'output_dir': output_dir, 'status': 'failed',
+                             'error': str(e) or type(e).__name__, 'seconds': 0.0}
+                manifest.write(json.dumps(entry) + '\n')
+                manifest.flush()
+                os.fsync(manifest.fileno())
+
+                stats[entry['status']] += 1
+                stats['frames'] += entry.get('frames', 0)
+                finished = stats['done'] + stats['failed']
+                elapsed = time.time() - start
+                print(f"[{finished}/{len(pending)}] {entry['status']}: {entry['video']} "
+                      f"({entry['seconds']:.1f}s, {stats['frames'] / elapsed:.1f} frames/s overall)",
+                      file=sys.stderr)
+        except KeyboardInterrupt:
+            # Finished videos are already in the manifest; the next run resumes from there
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    elapsed = time.time() - start
+    stats['elapsed_seconds'] = elapsed
+    stats['videos_per_second'] = (stats['done'] + stats['failed']) / elapsed if elapsed else 0.0
+    stats['frames_per_second'] = stats['frames'] / elapsed if elapsed else 0.0
+    stats['workers'] = workers
+    stats['pose_backend'] = backend_options['name'] if backend_options else 'mediapipe'
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Batch-analyze videos with the OpenPose Analyzer')
+    parser.add_argument('source', help='Directory of videos, or a file listing one video path per line')
+    parser.add_argument('--output', required=True, help='Directory for results and the progress manifest')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (default: all cores)')
+    parser.add_argument('--model-complexity', type=int, default=1, choices=[0, 1, 2])
+    parser.add_argument('--formats', nargs='*', default=['json'], choices=['json', 'csv'],
+                        help='Export formats written for each video')
+    parser.add_argument('--video', action='store_true', help='Also write an annotated video')
+    parser.add_argument('--sidecar', action='store_true', help='Also write a landmark sidecar')
+    parser.add_argument('--retry-failed', action='store_true', help='Retry videos that failed previously')
+    parser.add_argument('--pose-backend', default='mediapipe', choices=['mediapipe', 'onnx'],
+                        help='Pose inference backend (see pose_backends.py)')
+    parser.add_argument('--onnx-model', help='Pose landmark model for the onnx backend')
+    parser.add_argument('--batch-size', type=int, default=8, help='Frames per inference call for the onnx backend')
+    parser.add_argument('--intra-op-threads', type=int, default=1,
+                        help='ONNX Runtime threads per worker (default: 1, as workers already use every core)')
+    args = parser.parse_args(argv)
+
+    backend_options = None
+    if args.pose_backend == 'onnx':
+        if not args.onnx_model:
+            parser.error('--pose-backend onnx requires --onnx-model')
+        backend_options = {
+            'name': 'onnx',
+            'model_path': args.onnx_model,
+            'batch_size': args.batch_size,
+            'intra_op_threads': args.intra_op_threads
+        }
+
+    stats = run_batch(args.source, args.output, args.workers, args.model_complexity,
+                      tuple(args.formats), args.video, args.sidecar, args.retry_failed, backend_options)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
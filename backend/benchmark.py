@@ -0,0 +1,637 @@
+"""
+Benchmark suite for the OpenPose Analyzer and its Flask API.
+
+Generates synthetic videos, times the analyzer per stage and end to end, and
+load-tests the live endpoints. Results are written as JSON so runs from
+different releases can be compared with --compare.
+
+Usage:
+    python benchmark.py --backend stub --frames 300 --output bench.json
+    python benchmark.py --backend mediapipe --compare bench.json
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2
+
+from motion_templates import MotionTemplate, TemplateLibrary, segment_reps, trajectory_from_frames
+from openpose_analyzer import OpenPoseAnalyzer
+
+# Normalized (x, y) positions of the 33 MediaPipe landmarks for a person
+# standing upright and facing the camera.
+STANDING_POSE = np.array([
+    [0.50, 0.15], [0.51, 0.13], [0.52, 0.13], [0.53, 0.13],
+    [0.49, 0.13], [0.48, 0.13], [0.47, 0.13], [0.54, 0.14],
+    [0.46, 0.14], [0.51, 0.17], [0.49, 0.17], [0.58, 0.28],
+    [0.42, 0.28], [0.61, 0.40], [0.39, 0.40], [0.62, 0.51],
+    [0.38, 0.51], [0.63, 0.53], [0.37, 0.53], [0.62, 0.54],
+    [0.38, 0.54], [0.61, 0.53], [0.39, 0.53], [0.55, 0.55],
+    [0.45, 0.55], [0.55, 0.72], [0.45, 0.72], [0.55, 0.88],
+    [0.45, 0.88], [0.55, 0.90], [0.45, 0.90], [0.56, 0.92],
+    [0.44, 0.92]
+], dtype=np.float32)
+
+UPPER_BODY = list(range(0, 25))
+KNEES = [25, 26]
+
+
+def synthesize_landmarks(num_frames: int, period: int = 60, seed: int = 0) -> np.ndarray:
+    """
+    Generate a deterministic squat-like landmark sequence.
+
+    Args:
+        num_frames: Number of frames to generate
+        period: Frames per repetition
+        seed: Seed for the small per-landmark jitter
+
+    Returns:
+        Array of shape (num_frames, 33, 4) holding x, y, z and visibility
+    """
+    rng = np.random.default_rng(seed)
+    frames = np.zeros((num_frames, 33, 4), dtype=np.float32)
+
+    for i in range(num_frames):
+        depth = (1 - math.cos(2 * math.pi * i / period)) / 2
+        pose = STANDING_POSE.copy()
+        pose[UPPER_BODY, 1] += 0.15 * depth
+        pose[KNEES, 1] += 0.05 * depth
+        pose[25, 0] += 0.06 * depth
+        pose[26, 0] -= 0.06 * depth
+
+        frames[i, :, :2] = pose + rng.normal(0, 0.002, pose.shape)
+        frames[i, :, 2] = rng.normal(0, 0.05, 33)
+        frames[i, :, 3] = np.clip(0.9 + rng.normal(0, 0.05, 33), 0, 1)
+
+    return frames
+
+
+def load_landmarks(path: str) -> np.ndarray:
+    """Load a recorded landmark sequence saved by record_landmarks."""
+    landmarks = np.load(path)
+    if landmarks.ndim != 3 or landmarks.shape[1:] != (33, 4):
+        raise ValueError(f"Expected landmarks of shape (N, 33, 4), got {landmarks.shape}")
+    return landmarks.astype(np.float32)
+
+
+def record_landmarks(video_path: str, output_path: str, model_complexity: int = 1) -> int:
+    """
+    Run MediaPipe over a video and save the detected landmarks for replay.
+
+    Frames without a detection are skipped.
+
+    Returns:
+        Number of frames recorded
+    """
+    pose = mp.solutions.pose.Pose(model_complexity=model_complexity)
+    cap = cv2.VideoCapture(video_path)
+    recorded = []
+
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if results.pose_landmarks:
+            recorded.append([[lm.x, lm.y, lm.z, lm.visibility]
+                             for lm in results.pose_landmarks.landmark])
+
+    cap.release()
+    pose.close()
+    np.save(output_path, np.array(recorded, dtype=np.float32))
+    return len(recorded)
+
+
+class RecordedPose:
+    """
+    Deterministic stand-in for mp.solutions.pose.Pose.
+
+    Replays a recorded landmark sequence in order, ignoring the image, so the
+    metric, feedback and drawing code can be timed without MediaPipe variance.
+    """
+
+    def __init__(self, landmarks: np.ndarray):
+        self.results = [self._to_results(frame) for frame in landmarks]
+        self.index = 0
+
+    @staticmethod
+    def _to_results(frame: np.ndarray):
+        pose_landmarks = landmark_pb2.NormalizedLandmarkList()
+        world_landmarks = landmark_pb2.LandmarkList()
+        for x, y, z, visibility in frame:
+            pose_landmarks.landmark.add(x=x, y=y, z=z, visibility=visibility)
+            world_landmarks.landmark.add(x=x - 0.5, y=y - 0.5, z=z, visibility=visibility)
+
+        return SimpleNamespace(pose_landmarks=pose_landmarks, pose_world_landmarks=world_landmarks)
+
+    def process(self, image: np.ndarray):
+        results = self.results[self.index % len(self.results)]
+        self.index += 1
+        return results
+
+    def close(self) -> None:
+        pass
+
+
+class SyntheticCapture:
+    """Minimal cv2.VideoCapture replacement that cycles through fixed frames."""
+
+    def __init__(self, frames: List[np.ndarray]):
+        self.frames = frames
+        self.index = 0
+        self.opened = True
+
+    def isOpened(self) -> bool:
+        return self.opened
+
+    def read(self, image: Optional[np.ndarray] = None):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame.copy()
+
+    def release(self) -> None:
+        self.opened = False
+
+
+def render_frames(landmarks: np.ndarray, width: int, height: int) -> List[np.ndarray]:
+    """Draw a stick figure for each landmark frame on a plain background."""
+    connections = mp.solutions.pose.POSE_CONNECTIONS
+    frames = []
+    for pose in landmarks:
+        frame = np.full((height, width, 3), 40, dtype=np.uint8)
+        points = [(int(x * width), int(y * height)) for x, y, _, _ in pose]
+        for start, end in connections:
+            cv2.line(frame, points[start], points[end], (200, 200, 200), 8)
+        cv2.circle(frame, points[0], max(4, height // 20), (200, 200, 200), -1)
+        frames.append(frame)
+    return frames
+
+
+def write_video(frames: List[np.ndarray], path: str, fps: float = 30.0) -> str:
+    """Write frames to an mp4v video file."""
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Summarize timing samples (seconds) as millisecond statistics."""
+    if not samples:
+        return {"count": 0}
+
+    values = np.array(samples) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "min_ms": float(values.min()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max())
+    }
+
+
+def time_calls(func: Callable, iterations: int) -> List[float]:
+    """Call func(i) for each iteration and return the per-call durations."""
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_analyzer(backend: str, landmarks: np.ndarray, model_complexity: int) -> OpenPoseAnalyzer:
+    """Create an analyzer using either real MediaPipe or the recorded stub."""
+    analyzer = OpenPoseAnalyzer(model_complexity=model_complexity)
+    if backend == 'stub':
+        analyzer.pose = RecordedPose(landmarks)
+    else:
+        analyzer.warmup()
+    return analyzer
+
+
+def bench_stages(analyzer: OpenPoseAnalyzer, frames: List[np.ndarray]) -> Dict:
+    """
+    Time each stage of the per-frame pipeline in isolation.
+
+    Stages mirror analyze_frame plus the JPEG encode done by the API:
+    color conversion, inference, metrics, feedback, drawing and encode.
+    """
+    analyzer.start_analysis()
+    n = len(frames)
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    results = [analyzer.pose.process(rgb) for rgb in rgb_frames]
+    detected = [(i, r) for i, r in enumerate(results) if r.pose_landmarks]
+    stages = {}
+
+    stages['color_conversion'] = summarize(time_calls(
+        lambda i: analyzer._color_convert(frames[i]), n))
+    stages['inference'] = summarize(time_calls(
+        lambda i: analyzer.pose.process(rgb_frames[i]), n))
+
+    if detected:
+        h, w = frames[0].shape[:2]
+
+        def metrics(i):
+            pose_landmarks = detected[i % len(detected)][1].pose_landmarks
+            landmarks = pose_landmarks.landmark
+            analyzer.calculate_symmetry(landmarks)
+            analyzer.calculate_balance(landmarks)
+            analyzer.estimate_muscle_activation(landmarks)
+            analyzer.calculate_joint_angles(analyzer._landmark_array(pose_landmarks), w, h)
+
+        def feedback(i):
+            landmarks = detected[i % len(detected)][1].pose_landmarks.landmark
+            analyzer.generate_posture_feedback(analyzer.joint_angles, landmarks)
+
+        def drawing(i):
+            frame_idx, result = detected[i % len(detected)]
+            annotated = frames[frame_idx].copy()
+            analyzer.mp_drawing.draw_landmarks(
+                annotated,
+                result.pose_landmarks,
+                analyzer.mp_pose.POSE_CONNECTIONS,
+                analyzer.mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
+                analyzer.mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2)
+            )
+
+        stages['metrics'] = summarize(time_calls(metrics, n))
+        stages['feedback'] = summarize(time_calls(feedback, n))
+        stages['drawing'] = summarize(time_calls(drawing, n))
+
+    stages['encode'] = summarize(time_calls(
+        lambda i: cv2.imencode('.jpg', frames[i]), n))
+    stages['detection_rate'] = len(detected) / n if n else 0.0
+
+    analyzer.stop_analysis()
+    return stages
+
+
+def bench_analyzer(analyzer: OpenPoseAnalyzer, frames: List[np.ndarray],
+                   video_path: str, work_dir: str) -> Dict:
+    """Time the public analyzer API end to end."""
+    results = {}
+
+    analyzer.start_analysis()
+    samples = time_calls(lambda i: analyzer.analyze_frame(frames[i]), len(frames))
+    analyzer.stop_analysis()
+    results['analyze_frame'] = summarize(samples)
+    results['analyze_frame']['fps'] = len(samples) / sum(samples) if samples else 0.0
+
+    outputs = {
+        'analyze_video': {},
+        'analyze_video_with_output': {'output_path': os.path.join(work_dir, 'analyzed.mp4')},
+        'analyze_video_with_sidecar': {'sidecar_path': os.path.join(work_dir, 'analyzed.jsonl')}
+    }
+    for label, kwargs in outputs.items():
+        start = time.perf_counter()
+        analyzer.analyze_video(video_path, **kwargs)
+        elapsed = time.perf_counter() - start
+        results[label] = summarize([elapsed])
+        results[label]['fps'] = analyzer.frame_count / elapsed if elapsed else 0.0
+        for path in kwargs.values():
+            results[label]['output_bytes'] = os.path.getsize(path)
+
+    start = time.perf_counter()
+    analyzer.render_sidecar(video_path, outputs['analyze_video_with_sidecar']['sidecar_path'],
+                            os.path.join(work_dir, 'rendered.mp4'))
+    results['render_sidecar'] = summarize([time.perf_counter() - start])
+
+    results['history_length'] = len(analyzer.results_history)
+    results['get_analysis_summary'] = summarize(time_calls(
+        lambda i: analyzer.get_analysis_summary(), 20))
+
+    for format_type in ('json', 'csv'):
+        export_dir = os.path.join(work_dir, f'export_{format_type}')
+        os.makedirs(export_dir, exist_ok=True)
+        results[f'export_results_{format_type}'] = summarize(time_calls(
+            lambda i: analyzer.export_results(export_dir, format_type), 3))
+
+    return results
+
+
+def bench_templates(analyzer: OpenPoseAnalyzer, frames: List[np.ndarray], templates: int) -> Dict:
+    """Time matching recorded reps against a library of reference motions."""
+    analyzer.start_analysis()
+    for i, frame in enumerate(frames):
+        analyzer.analyze_frame(frame, annotate=False, timestamp=i / 30.0)
+    analyzer.stop_analysis()
+
+    reps = segment_reps(analyzer.results_history, analyzer.rep_counter.primary_joint)
+    if not reps:
+        return {'reps': 0}
+
+    # Variants of the recorded reps, offset by a few degrees each, as a library
+    library = TemplateLibrary()
+    for index in range(templates):
+        _, rep_frames = reps[index % len(reps)]
+        joints = ('left_knee', 'right_knee', 'left_hip', 'right_hip')
+        trajectory = trajectory_from_frames(rep_frames, joints) + (index - templates / 2) * 0.5
+        library.add(MotionTemplate(f"variant_{index}", joints, trajectory, library.length))
+
+    pruned = []
+
+    def match(i):
+        result = library.match(reps[i % len(reps)][1])
+        pruned.append(result['pruned'] / result['candidates'])
+
+    results = {'reps': len(reps), 'templates': templates}
+    results['match'] = summarize(time_calls(match, max(20, len(reps))))
+    results['match']['templates_per_second'] = templates / (results['match']['mean_ms'] / 1000)
+    results['match']['pruned_fraction'] = sum(pruned) / len(pruned)
+    results['match_history'] = summarize(time_calls(
+        lambda i: library.match_history(analyzer.results_history, analyzer.rep_counter.primary_joint), 3))
+    return results
+
+
+def bench_memory(analyzer: OpenPoseAnalyzer, frames: List[np.ndarray], fps: float = 30.0) -> Dict:
+    """
+    Measure per-frame allocations and garbage collector activity of analyze_frame.
+
+    Frames are annotated on a copy, as by default, and in place, as the live
+    stream and video analysis do. peak_kb is the largest amount of memory
+    allocated during a frame and still held at its peak, from tracemalloc
+    (NumPy and OpenCV buffers included). gc_per_second counts collections per
+    generation at the given frame rate, from a separate pass without tracing.
+    """
+    results = {}
+    for mode, in_place in (('copy', False), ('in_place', True)):
+        buffers = [frame.copy() for frame in frames]
+        collections = [0, 0, 0]
+
+        def count_collection(phase, info):
+            if phase == 'start':
+                collections[info['generation']] += 1
+
+        analyzer.start_analysis()
+        gc.collect()
+        gc.callbacks.append(count_collection)
+        try:
+            samples = time_calls(lambda i: analyzer.analyze_frame(buffers[i], timestamp=i / fps,
+                                                                  in_place=in_place), len(buffers))
+        finally:
+            gc.callbacks.remove(count_collection)
+
+        peaks = []
+        tracemalloc.start()
+        try:
+            for i, frame in enumerate(buffers):
+                np.copyto(frame, frames[i])
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                analyzer.analyze_frame(frame, timestamp=(len(buffers) + i) / fps, in_place=in_place)
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+        analyzer.stop_analysis()
+
+        seconds = len(buffers) / fps
+        results[mode] = summarize(samples)
+        results[mode]['peak_kb'] = {
+            'mean': float(np.mean(peaks)) / 1024,
+            'p95': float(np.percentile(peaks, 95)) / 1024
+        }
+        results[mode]['gc_per_second'] = {
+            f"gen{generation}": count / seconds for generation, count in enumerate(collections)
+        }
+    return results
+
+
+def bench_api(backend: str, landmarks: np.ndarray, frames: List[np.ndarray], model_complexity: int,
+              concurrency: int, requests_per_client: int, stream_frames: int) -> Dict:
+    """Load-test /api/get_feedback and /api/webcam_stream via the Flask test client."""
+    import app as app_module
+
+    if backend == 'stub':
+        app_module.analyzer = make_analyzer(backend, landmarks, model_complexity)
+        app_module.analyzer_ready.set()
+    else:
+        app_module.init_worker()
+
+    client = app_module.app.test_client()
+    client.post('/api/start_analysis')
+    for frame in frames[:30]:
+        app_module.analyzer.analyze_frame(frame)
+
+    results = {}
+
+    # /api/get_feedback with concurrent clients
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def feedback_client():
+        local_client = app_module.app.test_client()
+        local_samples = []
+        local_errors = 0
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = local_client.get('/api/get_feedback')
+            local_samples.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_samples)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=feedback_client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results['get_feedback'] = summarize(latencies)
+    results['get_feedback']['concurrency'] = concurrency
+    results['get_feedback']['requests_per_sec'] = len(latencies) / elapsed if elapsed else 0.0
+    results['get_feedback']['errors'] = sum(errors)
+
+    # /api/webcam_stream driven by a synthetic capture device
+    app_module.webcam = SyntheticCapture(frames)
+    response = client.get('/api/webcam_stream', buffered=False)
+    intervals = []
+    received = 0
+    last = time.perf_counter()
+    start = last
+    for chunk in response.response:
+        if not chunk.startswith(b'--frame'):
+            continue
+        now = time.perf_counter()
+        intervals.append(now - last)
+        last = now
+        received += 1
+        if received >= stream_frames:
+            break
+    elapsed = time.perf_counter() - start
+    client.post('/api/stop_webcam')
+    response.close()
+    if not received:
+        raise RuntimeError("No frames received from /api/webcam_stream; the capture loop failed")
+
+    results['webcam_stream'] = summarize(intervals)
+    results['webcam_stream']['frames'] = received
+    results['webcam_stream']['fps'] = received / elapsed if elapsed else 0.0
+
+    client.post('/api/stop_analysis')
+    return results
+
+
+def compare_results(current: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """
+    Compare two benchmark reports and list entries whose median latency regressed.
+
+    Args:
+        current: Report produced by this run
+        baseline: Report from a previous run
+        tolerance: Allowed relative slowdown, e.g. 0.2 for 20%
+
+    Returns:
+        List of regressions with the section, name and both p50 values
+    """
+    regressions = []
+    for section, entries in current.get('results', {}).items():
+        base_entries = baseline.get('results', {}).get(section, {})
+        for name, stats in entries.items():
+            base_stats = base_entries.get(name)
+            if not isinstance(stats, dict) or not isinstance(base_stats, dict):
+                continue
+            if 'p50_ms' not in stats or not base_stats.get('p50_ms'):
+                continue
+            ratio = stats['p50_ms'] / base_stats['p50_ms']
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    'section': section,
+                    'name': name,
+                    'baseline_p50_ms': base_stats['p50_ms'],
+                    'current_p50_ms': stats['p50_ms'],
+                    'ratio': ratio
+                })
+    return regressions
+
+
+def run(args: argparse.Namespace) -> Dict:
+    """Run the selected benchmark sections and return the report."""
+    if args.landmarks:
+        landmarks = load_landmarks(args.landmarks)
+    else:
+        landmarks = synthesize_landmarks(args.frames, seed=args.seed)
+
+    frames = render_frames(landmarks[:args.frames], args.width, args.height)
+    work_dir = tempfile.mkdtemp(prefix='openpose_bench_')
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'backend': args.backend,
+            'frames': len(frames),
+            'resolution': [args.width, args.height],
+            'model_complexity': args.model_complexity,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'mediapipe': getattr(mp, '__version__', 'unknown')
+        },
+        'results': {}
+    }
+
+    try:
+        video_path = write_video(frames, os.path.join(work_dir, 'synthetic.mp4'))
+        analyzer = make_analyzer(args.backend, landmarks, args.model_complexity)
+
+        if 'stages' in args.sections:
+            report['results']['stages'] = bench_stages(analyzer, frames)
+        if 'analyzer' in args.sections:
+            report['results']['analyzer'] = bench_analyzer(analyzer, frames, video_path, work_dir)
+        if 'templates' in args.sections:
+            report['results']['templates'] = bench_templates(analyzer, frames, args.templates)
+        if 'memory' in args.sections:
+            report['results']['memory'] = bench_memory(analyzer, frames)
+        if 'api' in args.sections:
+            report['results']['api'] = bench_api(args.backend, landmarks, frames, args.model_complexity,
+                                                 args.concurrency, args.requests, args.stream_frames)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the OpenPose Analyzer')
+    parser.add_argument('--backend', choices=['stub', 'mediapipe'], default='stub',
+                        help='Pose backend: recorded stub (deterministic) or real MediaPipe')
+    parser.add_argument('--landmarks', help='Recorded landmarks (.npy) to replay instead of the synthetic squat')
+    parser.add_argument('--record', nargs=2, metavar=('VIDEO', 'OUTPUT'),
+                        help='Record MediaPipe landmarks from VIDEO to OUTPUT (.npy) and exit')
+    parser.add_argument('--frames', type=int, default=150, help='Number of synthetic frames')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--model-complexity', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sections', nargs='+', choices=['stages', 'analyzer', 'templates', 'memory', 'api'],
+                        default=['stages', 'analyzer', 'templates', 'memory', 'api'])
+    parser.add_argument('--templates', type=int, default=48, help='Templates in the matching benchmark library')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent /api/get_feedback clients')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per feedback client')
+    parser.add_argument('--stream-frames', type=int, default=60, help='Frames to read from /api/webcam_stream')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='Baseline JSON report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative p50 slowdown before flagging a regression')
+    args = parser.parse_args(argv)
+
+    if args.record:
+        count = record_landmarks(args.record[0], args.record[1], args.model_complexity)
+        print(f"Recorded {count} frames to {args.record[1]}")
+        return 0
+
+    # The analyzer reports progress with print(); keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('backend') != args.backend:
+            print(f"Warning: baseline used the {baseline.get('meta', {}).get('backend')} backend", file=sys.stderr)
+        report['regressions'] = compare_results(report, baseline, args.tolerance)
+        if report['regressions']:
+            exit_code = 1
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,443 @@
+"""
+Frame Ring - Shared-memory frame slots for handing frames to analyzer processes
+"""
+
+import multiprocessing
+import queue
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+import telemetry
+from pose_backends import from_landmark_list
+
+POSE_LANDMARKS = 33
+# Metrics of a single frame. Movement speed and fatigue depend on the previous
+# frame, which a worker may not have seen, so the parent computes them.
+FRAME_METRICS = ('symmetry', 'balance')
+
+# Frames a video chunk worker analyzes before sending their results
+CHUNK_BATCH = 32
+
+# Byte alignment of each array in the shared block
+_ALIGNMENT = 64
+
+
+class FrameRing:
+    """
+    Fixed-size frame slots and per-slot analysis results in one shared memory block.
+
+    Each slot holds a frame plus what an analyzer writes back for it: sequence
+    number, timestamp, person id, accuracy, landmarks, joint angles, metrics
+    and stage timings.
+    Processes attach to the block by name and exchange only slot indices and
+    sequence numbers, so frames are never pickled or sent through pipes.
+    """
+
+    def __init__(self, frame_shape: Tuple[int, int, int], slots: int, joint_names: Sequence[str],
+                 name: Optional[str] = None):
+        """
+        Create a ring, or attach to an existing one.
+
+        Args:
+            frame_shape: (height, width, channels) of every frame
+            slots: Number of frame slots
+            joint_names: Joint angle names, in the order stored per slot
+            name: Name of an existing ring to attach to; a new one is created if None
+        """
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.joint_names = tuple(joint_names)
+
+        layout = [
+            ('sequences', np.int64, ()),
+            ('timestamps', np.float64, ()),
+            ('persons', np.int32, ()),
+            ('accuracies', np.float32, ()),
+            ('landmarks', np.float32, (POSE_LANDMARKS, 4)),
+            ('joint_angles', np.float32, (len(self.joint_names),)),
+            ('metrics', np.float32, (len(FRAME_METRICS),)),
+            ('timings', np.float32, (len(telemetry.FRAME_STAGES) + 1,)),
+            ('frames', np.uint8, self.frame_shape)
+        ]
+        offsets = []
+        size = 0
+        for _, dtype, shape in layout:
+            offsets.append(size)
+            nbytes = slots * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            size += -(-nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self._fields = [field for field, _, _ in layout]
+        for (field, dtype, shape), offset in zip(layout, offsets):
+            setattr(self, field, np.ndarray((slots,) + shape, dtype=dtype, buffer=self.shm.buf, offset=offset))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write_result(self, slot: int, person_id: Optional[int], accuracy: float, landmarks,
+                     joint_angles: Dict[str, float], metrics: Dict[str, float],
+                     timings: Sequence[float] = ()) -> None:
+        """
+        Store an analyzer's results for the frame in a slot.
+
+        Args:
+            slot: Slot index
+            person_id: Tracked person, or None if no pose was detected
+            accuracy: Pose accuracy score
+            landmarks: MediaPipe NormalizedLandmarkList, or None
+            joint_angles: Joint angles by name; missing joints are stored as NaN
+            metrics: Values for FRAME_METRICS; missing metrics are stored as NaN
+            timings: Stage timings from telemetry.frame_timings_since(); NaN if omitted
+        """
+        self.persons[slot] = -1 if person_id is None or landmarks is None else person_id
+        self.accuracies[slot] = accuracy
+        if landmarks is not None:
+            from_landmark_list(landmarks, self.landmarks[slot])
+        self.joint_angles[slot] = [joint_angles.get(joint, np.nan) for joint in self.joint_names]
+        self.metrics[slot] = [metrics.get(metric, np.nan) for metric in FRAME_METRICS]
+        self.timings[slot] = timings if len(timings) else np.nan
+
+    def read_result(self, slot: int) -> Dict:
+        """
+        Results stored in a slot.
+
+        The frame and landmarks are views into shared memory, valid until the
+        slot is reused.
+        """
+        detected = self.persons[slot] >= 0
+        angles = self.joint_angles[slot].tolist()
+        metrics = self.metrics[slot].tolist()
+        return {
+            'slot': slot,
+            'sequence': int(self.sequences[slot]),
+            'timestamp': float(self.timestamps[slot]),
+            'frame': self.frames[slot],
+            'person_id': int(self.persons[slot]) if detected else None,
+            'accuracy': float(self.accuracies[slot]),
+            'landmarks': self.landmarks[slot] if detected else None,
+            'joint_angles': {joint: angle for joint, angle in zip(self.joint_names, angles) if angle == angle},
+            'metrics': {metric: value for metric, value in zip(FRAME_METRICS, metrics) if value == value},
+            'timings': self.timings[slot].tolist()
+        }
+
+    def close(self) -> None:
+        """Detach from the ring, freeing it if this process created it."""
+        # Views must be released before the block can be closed
+        for field in self._fields:
+            setattr(self, field, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _ring_worker(ring_name: str, frame_shape: Tuple[int, int, int], slots: int,
+                 joint_names: Sequence[str], tasks, done, model_complexity: int) -> None:
+    """Analyze frames from the ring until a None task arrives."""
+    from openpose_analyzer import OpenPoseAnalyzer
+
+    ring = FrameRing(frame_shape, slots, joint_names, name=ring_name)
+    analyzer = OpenPoseAnalyzer(model_complexity=model_complexity, keep_history=False)
+    analyzer.warmup(frame_shape[1], frame_shape[0])
+    analyzer.start_analysis()
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            slot, sequence, timestamp, annotate = task
+            frame = ring.frames[slot]
+            snapshot = telemetry.frame_timings()
+            _, joint_angles, accuracy = analyzer.analyze_frame(
+                frame, annotate=annotate, timestamp=timestamp, in_place=True)
+
+            person_id = analyzer.current_person_id
+            metrics = {
+                'symmetry': analyzer.symmetry_scores.get(person_id, np.nan),
+                'balance': analyzer.balance_metrics.get(person_id, np.nan)
+            }
+            ring.write_result(slot, person_id, accuracy, analyzer.current_landmarks, joint_angles, metrics,
+                              telemetry.frame_timings_since(snapshot))
+            done.put((slot, sequence))
+    finally:
+        ring.close()
+
+
+class FrameWorkerPool:
+    """
+    Analyzer processes fed through a FrameRing.
+
+    The caller decodes straight into a free slot (acquire/frame), submits it,
+    and reads results back in submission order with next_result(). Workers
+    annotate frames in place, so a result's frame is the annotated image.
+    Frames are dealt to whichever worker is free, so no worker sees
+    consecutive frames; fold results into one analyzer with
+    OpenPoseAnalyzer.ingest_frame_result(), which computes everything that
+    depends on earlier frames. For video files, analyze_video_chunks() gives
+    each worker a contiguous range instead.
+    """
+
+    def __init__(self, frame_shape: Tuple[int, int, int], joint_names: Sequence[str], workers: int = 2,
+                 slots: Optional[int] = None, model_complexity: int = 1):
+        """
+        Start the workers.
+
+        Args:
+            frame_shape: (height, width, channels) of every frame
+            joint_names: Joint angle names to return, e.g. OpenPoseAnalyzer.angle_joints
+            workers: Number of analyzer processes
+            slots: Frame slots in the ring; defaults to enough to keep every worker busy
+            model_complexity: MediaPipe model complexity of the workers
+        """
+        slots = slots or 2 * workers + 2
+        self.ring = FrameRing(frame_shape, slots, joint_names)
+        self.free = deque(range(slots))
+        self.in_flight = {}
+        self.finished = {}
+        self.next_sequence = 0
+        self.next_expected = 0
+
+        # Spawn rather than fork: the parent may hold MediaPipe graphs and threads
+        context = multiprocessing.get_context('spawn')
+        self.tasks = context.Queue()
+        self.done = context.Queue()
+        self.processes = [
+            context.Process(target=_ring_worker, daemon=True,
+                            args=(self.ring.name, self.ring.frame_shape, slots, self.ring.joint_names,
+                                  self.tasks, self.done, model_complexity))
+            for _ in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    @property
+    def pending(self) -> int:
+        """Frames submitted whose results have not been returned yet."""
+        return len(self.in_flight)
+
+    def acquire(self) -> Optional[int]:
+        """Take a free slot, or None if every slot is in use."""
+        return self.free.popleft() if self.free else None
+
+    def frame(self, slot: int) -> np.ndarray:
+        """Shared-memory frame buffer of a slot, e.g. for cv2.VideoCapture.read(image)."""
+        return self.ring.frames[slot]
+
+    def submit(self, slot: int, timestamp: float, annotate: bool = True) -> int:
+        """
+        Queue the frame in a slot for analysis.
+
+        Args:
+            slot: Slot from acquire() holding the frame
+            timestamp: Frame time in seconds
+            annotate: Draw the analysis onto the frame
+
+        Returns:
+            Sequence number of the frame
+        """
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        self.ring.sequences[slot] = sequence
+        self.ring.timestamps[slot] = timestamp
+        self.in_flight[sequence] = slot
+        self.tasks.put((slot, sequence, timestamp, annotate))
+        telemetry.INFERENCE_QUEUE_DEPTH.inc()
+        return sequence
+
+    def release(self, slot: int) -> None:
+        """Return a slot once its frame and results are no longer needed."""
+        self.free.append(slot)
+
+    def next_result(self, block: bool = True) -> Optional[Dict]:
+        """
+        Results of the oldest submitted frame.
+
+        Args:
+            block: Wait for the result; otherwise return None if it is not ready
+
+        Returns:
+            Result dictionary (see FrameRing.read_result), or None if nothing is
+            pending or, when not blocking, the next result is not ready
+        """
+        expected = self.next_expected
+        if expected not in self.in_flight:
+            return None
+
+        while expected not in self.finished:
+            try:
+                slot, sequence = self.done.get(timeout=1.0) if block else self.done.get_nowait()
+            except queue.Empty:
+                if not block:
+                    return None
+                if not all(process.is_alive() for process in self.processes):
+                    raise RuntimeError("A frame analysis worker exited unexpectedly")
+                continue
+            self.finished[sequence] = slot
+
+        slot = self.finished.pop(expected)
+        del self.in_flight[expected]
+        self.next_expected += 1
+        telemetry.INFERENCE_QUEUE_DEPTH.dec()
+        return self.ring.read_result(slot)
+
+    def close(self) -> None:
+        """Stop the workers and free the ring."""
+        telemetry.INFERENCE_QUEUE_DEPTH.dec(len(self.in_flight))
+        self.in_flight.clear()
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
+
+
+def _chunk_worker(video_path: str, chunk: int, start: int, stop: int, fps: float,
+                  joint_names: Sequence[str], model_complexity: int, results) -> None:
+    """Analyze frames [start, stop) of a video, sending results in batches of CHUNK_BATCH."""
+    from openpose_analyzer import OpenPoseAnalyzer
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        analyzer = OpenPoseAnalyzer(model_complexity=model_complexity, keep_history=False)
+        analyzer.start_analysis()
+
+        batch = {
+            'start': start,
+            'detected': np.zeros(CHUNK_BATCH, dtype=bool),
+            'accuracies': np.empty(CHUNK_BATCH, dtype=np.float32),
+            'landmarks': np.empty((CHUNK_BATCH, POSE_LANDMARKS, 4), dtype=np.float32),
+            'joint_angles': np.empty((CHUNK_BATCH, len(joint_names)), dtype=np.float32),
+            'metrics': np.empty((CHUNK_BATCH, len(FRAME_METRICS)), dtype=np.float32),
+            'timings': np.empty((CHUNK_BATCH, len(telemetry.FRAME_STAGES) + 1), dtype=np.float32)
+        }
+        count = 0
+        frame = None
+        for index in range(start, stop):
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+
+            snapshot = telemetry.frame_timings()
+            _, joint_angles, accuracy = analyzer.analyze_frame(
+                frame, annotate=False, timestamp=index / fps, in_place=True)
+            batch['timings'][count] = telemetry.frame_timings_since(snapshot)
+            person_id = analyzer.current_person_id
+            detected = analyzer.current_landmarks is not None
+            batch['detected'][count] = detected
+            batch['accuracies'][count] = accuracy
+            if detected:
+                batch['landmarks'][count] = analyzer.landmark_buffer
+            batch['joint_angles'][count] = [joint_angles.get(joint, np.nan) for joint in joint_names]
+            batch['metrics'][count] = [analyzer.symmetry_scores.get(person_id, np.nan),
+                                       analyzer.balance_metrics.get(person_id, np.nan)]
+            count += 1
+
+            if count == CHUNK_BATCH:
+                results.put((chunk, batch))
+                batch = {key: value if key == 'start' else value.copy() for key, value in batch.items()}
+                batch['start'] = index + 1
+                count = 0
+
+        if count:
+            results.put((chunk, {key: value if key == 'start' else value[:count] for key, value in batch.items()}))
+        results.put((chunk, None))
+    except Exception as e:
+        results.put((chunk, f"{type(e).__name__}: {e}"))
+    finally:
+        cap.release()
+
+
+def analyze_video_chunks(video_path: str, ranges: List[Tuple[int, int]], fps: float,
+                         joint_names: Sequence[str], model_complexity: int = 1) -> Iterator[Dict]:
+    """
+    Analyze contiguous frame ranges of a video in parallel processes.
+
+    Each process decodes and analyzes its own range, so its pose tracking
+    sees consecutive frames and no frames cross process boundaries; only
+    landmarks and per-frame values are sent back. Results are yielded in
+    frame order, with later ranges buffered until the earlier ones finish.
+
+    Args:
+        video_path: Path to the video file
+        ranges: (start, stop) frame ranges, one per process, in order
+        fps: Frame rate used to timestamp frames
+        joint_names: Joint angle names to return
+        model_complexity: MediaPipe model complexity of the workers
+
+    Yields:
+        Result dictionaries as from FrameRing.read_result(), without the
+        frame and slot, and with landmarks as a (33, 4) array
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [
+        context.Process(target=_chunk_worker, daemon=True,
+                        args=(video_path, chunk, start, stop, fps, tuple(joint_names),
+                              model_complexity, results))
+        for chunk, (start, stop) in enumerate(ranges)
+    ]
+    for process in processes:
+        process.start()
+
+    buffered = [deque() for _ in ranges]
+    finished = set()
+    try:
+        for chunk, process in enumerate(processes):
+            while True:
+                while buffered[chunk]:
+                    yield from _chunk_results(buffered[chunk].popleft(), fps, joint_names)
+                if chunk in finished:
+                    break
+
+                try:
+                    source, batch = results.get(timeout=1.0)
+                except queue.Empty:
+                    if process.is_alive():
+                        continue
+                    try:
+                        # The worker may have flushed its last results as it exited
+                        source, batch = results.get_nowait()
+                    except queue.Empty:
+                        raise RuntimeError("A video chunk worker exited unexpectedly")
+
+                if batch is None:
+                    finished.add(source)
+                elif isinstance(batch, str):
+                    raise RuntimeError(f"Video chunk analysis failed: {batch}")
+                else:
+                    buffered[source].append(batch)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
+def _chunk_results(batch: Dict, fps: float, joint_names: Sequence[str]) -> Iterator[Dict]:
+    """Per-frame result dictionaries of one batch from a chunk worker."""
+    for offset, detected in enumerate(batch['detected'].tolist()):
+        sequence = batch['start'] + offset
+        angles = batch['joint_angles'][offset].tolist()
+        metrics = batch['metrics'][offset].tolist()
+        yield {
+            'sequence': sequence,
+            'timestamp': sequence / fps,
+            'person_id': 0 if detected else None,
+            'accuracy': float(batch['accuracies'][offset]),
+            'landmarks': batch['landmarks'][offset] if detected else None,
+            'joint_angles': {joint: angle for joint, angle in zip(joint_names, angles) if angle == angle},
+            'metrics': {metric: value for metric, value in zip(FRAME_METRICS, metrics) if value == value},
+            'timings': batch['timings'][offset].tolist()
+        }
@@ -0,0 +1,161 @@
+"""
+Frame Sources - Cameras, recorded-session replay and recording for the live stream
+
+Every source has the cv2.VideoCapture interface used by the capture loop in
+app.py (isOpened, read, release), so a recorded session can stand in for the
+camera to reproduce problems or load-test the live path without hardware.
+"""
+
+import os
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class ReplaySource:
+    """
+    Replays a video file as if it were a live camera.
+
+    At speed 1.0 frames are delivered at the recording's frame rate; a reader
+    that falls behind gets the frame due now, as with a real camera, and the
+    skipped frames are counted. Speed 0 delivers frames as fast as they are read.
+    """
+
+    # Frames are delivered at their own pace, so the reader should not throttle
+    paced = True
+
+    def __init__(self, path: str, speed: float = 1.0, loop: bool = True):
+        """
+        Args:
+            path: Video file to replay
+            speed: Playback rate relative to real time; 0 disables pacing
+            loop: Start over at the end of the file instead of ending the stream
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Replay file not found: {path}")
+
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.position = 0  # Frames delivered or skipped since the start
+        self.frames_read = 0
+        self.frames_skipped = 0
+        self.start = None
+
+    def isOpened(self) -> bool:
+        return self.cap is not None and self.cap.isOpened()
+
+    def _advance(self, image: Optional[np.ndarray]) -> Tuple[bool, Optional[np.ndarray]]:
+        """Read the next frame of the file, rewinding at the end if looping."""
+        ret, frame = self.cap.read(image)
+        if not ret and self.loop and self.position > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        return ret, frame
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Read the frame due now, waiting for it if the reader is early.
+
+        Args:
+            image: Optional buffer to decode into, as with cv2.VideoCapture.read
+
+        Returns:
+            Tuple of success flag and frame
+        """
+        if not self.isOpened():
+            return False, None
+
+        if self.speed > 0:
+            rate = self.fps * self.speed
+            now = time.monotonic()
+            if self.start is None:
+                self.start = now
+            due = int((now - self.start) * rate)
+            if due < self.position:
+                # Early: wait until this frame would have been captured
+                time.sleep((self.start + self.position / rate) - now)
+            else:
+                # Late: drop the frames a camera would have overwritten
+                while self.position < due:
+                    if not self.cap.grab():
+                        if not self.loop:
+                            return False, None
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.position += 1
+                    self.frames_skipped += 1
+
+        ret, frame = self._advance(image)
+        if ret:
+            self.position += 1
+            self.frames_read += 1
+        return ret, frame
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class RecordingSource:
+    """Wraps a source and records every frame read from it to a video file for later replay."""
+
+    def __init__(self, source, path: str, fps: float = 30.0):
+        """
+        Args:
+            source: Source to record, e.g. cv2.VideoCapture(0)
+            path: Output video path (MP4)
+            fps: Frame rate written to the file
+        """
+        self.source = source
+        self.path = path
+        self.fps = fps
+        self.writer = None
+        self.paced = getattr(source, 'paced', False)
+
+    def isOpened(self) -> bool:
+        return self.source.isOpened()
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, frame = self.source.read(image) if image is not None else self.source.read()
+        if ret:
+            if self.writer is None:
+                height, width = frame.shape[:2]
+                self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'mp4v'),
+                                              self.fps, (width, height))
+            self.writer.write(frame)
+        return ret, frame
+
+    def release(self) -> None:
+        self.source.release()
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+def open_frame_source(spec: str = '0', speed: float = 1.0, record_path: Optional[str] = None):
+    """
+    Open the frame source for the live stream.
+
+    Args:
+        spec: Camera index (e.g. '0') or path of a video file to replay
+        speed: Replay speed for files; 0 replays as fast as frames are read
+        record_path: Also record the frames to this video file
+
+    Returns:
+        An object with the cv2.VideoCapture read/isOpened/release interface
+    """
+    if spec.isdigit():
+        source = cv2.VideoCapture(int(spec))
+        fps = source.get(cv2.CAP_PROP_FPS) or 30.0
+    else:
+        source = ReplaySource(spec, speed=speed)
+        fps = source.fps
+
+    if record_path:
+        source = RecordingSource(source, record_path, fps)
+    return source
@@ -0,0 +1,48 @@
+"""
+Gunicorn configuration for the OpenPose Analyzer API.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+    OPENPOSE_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py app:app
+
+The default gthread worker serves one request per thread, so every open
+/api/webcam_stream response or long poll holds a thread. The gevent worker
+serves each connection as a greenlet, so one process holds hundreds of idle
+streams; inference, decoding and encoding run on a pool of OPENPOSE_THREADS
+native threads, and uploaded videos on a separate pool of OPENPOSE_JOB_THREADS
+(see serving.py).
+
+The analyzer, the live session and the frame broadcaster are process-global,
+so each worker process runs its own independent session and requests are not
+routed to a particular one. Keep the default of one worker unless a load
+balancer pins each client to a worker.
+"""
+
+import os
+
+bind = os.environ.get('OPENPOSE_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('OPENPOSE_WORKERS', '1'))
+threads = int(os.environ.get('OPENPOSE_THREADS', '4'))
+worker_class = os.environ.get('OPENPOSE_WORKER_CLASS', 'gthread')
+timeout = 120
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded so its locks, events and threads are cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+    worker_connections = int(os.environ.get('OPENPOSE_WORKER_CONNECTIONS', '1000'))
+
+# Importing app is cheap (no MediaPipe, no model), so it can be loaded once in
+# the master and shared copy-on-write with the workers.
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Build and warm up the pose model inside each worker after forking."""
+    import app
+    import serving
+
+    serving.configure_threadpool(threads, int(os.environ.get('OPENPOSE_JOB_THREADS', '2')))
+    app.init_worker()
+    server.log.info(f"Worker {worker.pid} pose model warmed up")
@@ -0,0 +1,259 @@
+"""
+HLS Writer - Segmented video output that is playable while it is being written
+
+Segments are H.264, the only codec browsers and hls.js play in MPEG-TS. They
+are encoded by OpenCV when its build has an H.264 encoder (the pip wheels do
+not), and otherwise by piping frames to an ffmpeg with libx264: the one in
+OPENPOSE_FFMPEG, on the PATH, or bundled with the imageio-ffmpeg package.
+"""
+
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# H.264 fourccs tried in order; browsers and hls.js only play H.264 in MPEG-TS
+H264_FOURCCS = ('avc1', 'H264', 'X264')
+
+_h264_fourcc = False  # Not probed yet
+_ffmpeg = False
+
+
+def find_h264_fourcc() -> Optional[str]:
+    """
+    Find a fourcc for which OpenCV can write H.264 into MPEG-TS segments.
+
+    Returns:
+        The first working fourcc from H264_FOURCCS, or None if this OpenCV build
+        has no H.264 encoder (the pip wheels do not ship one). The result is cached.
+    """
+    global _h264_fourcc
+    if _h264_fourcc is False:
+        _h264_fourcc = None
+        with tempfile.TemporaryDirectory() as directory:
+            for fourcc in H264_FOURCCS:
+                writer = cv2.VideoWriter(os.path.join(directory, f"probe_{fourcc}.ts"),
+                                         cv2.VideoWriter_fourcc(*fourcc), 30.0, (64, 64))
+                opened = writer.isOpened()
+                writer.release()
+                if opened:
+                    _h264_fourcc = fourcc
+                    break
+    return _h264_fourcc
+
+
+def find_ffmpeg() -> Optional[str]:
+    """
+    Find an ffmpeg executable with the libx264 encoder.
+
+    Returns:
+        Path of the first of OPENPOSE_FFMPEG, ffmpeg on the PATH and the
+        imageio-ffmpeg binary that lists libx264, or None. The result is cached.
+    """
+    global _ffmpeg
+    if _ffmpeg is False:
+        _ffmpeg = None
+        candidates = [os.environ.get('OPENPOSE_FFMPEG'), shutil.which('ffmpeg')]
+        try:
+            import imageio_ffmpeg
+            candidates.append(imageio_ffmpeg.get_ffmpeg_exe())
+        except (ImportError, RuntimeError):
+            pass
+
+        for executable in candidates:
+            if not executable:
+                continue
+            try:
+                encoders = subprocess.run([executable, '-hide_banner', '-encoders'],
+                                          capture_output=True, text=True, timeout=10).stdout
+            except (OSError, subprocess.SubprocessError):
+                continue
+            if 'libx264' in encoders:
+                _ffmpeg = executable
+                break
+    return _ffmpeg
+
+
+def find_h264_encoder() -> Optional[Tuple[str, str]]:
+    """
+    Find an H.264 encoder for HLS segments.
+
+    Returns:
+        ('opencv', fourcc) if OpenCV can encode H.264, otherwise ('ffmpeg',
+        executable) if an ffmpeg with libx264 is available, otherwise None
+    """
+    fourcc = find_h264_fourcc()
+    if fourcc is not None:
+        return 'opencv', fourcc
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is not None:
+        return 'ffmpeg', ffmpeg
+    return None
+
+
+class FFmpegWriter:
+    """
+    cv2.VideoWriter-compatible writer that encodes H.264 MPEG-TS with an ffmpeg process.
+
+    Frames are piped to ffmpeg as raw BGR, so nothing is written to disk but
+    the encoded file.
+    """
+
+    def __init__(self, executable: str, path: str, fps: float, frame_size: Tuple[int, int]):
+        width, height = frame_size
+        self.path = path
+        self.process = subprocess.Popen(
+            [executable, '-hide_banner', '-loglevel', 'error', '-y',
+             '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps}', '-i', '-',
+             # yuv420p, the only format browsers decode, needs even dimensions
+             '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-preset', 'veryfast',
+             '-pix_fmt', 'yuv420p', '-an', '-f', 'mpegts', path],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def isOpened(self) -> bool:
+        return self.process.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def release(self) -> None:
+        """Flush the encoder and wait for ffmpeg to finish the file."""
+        if self.process.stdin.closed:
+            return
+        self.process.stdin.close()
+        error = self.process.stderr.read().decode(errors='replace').strip()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg could not encode {self.path}: {error}")
+
+
+class HLSWriter:
+    """
+    Drop-in replacement for cv2.VideoWriter that writes an HLS event playlist.
+
+    Frames are encoded into short MPEG-TS segments. Each segment is renamed into
+    place and appended to the playlist as soon as it is complete, so players can
+    start on the finished part of a video while the rest is still processing.
+    The playlist is closed with #EXT-X-ENDLIST on release().
+    """
+
+    def __init__(self,
+                 playlist_path: str,
+                 fps: float,
+                 frame_size: Tuple[int, int],
+                 segment_duration: float = 2.0,
+                 fourcc: Optional[str] = None):
+        """
+        Initialize the writer.
+
+        Args:
+            playlist_path: Path of the .m3u8 playlist; segments are written next to it
+            fps: Frames per second of the output
+            frame_size: (width, height) of the frames
+            segment_duration: Target duration of each segment in seconds
+            fourcc: OpenCV codec for the segments; defaults to the H.264 encoder
+                found by find_h264_encoder()
+
+        Raises:
+            RuntimeError: If no fourcc is given and neither OpenCV nor ffmpeg can
+                encode H.264
+        """
+        self.ffmpeg = None
+        if fourcc is None:
+            encoder = find_h264_encoder()
+            if encoder is None:
+                raise RuntimeError("HLS segments need an H.264 encoder to play in browsers; install "
+                                   "imageio-ffmpeg or ffmpeg with libx264, or set OPENPOSE_FFMPEG")
+            kind, fourcc = encoder
+            if kind == 'ffmpeg':
+                self.ffmpeg, fourcc = fourcc, None
+
+        self.playlist_path = playlist_path
+        self.directory = os.path.dirname(playlist_path) or '.'
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.frame_size = frame_size
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc) if fourcc else None
+        self.frames_per_segment = max(1, int(round(self.fps * segment_duration)))
+        self.target_duration = max(1, math.ceil(self.frames_per_segment / self.fps))
+
+        self.segments: List[Tuple[str, float]] = []
+        self.writer = None
+        self.segment_name = None
+        self.frames_in_segment = 0
+        self.released = False
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_playlist(ended=False)
+
+    def isOpened(self) -> bool:
+        return not self.released
+
+    def write(self, frame: np.ndarray) -> None:
+        """Append a frame, closing the current segment once it is full."""
+        if self.writer is None:
+            self._open_segment()
+
+        self.writer.write(frame)
+        self.frames_in_segment += 1
+
+        if self.frames_in_segment >= self.frames_per_segment:
+            self._close_segment()
+
+    def release(self) -> None:
+        """Finish the last segment and mark the playlist as complete."""
+        if self.released:
+            return
+        if self.writer is not None:
+            self._close_segment()
+        self._write_playlist(ended=True)
+        self.released = True
+
+    def _segment_path(self, name: str, partial: bool = False) -> str:
+        # Partial segments are hidden but keep their extension so OpenCV picks the container
+        return os.path.join(self.directory, f".{name}" if partial else name)
+
+    def _open_segment(self) -> None:
+        self.segment_name = f"segment_{len(self.segments):05d}.ts"
+        segment_path = self._segment_path(self.segment_name, partial=True)
+        if self.ffmpeg:
+            self.writer = FFmpegWriter(self.ffmpeg, segment_path, self.fps, self.frame_size)
+        else:
+            self.writer = cv2.VideoWriter(segment_path, self.fourcc, self.fps, self.frame_size)
+        if not self.writer.isOpened():
+            self.writer = None
+            raise RuntimeError(f"Could not open HLS segment {self.segment_name} for writing")
+        self.frames_in_segment = 0
+
+    def _close_segment(self) -> None:
+        self.writer.release()
+        os.replace(self._segment_path(self.segment_name, partial=True),
+                   self._segment_path(self.segment_name))
+        self.segments.append((self.segment_name, self.frames_in_segment / self.fps))
+        self.writer = None
+        self._write_playlist(ended=False)
+
+    def _write_playlist(self, ended: bool) -> None:
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{self.target_duration}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:EVENT'
+        ]
+        for index, (name, duration) in enumerate(self.segments):
+            # Every segment is encoded independently and restarts its timestamps
+            if index > 0:
+                lines.append('#EXT-X-DISCONTINUITY')
+            lines.append(f'#EXTINF:{duration:.3f},')
+            lines.append(name)
+        if ended:
+            lines.append('#EXT-X-ENDLIST')
+
+        partial_path = f"{self.playlist_path}.part"
+        with open(partial_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(partial_path, self.playlist_path)
@@ -0,0 +1,316 @@
+"""
+Load Generator - Simulated live sessions and stream viewers against the pose analyzer API
+
+Usage:
+    OPENPOSE_FRAME_SOURCE=session.mp4 gunicorn -c gunicorn.conf.py app:app
+    python loadgen.py --url http://localhost:5000 --viewers 8 --duration 60
+    python loadgen.py --url http://host:5001 --url http://host:5002 --sessions 4 --min-fps 15
+
+Each API worker process serves one live session: one capture loop whose frames
+are broadcast to every viewer. A simulated session starts analysis, long-polls
+/api/get_feedback and holds --viewers connections to /api/webcam_stream.
+Sessions are spread round-robin over the --url servers, so point them at
+separate servers to load independent sessions, or share one URL to load many
+viewers of one session.
+
+The report gives per-viewer frame rates, capture-to-client latency percentiles
+and drop rates for the stream and for feedback updates. Latency compares the
+server's capture timestamp with the local clock, so run the generator on the
+server or keep the clocks synchronized. With --min-fps or --max-latency-ms the
+exit status is 1 if any threshold is missed, to certify capacity.
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+def summarize_ms(samples: List[float]) -> Dict:
+    """Count, mean and percentiles of durations in seconds, reported in milliseconds."""
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': len(samples),
+        'mean': float(values.mean()),
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+        'max': float(values.max())
+    }
+
+
+def _connect(url: str, timeout: float) -> http.client.HTTPConnection:
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return connection_class(parts.hostname, parts.port, timeout=timeout)
+
+
+def _request(url: str, method: str, path: str, timeout: float = 30.0) -> Dict:
+    """Make one JSON API request on a fresh connection."""
+    connection = _connect(url, timeout)
+    try:
+        connection.request(method, path, body=b'{}' if method == 'POST' else None,
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        body = response.read()
+        if response.status >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status}")
+        return json.loads(body)
+    finally:
+        connection.close()
+
+
+class StreamViewer(threading.Thread):
+    """Reads /api/webcam_stream like a browser and records every frame it receives."""
+
+    def __init__(self, url: str, stop: threading.Event, timeout: float = 10.0):
+        super().__init__(daemon=True)
+        self.url = url
+        self.stop = stop
+        self.timeout = timeout
+        self.frames = 0
+        self.dropped = 0
+        self.latencies = []
+        self.first_frame = None
+        self.last_frame = None
+        self.error = None
+
+    def run(self) -> None:
+        connection = _connect(self.url, self.timeout)
+        try:
+            connection.request('GET', '/api/webcam_stream')
+            response = connection.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f"/api/webcam_stream returned {response.status}")
+
+            last_sequence = None
+            while not self.stop.is_set():
+                headers = self._read_part_headers(response)
+                if headers is None:
+                    break
+                response.read(int(headers['content-length']) + 2)  # JPEG and trailing CRLF
+                received = time.time()
+
+                self.frames += 1
+                self.first_frame = self.first_frame or received
+                self.last_frame = received
+                if 'x-timestamp' in headers:
+                    self.latencies.append(received - float(headers['x-timestamp']))
+                if 'x-sequence' in headers:
+                    sequence = int(headers['x-sequence'])
+                    if last_sequence is not None and sequence > last_sequence + 1:
+                        self.dropped += sequence - last_sequence - 1
+                    last_sequence = sequence
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _read_part_headers(response) -> Optional[Dict[str, str]]:
+        """Skip to the next part boundary and return its headers, or None at the end."""
+        while True:
+            line = response.readline()
+            if not line:
+                return None
+            if line.strip() == b'--frame':
+                break
+
+        headers = {}
+        while True:
+            line = response.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    @property
+    def fps(self) -> float:
+        if self.frames < 2:
+            return 0.0
+        return (self.frames - 1) / (self.last_frame - self.first_frame)
+
+
+class FeedbackPoller(threading.Thread):
+    """Long-polls /api/get_feedback the way the frontend follows a live session."""
+
+    def __init__(self, url: str, stop: threading.Event, poll_timeout: float = 5.0):
+        super().__init__(daemon=True)
+        self.url = url
+        self.stop = stop
+        self.poll_timeout = poll_timeout
+        self.requests = 0
+        self.errors = 0
+        self.updates = 0
+        self.dropped = 0
+        self.request_latencies = []
+        self.freshness = []
+
+    def run(self) -> None:
+        sequence = None
+        while not self.stop.is_set():
+            path = '/api/get_feedback'
+            if sequence is not None:
+                path += f"?after={sequence}&timeout={self.poll_timeout}"
+
+            start = time.time()
+            try:
+                feedback = _request(self.url, 'GET', path, timeout=self.poll_timeout + 10)
+            except Exception:
+                self.errors += 1
+                time.sleep(0.1)
+                continue
+            received = time.time()
+            self.requests += 1
+            self.request_latencies.append(received - start)
+
+            new_sequence = feedback.get('sequence', 0)
+            if sequence is not None and new_sequence > sequence:
+                self.updates += 1
+                self.dropped += new_sequence - sequence - 1
+                if feedback.get('captured_at'):
+                    self.freshness.append(received - feedback['captured_at'])
+            sequence = new_sequence
+
+
+def run_load(urls: List[str], sessions: int = 1, viewers: int = 4, duration: float = 30.0,
+             ramp: float = 0.0, analyze: bool = True, poll_timeout: float = 5.0) -> Dict:
+    """
+    Simulate live sessions and viewers and measure what they receive.
+
+    Args:
+        urls: Base URLs of the API servers; sessions are assigned round-robin
+        sessions: Number of simulated sessions
+        viewers: Stream connections per session
+        duration: Seconds to hold the load after the ramp
+        ramp: Seconds over which sessions are started
+        analyze: Start pose analysis in each session, so inference is included
+        poll_timeout: Long-poll timeout for feedback requests
+
+    Returns:
+        Report dictionary (see README)
+    """
+    stop = threading.Event()
+    plan = []
+    for index in range(sessions):
+        url = urls[index % len(urls)]
+        plan.append({
+            'url': url,
+            'viewers': [StreamViewer(url, stop) for _ in range(viewers)],
+            'poller': FeedbackPoller(url, stop, poll_timeout)
+        })
+
+    for index, session in enumerate(plan):
+        if analyze:
+            _request(session['url'], 'POST', '/api/start_analysis')
+        for viewer in session['viewers']:
+            viewer.start()
+        session['poller'].start()
+        if ramp and index < len(plan) - 1:
+            time.sleep(ramp / max(len(plan) - 1, 1))
+
+    time.sleep(duration)
+    stop.set()
+
+    for session in plan:
+        for viewer in session['viewers']:
+            viewer.join(timeout=15)
+        session['poller'].join(timeout=poll_timeout + 15)
+    if analyze:
+        for url in dict.fromkeys(session['url'] for session in plan):
+            try:
+                _request(url, 'POST', '/api/stop_analysis')
+            except Exception:
+                pass
+
+    all_viewers = [viewer for session in plan for viewer in session['viewers']]
+    pollers = [session['poller'] for session in plan]
+    viewer_fps = [viewer.fps for viewer in all_viewers]
+    frames = sum(viewer.frames for viewer in all_viewers)
+    dropped = sum(viewer.dropped for viewer in all_viewers)
+    updates = sum(poller.updates for poller in pollers)
+    missed_updates = sum(poller.dropped for poller in pollers)
+
+    return {
+        'urls': urls,
+        'sessions': sessions,
+        'viewers_per_session': viewers,
+        'duration_seconds': duration,
+        'analyze': analyze,
+        'stream': {
+            'connections': len(all_viewers),
+            'errors': [viewer.error for viewer in all_viewers if viewer.error],
+            'frames': frames,
+            'fps': {
+                'mean': float(np.mean(viewer_fps)) if viewer_fps else 0.0,
+                'min': float(np.min(viewer_fps)) if viewer_fps else 0.0
+            },
+            'latency_ms': summarize_ms([latency for viewer in all_viewers for latency in viewer.latencies]),
+            'drop_rate': dropped / (frames + dropped) if frames + dropped else 0.0
+        },
+        'feedback': {
+            'requests': sum(poller.requests for poller in pollers),
+            'errors': sum(poller.errors for poller in pollers),
+            'request_ms': summarize_ms([latency for poller in pollers for latency in poller.request_latencies]),
+            'freshness_ms': summarize_ms([age for poller in pollers for age in poller.freshness]),
+            'drop_rate': missed_updates / (updates + missed_updates) if updates + missed_updates else 0.0
+        }
+    }
+
+
+def check_thresholds(report: Dict, min_fps: Optional[float], max_latency_ms: Optional[float]) -> List[str]:
+    """Capacity thresholds the report misses, as messages."""
+    failures = []
+    stream = report['stream']
+    if stream['errors']:
+        failures.append(f"{len(stream['errors'])} stream connections failed")
+    if min_fps is not None and stream['fps']['min'] < min_fps:
+        failures.append(f"slowest viewer received {stream['fps']['min']:.1f} fps (< {min_fps})")
+    p95 = stream['latency_ms'].get('p95')
+    if max_latency_ms is not None and (p95 is None or p95 > max_latency_ms):
+        failures.append(f"p95 stream latency {p95} ms (> {max_latency_ms})")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Load-test the live analysis path of the pose analyzer API')
+    parser.add_argument('--url', action='append', help='API base URL; repeat for several servers '
+                                                       '(default: http://localhost:5000)')
+    parser.add_argument('--sessions', type=int, default=1, help='Simulated live sessions')
+    parser.add_argument('--viewers', type=int, default=4, help='Stream viewers per session')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to hold the load')
+    parser.add_argument('--ramp', type=float, default=0.0, help='Seconds over which sessions start')
+    parser.add_argument('--no-analyze', action='store_true', help='Stream without running pose analysis')
+    parser.add_argument('--poll-timeout', type=float, default=5.0, help='Feedback long-poll timeout')
+    parser.add_argument('--min-fps', type=float, help='Fail if any viewer receives fewer frames per second')
+    parser.add_argument('--max-latency-ms', type=float, help='Fail if p95 stream latency is higher')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    report = run_load(args.url or ['http://localhost:5000'], args.sessions, args.viewers, args.duration,
+                      args.ramp, not args.no_analyze, args.poll_timeout)
+    failures = check_thresholds(report, args.min_fps, args.max_latency_ms)
+    report['failures'] = failures
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
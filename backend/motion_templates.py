@@ -0,0 +1,446 @@
+"""
+Motion Templates - Reference exercise trajectories and fast DTW comparison
+"""
+
+import json
+import os
+import re
+import uuid
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from rep_counter import RepCounter
+
+# Every trajectory is resampled to this many steps before comparison
+DEFAULT_LENGTH = 64
+
+# Sakoe-Chiba band as a fraction of the trajectory length
+DEFAULT_BAND = 0.1
+
+# RMS deviation in degrees below which a movement counts as matching its template
+DEFAULT_TOLERANCE = 15.0
+
+DEFAULT_JOINTS = ('left_knee', 'right_knee', 'left_hip', 'right_hip')
+
+
+def resample(trajectory: np.ndarray, length: int = DEFAULT_LENGTH) -> np.ndarray:
+    """
+    Linearly resample a (T, J) trajectory to (length, J).
+
+    Args:
+        trajectory: Joint angles per frame, one column per joint
+        length: Number of output steps
+
+    Returns:
+        Resampled trajectory
+    """
+    trajectory = np.asarray(trajectory, dtype=np.float64)
+    old = np.linspace(0.0, 1.0, len(trajectory))
+    new = np.linspace(0.0, 1.0, length)
+    return np.stack([np.interp(new, old, trajectory[:, j]) for j in range(trajectory.shape[1])], axis=1)
+
+
+def envelope(trajectory: np.ndarray, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Upper and lower LB_Keogh envelopes of a trajectory.
+
+    Args:
+        trajectory: (T, J) trajectory
+        radius: Warping window radius in steps
+
+    Returns:
+        (upper, lower) arrays with the shape of the trajectory
+    """
+    padded = np.pad(trajectory, ((radius, radius), (0, 0)), mode='edge')
+    windows = sliding_window_view(padded, 2 * radius + 1, axis=0)
+    return windows.max(axis=-1), windows.min(axis=-1)
+
+
+def lb_keogh(query: np.ndarray, upper: np.ndarray, lower: np.ndarray) -> float:
+    """
+    LB_Keogh lower bound of the banded DTW cost between a query and a template.
+
+    Args:
+        query: (T, J) query trajectory
+        upper: Template upper envelope
+        lower: Template lower envelope
+
+    Returns:
+        Sum of squared envelope violations
+    """
+    excess = query - np.clip(query, lower, upper)
+    return float(np.einsum('ij,ij->', excess, excess))
+
+
+def dtw_distance(query: np.ndarray, template: np.ndarray, radius: int,
+                 cutoff: float = np.inf) -> float:
+    """
+    Banded DTW cost between two equal-length trajectories.
+
+    Cells are filled one anti-diagonal at a time, so each step is a single
+    vectorized operation over the band. Every warping path crosses each pair of
+    consecutive anti-diagonals, so the computation is abandoned as soon as both
+    exceed `cutoff`.
+
+    Args:
+        query: (T, J) query trajectory
+        template: (T, J) template trajectory
+        radius: Sakoe-Chiba band radius in steps
+        cutoff: Abandon and return inf once the cost is known to exceed this
+
+    Returns:
+        Sum of squared joint-angle differences along the optimal warping path;
+        any result above `cutoff` (inf or not) means the cost exceeds it
+    """
+    n = len(query)
+    diff = query[:, None, :] - template[None, :, :]
+    cost = np.einsum('ijk,ijk->ij', diff, diff).ravel()
+
+    acc = np.full((n + 1) * (n + 1), np.inf)
+    acc[0] = 0.0
+    previous_min = np.inf
+
+    for cells, cost_cells in _band_diagonals(n, radius):
+        # Neighbours in the flattened (n + 1) x (n + 1) matrix: diagonal, up, left
+        acc[cells] = cost[cost_cells] + np.minimum(np.minimum(acc[cells - n - 2], acc[cells - n - 1]),
+                                                   acc[cells - 1])
+
+        if cutoff < np.inf:
+            current_min = acc[cells].min()
+            if current_min > cutoff and previous_min > cutoff:
+                return np.inf
+            previous_min = current_min
+
+    return float(acc[-1])
+
+
+@lru_cache(maxsize=32)
+def _band_diagonals(n: int, radius: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Flat indices of the accumulated-cost and cost cells on each anti-diagonal of the band."""
+    diagonals = []
+    for k in range(2, 2 * n + 1):
+        i = np.arange(max(1, k - n, (k - radius + 1) // 2), min(n, k - 1, (k + radius) // 2) + 1)
+        j = k - i
+        diagonals.append((i * (n + 1) + j, (i - 1) * n + (j - 1)))
+    return diagonals
+
+
+def trajectory_from_frames(frames: Sequence[Dict[str, float]], joints: Sequence[str]) -> Optional[np.ndarray]:
+    """Stack per-frame joint angle dicts into a (T, J) array, skipping incomplete frames."""
+    rows = [[angles[joint] for joint in joints] for angles in frames
+            if all(joint in angles for joint in joints)]
+    return np.array(rows, dtype=np.float64) if len(rows) >= 2 else None
+
+
+class MotionTemplate:
+    """A reference joint-angle trajectory, e.g. one rep recorded by a therapist."""
+
+    def __init__(self, name: str, joints: Sequence[str], trajectory: np.ndarray,
+                 length: int = DEFAULT_LENGTH, source: Optional[str] = None):
+        """
+        Initialize the template.
+
+        Args:
+            name: Exercise name; several templates may share one name
+            joints: Joint angles the trajectory covers, in column order
+            trajectory: (T, J) joint angles in degrees
+            length: Number of steps the trajectory is resampled to
+            source: Optional description of the recording it came from
+        """
+        self.name = name
+        self.joints = tuple(joints)
+        self.trajectory = resample(trajectory, length)
+        self.source = source
+        self.template_id = None
+        self._envelopes = {}
+
+    def envelope(self, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Envelope for a band radius, computed once and cached."""
+        cached = self._envelopes.get(radius)
+        if cached is None:
+            cached = self._envelopes[radius] = envelope(self.trajectory, radius)
+        return cached
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'joints': list(self.joints),
+            'trajectory': self.trajectory.round(2).tolist(),
+            'source': self.source
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, length: int = DEFAULT_LENGTH) -> 'MotionTemplate':
+        return cls(data['name'], data['joints'], np.array(data['trajectory']), length, data.get('source'))
+
+
+class TemplateLibrary:
+    """
+    Collection of motion templates with a pruned nearest-template search.
+
+    Candidates are ranked by their LB_Keogh bound against cached template
+    envelopes; full DTW runs only while the bound is below the best distance
+    found so far, with early abandoning against that distance.
+    """
+
+    def __init__(self, directory: Optional[str] = None, length: int = DEFAULT_LENGTH,
+                 band: float = DEFAULT_BAND, tolerance: float = DEFAULT_TOLERANCE):
+        """
+        Initialize the library.
+
+        Args:
+            directory: Directory of template JSON files to load and save to
+            length: Number of steps every trajectory is resampled to
+            band: Warping band as a fraction of the length
+            tolerance: RMS deviation in degrees below which a match is within tolerance
+        """
+        self.directory = directory
+        self.length = length
+        self.radius = max(1, int(round(length * band)))
+        self.tolerance = tolerance
+        self.templates: List[MotionTemplate] = []
+        self.loaded_mtime = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.load()
+
+    def load(self) -> None:
+        """(Re)load every template in the library directory."""
+        self.loaded_mtime = os.stat(self.directory).st_mtime_ns
+        templates = []
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith('.json'):
+                with open(os.path.join(self.directory, filename)) as f:
+                    template = MotionTemplate.from_dict(json.load(f), self.length)
+                template.template_id = filename[:-len('.json')]
+                templates.append(template)
+        self.templates = templates
+
+    def refresh(self) -> None:
+        """Reload if templates were added to the directory, e.g. by another worker process."""
+        if self.directory and os.stat(self.directory).st_mtime_ns != self.loaded_mtime:
+            self.load()
+
+    def add(self, template: MotionTemplate) -> MotionTemplate:
+        """Add a template, saving it to the library directory if there is one."""
+        slug = re.sub(r'[^a-z0-9]+', '_', template.name.lower()).strip('_') or 'template'
+        template.template_id = f"{slug}_{uuid.uuid4().hex[:8]}"
+
+        if self.directory:
+            path = os.path.join(self.directory, f"{template.template_id}.json")
+            with open(f"{path}.part", 'w') as f:
+                json.dump(template.to_dict(), f)
+            os.replace(f"{path}.part", path)
+
+        self.templates.append(template)
+        return template
+
+    def list_templates(self) -> List[Dict]:
+        return [{'id': template.template_id, 'name': template.name, 'joints': list(template.joints),
+                 'source': template.source} for template in self.templates]
+
+    def match(self, frames: Sequence[Dict[str, float]]) -> Optional[Dict]:
+        """
+        Find the template closest to a movement.
+
+        Args:
+            frames: Joint angle dicts of the movement, one per frame
+
+        Returns:
+            Best match with its RMS deviation in degrees per joint and step, or
+            None if no template's joints were present in enough frames
+        """
+        queries = {}
+        candidates = []
+        for template in self.templates:
+            if template.joints not in queries:
+                trajectory = trajectory_from_frames(frames, template.joints)
+                queries[template.joints] = resample(trajectory, self.length) if trajectory is not None else None
+            query = queries[template.joints]
+            if query is None:
+                continue
+
+            # Costs are compared per joint and step so templates over different joints are comparable
+            scale = self.length * len(template.joints)
+            bound = lb_keogh(query, *template.envelope(self.radius)) / scale
+            candidates.append((bound, scale, template, query))
+
+        if not candidates:
+            return None
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        best_cost = np.inf
+        best_template = None
+        computed = 0
+        for bound, scale, template, query in candidates:
+            if bound >= best_cost:
+                break
+            computed += 1
+            cost = dtw_distance(query, template.trajectory, self.radius, best_cost * scale) / scale
+            if cost < best_cost:
+                best_cost = cost
+                best_template = template
+
+        distance = float(np.sqrt(best_cost))
+        return {
+            'template_id': best_template.template_id,
+            'name': best_template.name,
+            'distance': distance,
+            'within_tolerance': distance <= self.tolerance,
+            'candidates': len(candidates),
+            'pruned': len(candidates) - computed
+        }
+
+    def match_history(self, history: Sequence[Dict], primary_joint: str = 'left_knee') -> List[Dict]:
+        """
+        Segment a recorded session into reps and match each against the library.
+
+        Args:
+            history: OpenPoseAnalyzer.results_history entries
+            primary_joint: Joint angle used to segment reps
+
+        Returns:
+            One entry per rep with its timing and best match
+        """
+        self.refresh()
+        matches = []
+        for rep, frames in segment_reps(history, primary_joint):
+            matches.append({
+                'rep': rep['rep'],
+                'start': rep['start'],
+                'end': rep['end'],
+                'match': self.match(frames)
+            })
+        return matches
+
+    def create_from_history(self, name: str, history: Sequence[Dict],
+                            joints: Sequence[str] = DEFAULT_JOINTS,
+                            primary_joint: str = 'left_knee',
+                            source: Optional[str] = None) -> List[MotionTemplate]:
+        """
+        Add templates from a recorded reference session.
+
+        Each rep of the recording becomes one template under `name`; a recording
+        without detectable reps becomes a single template.
+
+        Args:
+            name: Exercise name
+            history: OpenPoseAnalyzer.results_history entries of the reference recording
+            joints: Joint angles to include
+            primary_joint: Joint angle used to segment reps
+            source: Optional description of the recording
+
+        Returns:
+            The templates that were added
+        """
+        if not history:
+            raise ValueError("No analysis data available to create a template from")
+
+        segments = [frames for _, frames in segment_reps(history, primary_joint)]
+        if not segments:
+            segments = [[entry['joint_angles'] for entry in history]]
+
+        added = []
+        for frames in segments:
+            trajectory = trajectory_from_frames(frames, joints)
+            if trajectory is not None:
+                added.append(self.add(MotionTemplate(name, joints, trajectory, self.length, source)))
+
+        if not added:
+            raise ValueError(f"Recording does not contain the joints {', '.join(joints)}")
+        return added
+
+
+def segment_reps(history: Sequence[Dict], primary_joint: str = 'left_knee') -> List[Tuple[Dict, List[Dict]]]:
+    """Split a recorded session into (rep, frames) pairs by replaying a RepCounter over it."""
+    counter = RepCounter(primary_joint=primary_joint)
+    segments = []
+    window = deque()
+    for entry in history:
+        window.append((entry['timestamp'], entry['joint_angles']))
+        rep = counter.update(entry['joint_angles'], entry['timestamp'])
+        if rep is not None:
+            segments.append((rep, [angles for timestamp, angles in window if timestamp >= rep['start']]))
+        # Keep only the frames the rep in progress can still need
+        if counter.peak_time is not None:
+            while window and window[0][0] < counter.peak_time:
+                window.popleft()
+    return segments
+
+
+class LiveTemplateMatcher:
+    """
+    Matches each completed rep of a live session against a template library.
+
+    Keeps a bounded buffer of recent joint angles, so memory stays constant
+    however long the session runs.
+    """
+
+    def __init__(self, library: TemplateLibrary, max_frames: int = 900):
+        """
+        Initialize the matcher.
+
+        Args:
+            library: Templates to compare against
+            max_frames: Frames kept for the rep in progress (30 s at 30 fps)
+        """
+        self.library = library
+        self.frames = deque(maxlen=max_frames)
+        self.reset()
+
+    def reset(self) -> None:
+        self.frames.clear()
+        self.last_match = None
+        self.reps_matched = 0
+        self.within_tolerance = 0
+        self.distance_sum = 0.0
+        self.by_template = {}
+
+    def update(self, joint_angles: Dict[str, float], timestamp: float,
+               completed_rep: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Feed one frame, matching the rep it completes if any.
+
+        Args:
+            joint_angles: Joint angles of the frame
+            timestamp: Frame time in seconds
+            completed_rep: The rep returned by RepCounter.update() for this frame
+
+        Returns:
+            The match for the completed rep, otherwise None
+        """
+        self.frames.append((timestamp, joint_angles))
+        if completed_rep is None:
+            return None
+
+        self.library.refresh()
+        if not self.library.templates:
+            return None
+
+        frames = [angles for frame_time, angles in self.frames if frame_time >= completed_rep['start']]
+        match = self.library.match(frames)
+        if match is None:
+            return None
+
+        match['rep'] = completed_rep['rep']
+        self.last_match = match
+        self.reps_matched += 1
+        self.distance_sum += match['distance']
+        if match['within_tolerance']:
+            self.within_tolerance += 1
+        self.by_template[match['name']] = self.by_template.get(match['name'], 0) + 1
+        return match
+
+    def get_summary(self) -> Dict:
+        return {
+            'reps_matched': self.reps_matched,
+            'within_tolerance': self.within_tolerance,
+            'avg_distance': self.distance_sum / self.reps_matched if self.reps_matched else None,
+            'by_template': dict(self.by_template),
+            'last_match': self.last_match
+        }
@@ -4,15 +4,52 @@ OpenPose Analyzer - A comprehensive pose analysis tool using OpenPose/MediaPipe
 
 import cv2
 import numpy as np
-import mediapipe as mp
 import time
 import json
 import os
 from datetime import datetime
-import pandas as pd
 import math
+from types import SimpleNamespace
 from typing import List, Dict, Tuple, Optional, Union
 
+import telemetry
+from hls_writer import HLSWriter
+from activity_index import ActivityRecognizer, embed_landmarks
+from motion_gate import MotionGate
+from motion_templates import LiveTemplateMatcher, TemplateLibrary
+from pose_backends import PoseBackend, from_landmark_list, to_landmark_list
+from rep_counter import RepCounter
+from running_stats import SessionStats
+
+# Format version of the landmark sidecar written by analyze_video. The file is
+# JSON Lines: a header object (video metadata and skeleton connections)
+# followed by one object per frame with a detected pose.
+SIDECAR_VERSION = 1
+
+# Fewest frames worth a separate analyzer process in analyze_video; each one
+# spends a second or two importing MediaPipe and building its graph
+MIN_CHUNK_FRAMES = 300
+
+
+def read_sidecar(sidecar_path: str) -> Tuple[Dict, List[Dict]]:
+    """
+    Read a landmark sidecar written by OpenPoseAnalyzer.analyze_video.
+
+    Args:
+        sidecar_path: Path to the sidecar file
+
+    Returns:
+        Tuple of the header dictionary and the list of per-frame records
+    """
+    with open(sidecar_path) as f:
+        header = json.loads(f.readline())
+        if header.get('version') != SIDECAR_VERSION:
+            raise ValueError(f"Unsupported sidecar version: {header.get('version')}")
+        records = [json.loads(line) for line in f if line.strip()]
+
+    return header, records
+
+
 class OpenPoseAnalyzer:
     """
     A class for analyzing human poses using MediaPipe Pose.
@@ -22,28 +59,43 @@ class OpenPoseAnalyzer:
     def __init__(self,
                  model_complexity: int = 1,
                  min_detection_confidence: float = 0.5,
-                 min_tracking_confidence: float = 0.5):
+                 min_tracking_confidence: float = 0.5,
+                 keep_history: bool = True):
         """
         Initialize the OpenPoseAnalyzer with MediaPipe Pose.
 
+        The MediaPipe graph is not built here; it is created on first use or by
+        warmup(), so the analyzer can be constructed before a process forks.
+
         Args:
             model_complexity: Model complexity (0, 1, or 2). Higher is more accurate but slower.
             min_detection_confidence: Minimum confidence for pose detection.
             min_tracking_confidence: Minimum confidence for pose tracking.
+            keep_history: Keep per-frame results for export_results(). Disable for
+                long live sessions; the summary is computed from running statistics
+                either way.
         """
+        # MediaPipe is slow to import, so it is only loaded once an analyzer is needed
+        import mediapipe as mp
+
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            model_complexity=model_complexity,
-            min_detection_confidence=min_detection_confidence,
-            min_tracking_confidence=min_tracking_confidence
-        )
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.pose = None
+        self.is_warm = False
 
         # Analysis results storage
         self.results_history = []
+        self.keep_history = keep_history
         self.is_analyzing = False
         self.frame_count = 0
         self.start_time = None
+        self.last_result_time = 0
+
+        # Constant-memory per-joint and per-metric statistics for the session
+        self.session_stats = SessionStats()
         
         # Multi-person tracking
         self.person_trackers = {}
@@ -51,9 +103,11 @@ class OpenPoseAnalyzer:
         self.tracking_threshold = 0.5  # IOU threshold for tracking
         
         # 3D pose estimation
-        self.pose_3d = {}
-        self.depth_scale = 1.0  # Scale factor for depth estimation
+        self.pose_3d = {}  # (33, 3) world landmarks in meters, origin between the hips
+        self.joint_angles_3d = {}
+        self.camera_distance = {}  # Meters from the camera to the hip center
         self.camera_matrix = None
+        self.camera_matrices = {}  # Cached intrinsics per (width, height)
         
         # Advanced analytics
         self.movement_history = {}
@@ -65,10 +119,29 @@ class OpenPoseAnalyzer:
         self.posture_feedback = []
         self.current_accuracy = 0
         self.joint_angles = {}
+        self.current_landmarks = None
+        self.current_person_id = None
+        self.metrics_text = None
         self.movement_speed = {}
         self.symmetry_scores = {}
         self.muscle_activation = {}
 
+        # Repetition counting on a primary joint angle; every completed rep of the
+        # session is kept for the progress store (a few per minute)
+        self.rep_counter = RepCounter()
+        self.completed_reps = []
+
+        # Exercise recognition from a labelled pose index (see set_activity_recognizer)
+        self.activity_recognizer = None
+
+        # Comparison of each rep against reference motions (see set_template_library)
+        self.template_matcher = None
+        self.template_match = None
+
+        # Reuse of the previous result for frames where nothing moved (see set_motion_gate)
+        self.motion_gate = None
+        self.reused_frames = 0  # Frames reused since the last inference
+
         # Define joint connections for angle calculations
         self.angle_joints = {
             'left_elbow': [
@@ -112,19 +185,82 @@ class OpenPoseAnalyzer:
                 self.mp_pose.PoseLandmark.RIGHT_ANKLE.value
             ]
         }
+        self.angle_indices = np.array(list(self.angle_joints.values()))
+
+        # Scratch buffers reused by every frame, so the per-frame path does not
+        # allocate frame-sized images or per-landmark arrays
+        self.rgb_buffer = None
+        self.landmark_buffer = np.empty((len(self.mp_pose.PoseLandmark), 4))
+        self.pixel_buffer = np.empty((len(self.angle_joints), 3, 2))
+        self.delta_buffer = np.empty((len(self.angle_joints), 2, 2))
+        self.angle_buffer = np.empty((len(self.angle_joints), 2))
+        self.image_point_buffer = np.empty((len(self.mp_pose.PoseLandmark), 2))
+        self.movement_points = {}  # Previous (33, 2) normalized positions per person
+
+    def load_model(self) -> None:
+        """Build the MediaPipe Pose graph if it has not been built yet."""
+        if self.pose is None:
+            self.pose = self.mp_pose.Pose(
+                model_complexity=self.model_complexity,
+                min_detection_confidence=self.min_detection_confidence,
+                min_tracking_confidence=self.min_tracking_confidence
+            )
+
+    def warmup(self, width: int = 640, height: int = 480, iterations: int = 2) -> None:
+        """
+        Build the pose model and run it on blank frames so the first real frame
+        does not pay for graph initialization.
+
+        Args:
+            width: Width of the dummy frame
+            height: Height of the dummy frame
+            iterations: Number of dummy frames to process
+        """
+        self.load_model()
+        dummy = np.zeros((height, width, 3), dtype=np.uint8)
+        for _ in range(iterations):
+            self.pose.process(cv2.cvtColor(dummy, cv2.COLOR_BGR2RGB))
+        self.is_warm = True
+
+    def start_analysis(self, primary_joint: Optional[str] = None) -> None:
+        """
+        Start the pose analysis session.
+
+        Args:
+            primary_joint: Joint angle used for repetition counting. Keeps the
+                current joint if not given.
+        """
+        if primary_joint is not None and primary_joint not in self.angle_joints:
+            raise ValueError(f"Unknown joint for repetition counting: {primary_joint}")
 
-    def start_analysis(self) -> None:
-        """Start the pose analysis session."""
         self.is_analyzing = True
         self.frame_count = 0
         self.start_time = time.time()
         self.results_history = []
+        self.last_result_time = 0
+        self.session_stats.reset()
         self.posture_feedback = []
+        if primary_joint is not None and primary_joint != self.rep_counter.primary_joint:
+            self.rep_counter = RepCounter(primary_joint=primary_joint)
+        else:
+            self.rep_counter.reset()
+        self.completed_reps = []
+        self.template_match = None
+        if self.template_matcher is not None:
+            self.template_matcher.reset()
+        self.activity_recognition = {}
+        if self.activity_recognizer is not None:
+            self.activity_recognizer.reset()
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        self.reused_frames = 0
+        telemetry.ANALYSIS_ACTIVE.set(1)
         print("Analysis started")
 
     def stop_analysis(self) -> None:
         """Stop the pose analysis session."""
         self.is_analyzing = False
+        telemetry.ANALYSIS_ACTIVE.set(0)
         print("Analysis stopped")
 
     def calculate_angle(self, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
@@ -151,12 +287,73 @@ class OpenPoseAnalyzer:
 
         return angle
 
-    def analyze_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, Dict, float]:
+    def calculate_joint_angles(self, points: np.ndarray, width: int, height: int) -> Dict[str, float]:
+        """
+        Calculate all 2D joint angles at once from a landmark array.
+
+        Gives the same angles as calculate_angle() on each joint's pixel
+        coordinates, computed in the analyzer's scratch buffers.
+
+        Args:
+            points: (33, 2+) array of normalized landmark coordinates
+            width: Frame width in pixels
+            height: Frame height in pixels
+
+        Returns:
+            Dictionary of joint angles in degrees
+        """
+        pixels = self.pixel_buffer
+        np.take(points[:, :2], self.angle_indices, axis=0, out=pixels)
+        pixels[..., 0] *= width
+        pixels[..., 1] *= height
+
+        # Vectors from the vertex to the last and first points of each joint
+        deltas = self.delta_buffer
+        np.subtract(pixels[:, 2], pixels[:, 1], out=deltas[:, 0])
+        np.subtract(pixels[:, 0], pixels[:, 1], out=deltas[:, 1])
+
+        radians = self.angle_buffer
+        np.arctan2(deltas[..., 1], deltas[..., 0], out=radians)
+        angles = radians[:, 0]
+        np.subtract(radians[:, 0], radians[:, 1], out=angles)
+        angles *= 180.0
+        angles /= np.pi
+        np.abs(angles, out=angles)
+        np.subtract(360.0, angles, out=angles, where=angles > 180.0)
+
+        return dict(zip(self.angle_joints, angles.tolist()))
+
+    def _landmark_array(self, pose_landmarks) -> np.ndarray:
+        """Copy a MediaPipe landmark list into the reusable (33, 4) x, y, z, visibility array."""
+        points = self.landmark_buffer
+        if len(points) != len(pose_landmarks.landmark):
+            points = self.landmark_buffer = np.empty((len(pose_landmarks.landmark), 4))
+        return from_landmark_list(pose_landmarks, points)
+
+    def _color_convert(self, frame: np.ndarray) -> np.ndarray:
+        """Convert a BGR frame to RGB in a buffer kept per resolution."""
+        if self.rgb_buffer is None or self.rgb_buffer.shape != frame.shape:
+            self.rgb_buffer = np.empty_like(frame)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb_buffer)
+
+    def analyze_frame(self, frame: np.ndarray, annotate: bool = True,
+                      timestamp: Optional[float] = None,
+                      landmarks: Optional[np.ndarray] = None,
+                      in_place: bool = False) -> Tuple[np.ndarray, Dict, float]:
         """
         Analyze a single frame for pose detection with multi-person support and 3D estimation.
 
         Args:
             frame: Input image frame
+            annotate: Draw landmarks and metrics on a copy of the frame. When False,
+                the input frame is returned unchanged and drawing is skipped.
+            timestamp: Frame time in seconds used for repetition timing, such as the
+                position in a video. Defaults to the time since start_analysis.
+            landmarks: Pose already detected for this frame by a PoseBackend, as a
+                (33, 4) array (NaN if none was found). Inference is skipped, and
+                so is 3D estimation, which needs MediaPipe's world landmarks.
+            in_place: Draw on the input frame instead of a copy, for callers that
+                no longer need the original image
 
         Returns:
             Tuple containing:
@@ -164,97 +361,64 @@ class OpenPoseAnalyzer:
                 - Dictionary of joint angles and 3D poses for each person
                 - Overall pose accuracy score
         """
-        
-        def calculate_iou(box1, box2):
-            """Calculate Intersection over Union between two bounding boxes."""
-            x1, y1, w1, h1 = box1
-            x2, y2, w2, h2 = box2
-            
-            intersection_x = max(0, min(x1 + w1, x2 + w2) - max(x1, x2))
-            intersection_y = max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
-            intersection_area = intersection_x * intersection_y
-            
-            union_area = w1 * h1 + w2 * h2 - intersection_area
-            return intersection_area / union_area if union_area > 0 else 0
-        
-        def estimate_3d_pose(landmarks):
-            """Estimate 3D pose from 2D landmarks using perspective projection."""
-            pose_3d = {}
-            if not self.camera_matrix:
-                h, w, _ = frame.shape
-                focal_length = w
-                center = (w/2, h/2)
-                self.camera_matrix = np.array(
-                    [[focal_length, 0, center[0]],
-                     [0, focal_length, center[1]],
-                     [0, 0, 1]], dtype=np.float32
-                )
-            
-            for landmark in landmarks:
-                # Simple depth estimation based on relative positions
-                z = self.depth_scale * (1 - landmark.visibility)
-                pose_3d[landmark.name] = np.array([landmark.x, landmark.y, z])
-            
-            return pose_3d
+
         if not self.is_analyzing:
             return frame, {}, 0.0
 
-        # Convert the BGR image to RGB
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame_start = time.perf_counter()
+
+        if landmarks is None and self.motion_gate is not None:
+            bbox = self.person_trackers.get(self.current_person_id) if self.current_landmarks else None
+            with telemetry.MOTION_GATE_SECONDS.time():
+                infer = self.motion_gate.should_infer(frame, bbox)
+            if not infer:
+                return self._reuse_previous_result(frame, annotate, timestamp, frame_start, in_place)
 
-        # Process the image and detect poses
-        results = self.pose.process(image_rgb)
+        points = None
+        if landmarks is not None:
+            results = SimpleNamespace(pose_landmarks=to_landmark_list(landmarks), pose_world_landmarks=None)
+            if results.pose_landmarks is not None:
+                points = landmarks
+        else:
+            # Convert the BGR image to RGB
+            with telemetry.COLOR_CONVERSION_SECONDS.time():
+                image_rgb = self._color_convert(frame)
+
+            # Process the image and detect poses
+            if self.pose is None:
+                self.load_model()
+            with telemetry.INFERENCE_SECONDS.time():
+                results = self.pose.process(image_rgb)
 
         # Initialize variables
-        annotated_frame = frame.copy()
+        annotated_frame = frame.copy() if annotate and not in_place else frame
         joint_angles = {}
         accuracy = 0.0
+        metrics_text = None
         detected_people = []
 
         # Process multiple poses if detected
         if results.pose_landmarks:
+            metrics_start = time.perf_counter()
+
             # Get frame dimensions for bounding box calculation
             h, w, _ = frame.shape
             
-            # Calculate bounding box for the current pose
             landmarks = results.pose_landmarks.landmark
-            x_coords = [lm.x * w for lm in landmarks]
-            y_coords = [lm.y * h for lm in landmarks]
-            bbox = [min(x_coords), min(y_coords), 
-                    max(x_coords) - min(x_coords), 
-                    max(y_coords) - min(y_coords)]
-            
-            # Track person ID using IOU
-            max_iou = 0
-            matched_id = None
-            for person_id, prev_bbox in self.person_trackers.items():
-                iou = calculate_iou(bbox, prev_bbox)
-                if iou > max_iou and iou > self.tracking_threshold:
-                    max_iou = iou
-                    matched_id = person_id
-            
-            # Assign new ID if no match found
-            if matched_id is None:
-                matched_id = self.next_person_id
-                self.next_person_id += 1
-            
-            # Update tracker
-            self.person_trackers[matched_id] = bbox
+            if points is None:
+                points = self._landmark_array(results.pose_landmarks)
+            matched_id = self._track_person(points, w, h)
             
             # Estimate 3D pose
-            pose_3d = estimate_3d_pose(landmarks)
-            self.pose_3d[matched_id] = pose_3d
-            
-            # Calculate movement speed
-            if matched_id in self.movement_history:
-                prev_landmarks = self.movement_history[matched_id]
-                speed = np.mean([np.linalg.norm(np.array([lm.x, lm.y]) - 
-                               np.array([prev_landmarks[i].x, prev_landmarks[i].y])) 
-                               for i, lm in enumerate(landmarks)])
-                self.movement_speed[matched_id] = speed
+            if getattr(results, 'pose_world_landmarks', None):
+                pose_3d, distance = self.estimate_3d_pose(results.pose_world_landmarks, points, w, h,
+                                                          self.pose_3d.get(matched_id))
+                self.pose_3d[matched_id] = pose_3d
+                self.joint_angles_3d[matched_id] = self.calculate_joint_angles_3d(pose_3d)
+                if distance is not None:
+                    self.camera_distance[matched_id] = distance
             
-            # Update movement history
-            self.movement_history[matched_id] = landmarks
+            deferred_frames = self._update_movement(matched_id, points, landmarks)
             # Calculate advanced metrics
             symmetry_score = self.calculate_symmetry(landmarks)
             balance_score = self.calculate_balance(landmarks)
@@ -270,67 +434,415 @@ class OpenPoseAnalyzer:
                 fatigue_score = self.detect_fatigue(self.movement_speed[matched_id], 
                                                    self.muscle_activation[matched_id])
                 self.fatigue_metrics[matched_id] = fatigue_score
-            
-            # Draw pose landmarks and metrics
-            self.mp_drawing.draw_landmarks(
-                annotated_frame,
-                results.pose_landmarks,
-                self.mp_pose.POSE_CONNECTIONS,
-                self.mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
-                self.mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2)
-            )
-            
-            # Draw metrics on frame
+
+            # Calculate joint angles
+            if len(points) > self.angle_indices.max():
+                joint_angles = self.calculate_joint_angles(points, w, h)
+
+            # Calculate overall accuracy based on landmark visibility
+            visible_landmarks = int(np.count_nonzero(points[:, 3] > 0.5))
+            accuracy = (visible_landmarks / len(points)) * 100
+
+            # Update repetition counting, template matching and activity recognition
+            frame_time = timestamp if timestamp is not None else time.time() - self.start_time
+            self._update_trackers(matched_id, landmarks, w, h, joint_angles, frame_time)
+
+            telemetry.METRICS_SECONDS.observe(time.perf_counter() - metrics_start)
+
+            # Generate posture feedback
+            with telemetry.FEEDBACK_SECONDS.time():
+                self.generate_posture_feedback(joint_angles, landmarks)
+
             metrics_text = f"Person {matched_id} | "
             metrics_text += f"Symmetry: {symmetry_score:.2f} | "
             metrics_text += f"Balance: {balance_score:.2f}"
-            cv2.putText(annotated_frame, metrics_text,
-                        (int(bbox[0]), int(bbox[1] - 10)),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            self.current_person_id = matched_id
+
+            self._record_frame(matched_id, joint_angles, accuracy)
+            telemetry.DETECTIONS.inc()
+            if deferred_frames and matched_id in self.movement_speed and matched_id in self.fatigue_metrics:
+                # Movement of the reused frames, now that it is known
+                motion_metrics = {'movement_speed': self.movement_speed[matched_id],
+                                  'fatigue': self.fatigue_metrics[matched_id]}
+                for _ in range(deferred_frames):
+                    self.session_stats.update({}, motion_metrics)
+        else:
+            self.reused_frames = 0
 
-            # Calculate joint angles
-            landmarks = results.pose_landmarks.landmark
-            h, w, _ = frame.shape
+        self.metrics_text = metrics_text
+        if annotate:
+            self.draw_annotations(annotated_frame, results.pose_landmarks, joint_angles,
+                                  accuracy, metrics_text)
 
-            for joint_name, joint_indices in self.angle_joints.items():
-                if all(0 <= idx < len(landmarks) for idx in joint_indices):
-                    a = [landmarks[joint_indices[0]].x * w, landmarks[joint_indices[0]].y * h]
-                    b = [landmarks[joint_indices[1]].x * w, landmarks[joint_indices[1]].y * h]
-                    c = [landmarks[joint_indices[2]].x * w, landmarks[joint_indices[2]].y * h]
+        self.current_accuracy = accuracy
+        self.joint_angles = joint_angles
+        self.current_landmarks = results.pose_landmarks
 
-                    angle = self.calculate_angle(a, b, c)
-                    joint_angles[joint_name] = angle
+        telemetry.FRAMES_ANALYZED.inc()
+        telemetry.FRAME_SECONDS.observe(time.perf_counter() - frame_start)
 
-                    # Display angle on the frame
-                    cv2.putText(annotated_frame, f"{joint_name}: {angle:.1f}°",
-                                (int(b[0]), int(b[1])),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2, cv2.LINE_AA)
+        return annotated_frame, joint_angles, accuracy
 
-            # Calculate overall accuracy based on landmark visibility
-            visible_landmarks = sum(1 for landmark in landmarks if landmark.visibility > 0.5)
-            accuracy = (visible_landmarks / len(landmarks)) * 100
+    @staticmethod
+    def _iou(box1: List[float], box2: List[float]) -> float:
+        """Calculate Intersection over Union between two bounding boxes."""
+        x1, y1, w1, h1 = box1
+        x2, y2, w2, h2 = box2
+        
+        intersection_x = max(0, min(x1 + w1, x2 + w2) - max(x1, x2))
+        intersection_y = max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
+        intersection_area = intersection_x * intersection_y
+        
+        union_area = w1 * h1 + w2 * h2 - intersection_area
+        return intersection_area / union_area if union_area > 0 else 0
+
+    def _track_person(self, points: np.ndarray, width: int, height: int) -> int:
+        """Match a pose to a tracked person by bounding-box IOU; returns the person id."""
+        x_min, y_min = points[:, :2].min(axis=0).tolist()
+        x_max, y_max = points[:, :2].max(axis=0).tolist()
+        bbox = [x_min * width, y_min * height, x_max * width - x_min * width, y_max * height - y_min * height]
+        
+        max_iou = 0
+        matched_id = None
+        for person_id, prev_bbox in self.person_trackers.items():
+            iou = self._iou(bbox, prev_bbox)
+            if iou > max_iou and iou > self.tracking_threshold:
+                max_iou = iou
+                matched_id = person_id
+        
+        # Assign new ID if no match found
+        if matched_id is None:
+            matched_id = self.next_person_id
+            self.next_person_id += 1
+        
+        self.person_trackers[matched_id] = bbox
+        return matched_id
 
-            # Generate posture feedback
-            self.generate_posture_feedback(joint_angles, landmarks)
+    def _update_movement(self, person_id: int, points: np.ndarray, landmarks) -> int:
+        """
+        Update a person's movement speed from their landmarks in the previous frame.
+
+        After frames reused by the motion gate, the displacement is shared by
+        all of them. Returns the number of such frames.
+        """
+        deferred_frames, self.reused_frames = self.reused_frames, 0
+        previous_points = self.movement_points.get(person_id)
+        if previous_points is not None and len(previous_points) == len(points):
+            delta = previous_points - points[:, :2]
+            self.movement_speed[person_id] = (float(np.mean(np.hypot(delta[:, 0], delta[:, 1])))
+                                              / (deferred_frames + 1))
+        
+        self.movement_history[person_id] = landmarks
+        if previous_points is None or len(previous_points) != len(points):
+            previous_points = self.movement_points[person_id] = np.empty((len(points), 2))
+        np.copyto(previous_points, points[:, :2])
+        return deferred_frames
+
+    def _reuse_previous_result(self, frame: np.ndarray, annotate: bool, timestamp: Optional[float],
+                               frame_start: float, in_place: bool = False) -> Tuple[np.ndarray, Dict, float]:
+        """
+        Treat a frame the motion gate found unchanged as showing the previous pose.
+
+        The last landmarks, joint angles and metrics are kept. Trackers and
+        session statistics still see the frame at its own time, so rep timing
+        and per-frame averages match an ungated session; feedback is not
+        regenerated because its inputs have not changed. Movement speed and
+        fatigue are recorded once the next frame is inferred, which shares the
+        displacement since the last inference among the frames it covers.
+        """
+        annotated_frame = frame.copy() if annotate and not in_place else frame
+        joint_angles = self.joint_angles
+        person_id = self.current_person_id
+
+        if self.current_landmarks is not None and person_id is not None:
+            h, w = frame.shape[:2]
+            frame_time = timestamp if timestamp is not None else time.time() - self.start_time
+            self._update_trackers(person_id, self.current_landmarks.landmark, w, h, joint_angles, frame_time)
+            self._record_frame(person_id, joint_angles, self.current_accuracy, motion=False)
+            self.reused_frames += 1
+            if annotate:
+                self.draw_annotations(annotated_frame, self.current_landmarks, joint_angles,
+                                      self.current_accuracy, self.metrics_text)
+
+        telemetry.FRAMES_ANALYZED.inc()
+        telemetry.FRAMES_REUSED.inc()
+        telemetry.FRAME_SECONDS.observe(time.perf_counter() - frame_start)
+
+        return annotated_frame, joint_angles, self.current_accuracy
+
+    def _update_trackers(self, person_id: int, landmarks, width: int, height: int,
+                         joint_angles: Dict[str, float], frame_time: float) -> None:
+        """Feed a detected pose to the rep counter, template matcher and activity recognizer."""
+        completed_rep = self.rep_counter.update(joint_angles, frame_time)
+        if completed_rep is not None:
+            completed_rep = dict(completed_rep)
+            self.completed_reps.append(completed_rep)
+        if self.template_matcher is not None:
+            match = self.template_matcher.update(joint_angles, frame_time, completed_rep)
+            if match is not None:
+                self.template_match = match
+                completed_rep['template'] = match['name']
+                completed_rep['template_distance'] = match['distance']
+
+        if self.activity_recognizer is not None:
+            self.activity_recognition[person_id] = self.activity_recognizer.update(
+                person_id, embed_landmarks(landmarks, width, height))
+
+    def _record_frame(self, person_id: int, joint_angles: Dict[str, float], accuracy: float,
+                      motion: bool = True) -> None:
+        """
+        Update session statistics and, if retained, the per-frame history.
 
-            # Store results for history
-            self.frame_count += 1
+        With motion=False the frame's movement speed and fatigue are not
+        recorded, for frames whose pose was not measured.
+        """
+        self.frame_count += 1
+        self.last_result_time = time.time() - self.start_time
+        frame_metrics = {
+            'accuracy': accuracy,
+            'symmetry': self.symmetry_scores[person_id],
+            'balance': self.balance_metrics[person_id]
+        }
+        if motion and person_id in self.movement_speed and person_id in self.fatigue_metrics:
+            frame_metrics['movement_speed'] = self.movement_speed[person_id]
+            frame_metrics['fatigue'] = self.fatigue_metrics[person_id]
+        self.session_stats.update(joint_angles, frame_metrics)
+
+        if self.keep_history:
             self.results_history.append({
                 'frame': self.frame_count,
-                'timestamp': time.time() - self.start_time,
+                'timestamp': self.last_result_time,
                 'joint_angles': joint_angles.copy(),
                 'accuracy': accuracy,
                 'feedback': self.posture_feedback[-5:] if self.posture_feedback else []
             })
 
-        # Display accuracy on the frame
-        cv2.putText(annotated_frame, f"Accuracy: {accuracy:.1f}%",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
+    def ingest_frame_result(self, result: Dict, width: int, height: int) -> None:
+        """
+        Fold a frame analyzed in another process into this analyzer's session.
 
-        self.current_accuracy = accuracy
-        self.joint_angles = joint_angles
+        Landmarks, joint angles, accuracy, symmetry and balance are taken from
+        the result. Everything that depends on earlier frames (person tracking,
+        movement speed, fatigue, repetitions, template matches, activity) is
+        computed here, so results must be ingested in frame order; a worker
+        only sees some of the frames. Feedback, statistics and history are
+        updated as if the frame had been analyzed locally.
 
-        return annotated_frame, joint_angles, accuracy
+        Args:
+            result: Result from FrameWorkerPool.next_result() or analyze_video_chunks()
+            width: Frame width in pixels
+            height: Frame height in pixels
+        """
+        self.current_accuracy = result['accuracy']
+        self.joint_angles = result['joint_angles']
+        telemetry.FRAMES_ANALYZED.inc()
+        telemetry.observe_frame_timings(result.get('timings', ()))
+
+        points = result['landmarks']
+        if points is None:
+            self.current_landmarks = None
+            self.metrics_text = None
+            return
+
+        pose_landmarks = to_landmark_list(points)
+        landmarks = pose_landmarks.landmark
+        self.current_landmarks = pose_landmarks
+        person_id = self._track_person(points, width, height)
+        self._update_movement(person_id, points, landmarks)
+
+        metrics = result['metrics']
+        self.symmetry_scores[person_id] = metrics.get('symmetry', 0.0)
+        self.balance_metrics[person_id] = metrics.get('balance', 0.0)
+        self.muscle_activation[person_id] = self.estimate_muscle_activation(landmarks)
+        if person_id in self.movement_speed:
+            self.fatigue_metrics[person_id] = self.detect_fatigue(self.movement_speed[person_id],
+                                                                  self.muscle_activation[person_id])
+
+        self._update_trackers(person_id, landmarks, width, height, result['joint_angles'], result['timestamp'])
+        self.generate_posture_feedback(result['joint_angles'], landmarks)
+        self.current_person_id = person_id
+        self.metrics_text = (f"Person {person_id} | Symmetry: {self.symmetry_scores[person_id]:.2f} | "
+                             f"Balance: {self.balance_metrics[person_id]:.2f}")
+        self._record_frame(person_id, result['joint_angles'], result['accuracy'])
+        telemetry.DETECTIONS.inc()
+
+    def set_template_library(self, library: Optional[TemplateLibrary]) -> None:
+        """
+        Compare every completed rep against a library of reference motions.
+
+        Args:
+            library: Templates to match against, or None to stop matching
+        """
+        self.template_matcher = LiveTemplateMatcher(library) if library is not None else None
+        self.template_match = None
+
+    def set_motion_gate(self, gate: Optional[MotionGate]) -> None:
+        """
+        Skip pose inference on live frames where nothing meaningful moved.
+
+        Frames the gate passes over reuse the previous landmarks and metrics;
+        the gate forces a fresh result after a bounded number of reused frames.
+        Only analyze_frame() is gated; video analysis always runs inference.
+
+        Args:
+            gate: Motion gate to consult before each frame, or None to disable
+        """
+        self.motion_gate = gate
+        if gate is not None:
+            gate.reset()
+
+    def set_activity_recognizer(self, recognizer: Optional[ActivityRecognizer]) -> None:
+        """
+        Recognize the exercise being performed in every analyzed frame.
+
+        Args:
+            recognizer: Recognizer over a labelled pose index, or None to stop recognizing
+        """
+        self.activity_recognizer = recognizer
+        self.activity_recognition = {}
+
+    def match_templates(self) -> List[Dict]:
+        """
+        Match every rep in the recorded history against the template library.
+
+        Returns:
+            One entry per rep with its timing and best match
+        """
+        if self.template_matcher is None:
+            raise ValueError("No template library configured")
+        if not self.results_history:
+            raise ValueError("No analysis data available to match")
+        return self.template_matcher.library.match_history(self.results_history,
+                                                           self.rep_counter.primary_joint)
+
+    def get_camera_matrix(self, width: int, height: int) -> np.ndarray:
+        """
+        Get approximate pinhole intrinsics for a resolution, computed once and cached.
+
+        Assumes a focal length equal to the image width (about a 53 degree
+        horizontal field of view) and the principal point at the image center.
+        """
+        camera_matrix = self.camera_matrices.get((width, height))
+        if camera_matrix is None:
+            camera_matrix = np.array(
+                [[width, 0, width / 2],
+                 [0, width, height / 2],
+                 [0, 0, 1]], dtype=np.float64
+            )
+            self.camera_matrices[(width, height)] = camera_matrix
+        self.camera_matrix = camera_matrix
+        return camera_matrix
+
+    def estimate_3d_pose(self, world_landmarks, points: np.ndarray, width: int, height: int,
+                         out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Optional[float]]:
+        """
+        Build the 3D pose from MediaPipe world landmarks and locate it relative to the camera.
+
+        The world landmarks are metric and centered between the hips. Fitting a
+        scaled orthographic projection of them onto the 2D landmarks gives the
+        subject's distance from the camera in closed form, so no iterative
+        solve runs per frame; the body's depth is small next to its distance,
+        which keeps the approximation within a few percent of a full PnP solve.
+
+        Args:
+            world_landmarks: MediaPipe world landmark list (pose_world_landmarks)
+            points: (33, 4) normalized image landmark array for the same pose
+            width: Frame width in pixels
+            height: Frame height in pixels
+            out: (33, 3) array to fill with the world landmarks, e.g. the
+                person's previous pose; a new one is allocated if omitted
+
+        Returns:
+            Tuple of the (33, 3) world landmark array and the distance in meters
+            (None if the pose is degenerate)
+        """
+        world = out
+        if world is None or len(world) != len(world_landmarks.landmark):
+            world = np.empty((len(world_landmarks.landmark), 3))
+        from_landmark_list(world_landmarks, world)
+
+        image_points = self.image_point_buffer
+        if len(image_points) != len(points):
+            image_points = self.image_point_buffer = np.empty((len(points), 2))
+        np.multiply(points[:, :2], (width, height), out=image_points)
+        image_points -= image_points.mean(axis=0)
+
+        # Scale from meters to pixels between the centered world and image
+        # spreads; distance = focal length / scale
+        world_spread = np.square(world[:, :2] - world[:, :2].mean(axis=0)).sum()
+        image_spread = np.square(image_points).sum()
+        if world_spread <= 0 or image_spread <= 0:
+            return world, None
+        focal = self.get_camera_matrix(width, height)[0, 0]
+        distance = float(focal * np.sqrt(world_spread / image_spread))
+
+        return world, distance
+
+    def calculate_joint_angles_3d(self, points: np.ndarray) -> Dict[str, float]:
+        """
+        Calculate all joint angles at once from an (N, 3) landmark array.
+
+        Args:
+            points: Landmark coordinates, indexed like the MediaPipe landmarks
+
+        Returns:
+            Dictionary of joint angles in degrees
+        """
+        a = points[self.angle_indices[:, 0]]
+        b = points[self.angle_indices[:, 1]]
+        c = points[self.angle_indices[:, 2]]
+        ba = a - b
+        bc = c - b
+
+        cosine = np.einsum('ij,ij->i', ba, bc) / (
+            np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1) + 1e-9)
+        angles = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+        return dict(zip(self.angle_joints.keys(), angles.tolist()))
+
+    def draw_annotations(self, frame: np.ndarray, pose_landmarks, joint_angles: Dict[str, float],
+                         accuracy: float, metrics_text: Optional[str] = None) -> None:
+        """
+        Draw the skeleton, metrics, joint angles and accuracy onto a frame in place.
+
+        Args:
+            frame: Frame to draw on
+            pose_landmarks: MediaPipe NormalizedLandmarkList, or None if no pose was detected
+            joint_angles: Dictionary of joint angles to label
+            accuracy: Pose accuracy score
+            metrics_text: Optional text drawn above the person's bounding box
+        """
+        with telemetry.DRAWING_SECONDS.time():
+            if pose_landmarks is not None:
+                h, w, _ = frame.shape
+                landmarks = pose_landmarks.landmark
+
+                # Draw pose landmarks and metrics
+                self.mp_drawing.draw_landmarks(
+                    frame,
+                    pose_landmarks,
+                    self.mp_pose.POSE_CONNECTIONS,
+                    self.mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
+                    self.mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2)
+                )
+
+                # Draw metrics on frame
+                if metrics_text:
+                    top_left = (int(min(lm.x for lm in landmarks) * w),
+                                int(min(lm.y for lm in landmarks) * h - 10))
+                    cv2.putText(frame, metrics_text, top_left,
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+                # Display angles on the frame
+                for joint_name, angle in joint_angles.items():
+                    vertex = landmarks[self.angle_joints[joint_name][1]]
+                    cv2.putText(frame, f"{joint_name}: {angle:.1f}°",
+                                (int(vertex.x * w), int(vertex.y * h)),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2, cv2.LINE_AA)
+
+            # Display accuracy on the frame
+            cv2.putText(frame, f"Accuracy: {accuracy:.1f}%",
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
 
     def calculate_symmetry(self, landmarks) -> float:
         """Calculate body symmetry score based on corresponding left/right landmarks."""
@@ -430,7 +942,7 @@ class OpenPoseAnalyzer:
         Args:
             joint_angles: Dictionary of calculated joint angles
             landmarks: List of pose landmarks
-        "\"
+        """
         feedback = []
         
         # Get person ID from tracking system
@@ -465,14 +977,35 @@ class OpenPoseAnalyzer:
             elif speed < 0.2:
                 feedback.append("Movement is very slow. This might indicate hesitation or strain.")
         
-        # 3D pose feedback
+        # 3D pose feedback (world landmarks are in meters; y points down, z away from the camera)
         if person_id in self.pose_3d:
             pose_3d = self.pose_3d[person_id]
-            # Analyze depth and provide feedback on movement in 3D space
-            if any(p[2] > 0.8 for p in pose_3d.values()):
-                feedback.append("Good depth in your movement. Maintaining proper distance.")
-            elif any(p[2] < 0.2 for p in pose_3d.values()):
-                feedback.append("Try to use more depth in your movements for better form.")
+            landmark = self.mp_pose.PoseLandmark
+
+            # Shoulder depth difference means the torso is turned away from the camera
+            shoulder_depth = abs(pose_3d[landmark.LEFT_SHOULDER.value, 2] -
+                                 pose_3d[landmark.RIGHT_SHOULDER.value, 2])
+            if shoulder_depth > 0.15:
+                feedback.append("Your torso is rotated. Keep your shoulders square to the camera.")
+
+            # Trunk inclination from vertical, independent of the camera angle
+            mid_shoulder = (pose_3d[landmark.LEFT_SHOULDER.value] + pose_3d[landmark.RIGHT_SHOULDER.value]) / 2
+            mid_hip = (pose_3d[landmark.LEFT_HIP.value] + pose_3d[landmark.RIGHT_HIP.value]) / 2
+            trunk = mid_shoulder - mid_hip
+            trunk_length = np.linalg.norm(trunk)
+            if trunk_length > 0:
+                trunk_lean = np.degrees(np.arccos(np.clip(-trunk[1] / trunk_length, -1.0, 1.0)))
+                if trunk_lean > 45:
+                    feedback.append("You are leaning your trunk too far. Keep your chest up.")
+
+            angles_3d = self.joint_angles_3d.get(person_id, {})
+            if 'left_knee' in angles_3d and 'right_knee' in angles_3d:
+                if abs(angles_3d['left_knee'] - angles_3d['right_knee']) > 20:
+                    feedback.append("Your knees are bending unevenly. Spread your weight across both legs.")
+
+        if person_id in self.camera_distance:
+            if self.camera_distance[person_id] < 1.0:
+                feedback.append("You are very close to the camera. Step back so your whole body is visible.")
         
         # Muscle activation feedback
         if person_id in self.muscle_activation:
@@ -600,109 +1133,331 @@ class OpenPoseAnalyzer:
         if len(self.posture_feedback) > 10:
             self.posture_feedback = sorted(self.posture_feedback, key=lambda x: x['timestamp'], reverse=True)[:10]
 
-    def analyze_video(self, video_path: str, output_path: Optional[str] = None) -> Dict:
+    def analyze_video(self, video_path: str, output_path: Optional[str] = None,
+                      sidecar_path: Optional[str] = None, workers: int = 1,
+                      backend: Optional[PoseBackend] = None) -> Dict:
         """
         Analyze a video file frame by frame.
 
         Args:
             video_path: Path to the video file
-            output_path: Optional path to save the analyzed video
+            output_path: Optional path to save the analyzed video. A path ending in
+                .m3u8 writes an HLS playlist with segments that become playable
+                as they are completed.
+            sidecar_path: Optional path to save per-frame landmarks and metrics as
+                JSON Lines (see SIDECAR_VERSION). Without output_path, frames are
+                not annotated or re-encoded; render_sidecar() can burn in the
+                overlay later.
+            workers: Maximum number of analyzer processes. Above 1, the video is
+                split into contiguous chunks of at least MIN_CHUNK_FRAMES frames,
+                at most one per available CPU, analyzed in parallel and folded
+                into this analyzer in frame order. Annotated output is drawn and
+                encoded here.
+            backend: Pose backend to run inference with instead of this analyzer's
+                MediaPipe graph. Frames are decoded and detected in batches of
+                backend.batch_size.
 
         Returns:
-            Dictionary containing analysis results
+            Dictionary containing analysis results, with this video's completed
+            reps under 'completed_reps'
         """
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
+        if workers > 1 and backend is not None:
+            raise ValueError("A pose backend cannot be combined with multiple workers")
 
         # Open the video file
         cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
         fps = cap.get(cv2.CAP_PROP_FPS)
         frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if workers > 1:
+            # Extra processes only pay off with a core each and enough frames to
+            # amortize their startup
+            cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+            workers = min(workers, cpus, total_frames // MIN_CHUNK_FRAMES) if fps > 0 else 1
 
         # Prepare output video if needed
         video_writer = None
-        if output_path:
+        if output_path and output_path.endswith('.m3u8'):
+            video_writer = HLSWriter(output_path, fps, (frame_width, frame_height))
+        elif output_path:
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             video_writer = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
 
-        # Start analysis
+        # Prepare the landmark sidecar if needed; it is written under a temporary
+        # name and moved into place once complete
+        sidecar = None
+        if sidecar_path:
+            sidecar = open(f"{sidecar_path}.part", 'w')
+            sidecar.write(json.dumps({
+                'version': SIDECAR_VERSION,
+                'source': os.path.basename(video_path),
+                'fps': fps,
+                'width': frame_width,
+                'height': frame_height,
+                'frame_count': total_frames,
+                'landmark_fields': ['x', 'y', 'z', 'visibility'],
+                'connections': sorted(list(connection) for connection in self.mp_pose.POSE_CONNECTIONS)
+            }, separators=(',', ':')) + '\n')
+
+        # Start analysis; every frame of a recording is analyzed, so the motion
+        # gate only applies to live frames
+        motion_gate, self.motion_gate = self.motion_gate, None
         self.start_analysis()
 
         # Process each frame
         frame_idx = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        try:
+            if workers > 1:
+                frame_idx = self._analyze_frames_parallel(cap, video_path, workers, fps, total_frames,
+                                                          video_writer, sidecar)
+            elif backend is not None:
+                frame_idx = self._analyze_frames_batched(cap, backend, fps, total_frames,
+                                                         video_writer, sidecar)
+            else:
+                # Every frame is decoded into and annotated in the same buffer
+                frame = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+                while cap.isOpened():
+                    ret, frame = cap.read(frame)
+                    if not ret:
+                        if frame_idx < total_frames:
+                            telemetry.FRAMES_DROPPED.labels('video').inc(total_frames - frame_idx)
+                        break
+
+                    # Analyze the frame
+                    annotated_frame, joint_angles, accuracy = self.analyze_frame(
+                        frame, annotate=video_writer is not None,
+                        timestamp=frame_idx / fps if fps else None, in_place=True)
+
+                    # Write to output video if needed
+                    if video_writer:
+                        video_writer.write(annotated_frame)
+
+                    if sidecar and self.current_landmarks is not None:
+                        sidecar.write(self._sidecar_record(frame_idx, fps) + '\n')
+
+                    frame_idx += 1
+
+                    # Print progress
+                    if frame_idx % 30 == 0:
+                        print(f"Processing frame {frame_idx}/{total_frames} ({frame_idx/total_frames*100:.1f}%)")
+        finally:
+            # Stop analysis
+            self.stop_analysis()
+            self.motion_gate = motion_gate
+
+            # Release resources
+            cap.release()
+            if video_writer:
+                video_writer.release()
+            if sidecar:
+                sidecar.close()
 
-            # Analyze the frame
-            annotated_frame, joint_angles, accuracy = self.analyze_frame(frame)
+        if sidecar:
+            os.replace(f"{sidecar_path}.part", sidecar_path)
 
-            # Write to output video if needed
+        # Prepare analysis summary
+        summary = self.get_analysis_summary()
+        summary['frames_processed'] = frame_idx
+        # A copy, so a later session on this analyzer cannot change the reps
+        # reported for this video
+        summary['completed_reps'] = [dict(rep) for rep in self.completed_reps]
+
+        return summary
+
+    def _analyze_frames_parallel(self, cap, video_path: str, workers: int, fps: float, total_frames: int,
+                                 video_writer, sidecar) -> int:
+        """Analyze contiguous chunks of a video in separate processes; returns the number of frames analyzed."""
+        from frame_ring import analyze_video_chunks
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        bounds = np.linspace(0, total_frames, workers + 1).astype(int).tolist()
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+
+        # The workers only return landmarks; annotated output is drawn here
+        frame = np.empty((height, width, 3), dtype=np.uint8) if video_writer else None
+        decoded = 0
+        frame_idx = 0
+        for result in analyze_video_chunks(video_path, ranges, fps, list(self.angle_joints),
+                                           self.model_complexity):
+            self.ingest_frame_result(result, width, height)
             if video_writer:
-                video_writer.write(annotated_frame)
+                # Skip frames a worker could not decode
+                ret = True
+                while ret and decoded <= result['sequence']:
+                    ret, frame = cap.read(frame)
+                    decoded += 1
+                if ret:
+                    self.draw_annotations(frame, self.current_landmarks, self.joint_angles,
+                                          self.current_accuracy, self.metrics_text)
+                    video_writer.write(frame)
+            if sidecar and self.current_landmarks is not None:
+                sidecar.write(self._sidecar_record(result['sequence'], fps) + '\n')
 
             frame_idx += 1
-
-            # Print progress
             if frame_idx % 30 == 0:
                 print(f"Processing frame {frame_idx}/{total_frames} ({frame_idx/total_frames*100:.1f}%)")
 
-        # Stop analysis
-        self.stop_analysis()
+        if frame_idx < total_frames:
+            telemetry.FRAMES_DROPPED.labels('video').inc(total_frames - frame_idx)
+        return frame_idx
 
-        # Release resources
-        cap.release()
-        if video_writer:
-            video_writer.release()
+    def _analyze_frames_batched(self, cap, backend: PoseBackend, fps: float, total_frames: int,
+                                video_writer, sidecar) -> int:
+        """Analyze a video's frames in batches with a pose backend; returns the number of frames read."""
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        backend.load()
+        backend.reset()
 
-        # Prepare analysis summary
-        summary = self.get_analysis_summary()
+        # Frames are decoded into the same buffers for every batch
+        buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(backend.batch_size)]
+        frame_idx = 0
+        while True:
+            batch = []
+            for buffer in buffers:
+                ret, frame = cap.read(buffer)
+                if not ret:
+                    break
+                batch.append(frame)
+            if not batch:
+                break
 
-        return summary
+            inference_start = time.perf_counter()
+            detections = backend.detect(batch)
+            per_frame = (time.perf_counter() - inference_start) / len(batch)
+
+            for frame, detection in zip(batch, detections):
+                telemetry.INFERENCE_SECONDS.observe(per_frame)
+                annotated_frame, joint_angles, accuracy = self.analyze_frame(
+                    frame, annotate=video_writer is not None,
+                    timestamp=frame_idx / fps if fps else None, landmarks=detection, in_place=True)
+
+                if video_writer:
+                    video_writer.write(annotated_frame)
+                if sidecar and self.current_landmarks is not None:
+                    sidecar.write(self._sidecar_record(frame_idx, fps) + '\n')
+
+                frame_idx += 1
+                if frame_idx % 30 == 0:
+                    print(f"Processing frame {frame_idx}/{total_frames} ({frame_idx/total_frames*100:.1f}%)")
+
+            if len(batch) < len(buffers):
+                break
+
+        if frame_idx < total_frames:
+            telemetry.FRAMES_DROPPED.labels('video').inc(total_frames - frame_idx)
+        return frame_idx
+
+    def _sidecar_record(self, frame_idx: int, fps: float) -> str:
+        """Serialize the current frame's landmarks and metrics as one JSON line."""
+        person_id = self.current_person_id
+        return json.dumps({
+            'frame': frame_idx,
+            't': round(frame_idx * 1000.0 / fps, 1) if fps else None,
+            'person': person_id,
+            'landmarks': [[round(lm.x, 4), round(lm.y, 4), round(lm.z, 4), round(lm.visibility, 3)]
+                          for lm in self.current_landmarks.landmark],
+            'joint_angles': {joint: round(angle, 1) for joint, angle in self.joint_angles.items()},
+            'accuracy': round(self.current_accuracy, 1),
+            'symmetry': round(float(self.symmetry_scores.get(person_id, 0.0)), 3),
+            'balance': round(float(self.balance_metrics.get(person_id, 0.0)), 3)
+        }, separators=(',', ':'))
+
+    def render_sidecar(self, video_path: str, sidecar_path: str, output_path: str) -> str:
+        """
+        Burn a landmark sidecar into a copy of the original video.
+
+        No pose inference is run; the overlay is drawn from the recorded landmarks.
+
+        Args:
+            video_path: Path to the original video
+            sidecar_path: Path to the sidecar written by analyze_video
+            output_path: Path to save the annotated video
+
+        Returns:
+            Path to the saved video
+        """
+        from mediapipe.framework.formats import landmark_pb2
+
+        header, records = read_sidecar(sidecar_path)
+        records_by_frame = {record['frame']: record for record in records}
+
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or header['fps']
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        video_writer = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+
+        frame_idx = 0
+        try:
+            while cap.isOpened():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                record = records_by_frame.get(frame_idx)
+                if record is None:
+                    self.draw_annotations(frame, None, {}, 0.0)
+                else:
+                    pose_landmarks = landmark_pb2.NormalizedLandmarkList()
+                    for x, y, z, visibility in record['landmarks']:
+                        pose_landmarks.landmark.add(x=x, y=y, z=z, visibility=visibility)
+
+                    metrics_text = f"Person {record['person']} | "
+                    metrics_text += f"Symmetry: {record['symmetry']:.2f} | "
+                    metrics_text += f"Balance: {record['balance']:.2f}"
+                    self.draw_annotations(frame, pose_landmarks, record['joint_angles'],
+                                          record['accuracy'], metrics_text)
+
+                video_writer.write(frame)
+                frame_idx += 1
+        finally:
+            cap.release()
+            video_writer.release()
+
+        return output_path
 
     def get_analysis_summary(self) -> Dict:
         """
         Get a summary of the analysis results.
 
+        The summary is built from running statistics, so it costs the same
+        regardless of session length and does not need the per-frame history.
+
         Returns:
             Dictionary containing analysis summary
         """
-        if not self.results_history:
+        if not self.frame_count:
             return {
                 "status": "No analysis data available",
                 "accuracy": 0,
                 "feedback": [],
                 "joint_angles": {},
                 "frame_count": 0,
-                "duration": 0
+                "duration": 0,
+                "statistics": self.session_stats.summary(),
+                "repetitions": self.rep_counter.get_summary()
             }
 
-        # Calculate average accuracy
-        avg_accuracy = sum(result['accuracy'] for result in self.results_history) / len(self.results_history)
-
-        # Calculate average joint angles
-        all_joints = {}
-        for result in self.results_history:
-            for joint, angle in result['joint_angles'].items():
-                if joint not in all_joints:
-                    all_joints[joint] = []
-                all_joints[joint].append(angle)
-
-        avg_joint_angles = {joint: sum(angles) / len(angles) for joint, angles in all_joints.items()}
-
-        # Calculate duration
-        duration = self.results_history[-1]['timestamp'] if self.results_history else 0
-
+        stats = self.session_stats
         return {
             "status": "Analysis completed",
-            "accuracy": avg_accuracy,
+            "accuracy": stats.metrics['accuracy'].mean,
             "feedback": self.posture_feedback,
-            "joint_angles": avg_joint_angles,
+            "joint_angles": {joint: joint_stats.mean for joint, joint_stats in stats.joints.items()},
             "frame_count": self.frame_count,
-            "duration": duration
+            "duration": self.last_result_time,
+            "statistics": stats.summary(),
+            "repetitions": self.rep_counter.get_summary(),
+            "template_matches": self.template_matcher.get_summary() if self.template_matcher else None,
+            "activity": self.activity_recognizer.get_summary() if self.activity_recognizer else None
         }
 
     def export_results(self, output_path: str, format: str = 'json') -> str:
@@ -717,6 +1472,8 @@ class OpenPoseAnalyzer:
             Path to the saved file
         """
         if not self.results_history:
+            if not self.keep_history and self.frame_count:
+                raise ValueError("Per-frame history is disabled for this analyzer (keep_history=False)")
             raise ValueError("No analysis data available to export")
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -746,6 +1503,7 @@ class OpenPoseAnalyzer:
                 flattened_data.append(row)
 
             # Convert to DataFrame and save
+            import pandas as pd
             df = pd.DataFrame(flattened_data)
             df.to_csv(file_path, index=False)
 
@@ -753,3 +1511,11 @@ class OpenPoseAnalyzer:
             raise ValueError(f"Unsupported export format: {format}")
 
         return file_path
+
+
+if __name__ == '__main__':
+    # Headless batch processing: python openpose_analyzer.py <dir-or-manifest> --output <dir>
+    import sys
+    from batch_analyzer import main
+
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+Pose Backends - Interchangeable pose inference engines returning landmark arrays
+
+Every backend maps a batch of BGR frames to an (N, 33, 4) float32 array of
+x, y, z, visibility per MediaPipe pose landmark, with x and y normalized to the
+frame and every value NaN for frames without a pose. OpenPoseAnalyzer.analyze_video
+accepts a backend and runs inference one batch at a time.
+
+The ONNX backend runs MediaPipe's pose landmark model (pose_landmark_full.tflite,
+converted to ONNX) with ONNX Runtime on the CPU, many frames per call:
+
+    python -m tf2onnx.convert --tflite pose_landmark_full.tflite --output pose_landmark.onnx
+    python pose_backends.py pose_landmark.onnx --output pose_landmark_batched.onnx
+
+The second step drops the segmentation and heatmap outputs, which ONNX Runtime
+would otherwise compute on every call, and makes the batch size variable.
+"""
+
+import argparse
+import sys
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+POSE_LANDMARKS = 33
+
+# Crop around the previous pose, relative to the landmarks' bounding box. Wider
+# than MediaPipe's own 1.25 because the crop is reused for a whole batch.
+ROI_SCALE = 1.5
+
+# ONNX Runtime sessions shared by every backend in the process, keyed by
+# (model path, intra-op threads); sessions are thread-safe
+_sessions: Dict[Tuple[str, int], object] = {}
+_sessions_lock = threading.Lock()
+
+# Protobuf tags of the float fields of a MediaPipe landmark, in field order:
+# x, y, z, visibility, presence (field number << 3 | fixed32 wire type)
+_LANDMARK_FIELD_TAGS = np.array([(field << 3) | 5 for field in range(1, 6)], dtype=np.uint8)
+
+
+def to_landmark_list(landmarks: np.ndarray):
+    """
+    Convert a (33, 4) landmark array to a MediaPipe NormalizedLandmarkList.
+
+    Args:
+        landmarks: x, y, z, visibility per landmark
+
+    Returns:
+        NormalizedLandmarkList, or None if the array holds no pose (NaN)
+    """
+    from mediapipe.framework.formats import landmark_pb2
+
+    if np.isnan(landmarks[0, 0]):
+        return None
+
+    landmark_list = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, visibility in landmarks.tolist():
+        landmark_list.landmark.add(x=x, y=y, z=z, visibility=visibility)
+    return landmark_list
+
+
+def from_landmark_list(landmark_list, out: np.ndarray) -> np.ndarray:
+    """
+    Copy a MediaPipe (Normalized)LandmarkList into a (33, 3) or (33, 4) array.
+
+    When every landmark sets the same float fields, as MediaPipe's output
+    does, the serialized message is a run of equal-sized records of tag and
+    float32 pairs and is decoded with one numpy view instead of reading each
+    landmark from Python.
+
+    Args:
+        landmark_list: LandmarkList or NormalizedLandmarkList
+        out: Array to fill with x, y, z and, with four columns, visibility
+
+    Returns:
+        out
+    """
+    columns = out.shape[1]
+    data = landmark_list.SerializeToString()
+    # Each landmark is tag 0x0a, a one-byte length and five bytes per field
+    if len(data) > 2 and data[0] == 0x0a and data[1] < 0x80 and data[1] % 5 == 0:
+        fields = data[1] // 5
+        record = np.dtype([('tag', np.uint8), ('length', np.uint8),
+                           ('fields', [('tag', np.uint8), ('value', '<f4')], (fields,))])
+        if columns <= fields <= len(_LANDMARK_FIELD_TAGS) and len(data) == record.itemsize * len(out):
+            records = np.frombuffer(data, dtype=record)
+            if ((records['tag'] == 0x0a).all() and (records['length'] == data[1]).all() and
+                    (records['fields']['tag'] == _LANDMARK_FIELD_TAGS[:fields]).all()):
+                out[:] = records['fields']['value'][:, :columns]
+                return out
+
+    for row, lm in zip(out, landmark_list.landmark):
+        row[0] = lm.x
+        row[1] = lm.y
+        row[2] = lm.z
+        if columns > 3:
+            row[3] = lm.visibility
+    return out
+
+
+class PoseBackend:
+    """
+    Base class for pose inference backends.
+
+    Subclasses implement detect(); batch_size is how many frames callers
+    should pass per call for the best throughput.
+    """
+
+    name = 'base'
+    batch_size = 1
+
+    def load(self) -> None:
+        """Build the model if it has not been built yet."""
+
+    def reset(self) -> None:
+        """Forget tracking state, e.g. before starting a new video."""
+
+    def detect(self, frames: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        Detect one pose per frame.
+
+        Args:
+            frames: BGR frames as read by OpenCV, consecutive frames of one video
+
+        Returns:
+            (N, 33, 4) float32 array of x, y, z, visibility; NaN where no pose was found
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release the model."""
+
+
+class MediaPipeBackend(PoseBackend):
+    """MediaPipe Pose, one frame per call, tracking the pose between frames."""
+
+    name = 'mediapipe'
+
+    def __init__(self, model_complexity: int = 1, min_detection_confidence: float = 0.5,
+                 min_tracking_confidence: float = 0.5):
+        """
+        Args:
+            model_complexity: Model complexity (0, 1, or 2)
+            min_detection_confidence: Minimum confidence for pose detection
+            min_tracking_confidence: Minimum confidence for pose tracking
+        """
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.pose = None
+
+    def load(self) -> None:
+        if self.pose is None:
+            import mediapipe as mp
+
+            self.pose = mp.solutions.pose.Pose(
+                model_complexity=self.model_complexity,
+                min_detection_confidence=self.min_detection_confidence,
+                min_tracking_confidence=self.min_tracking_confidence
+            )
+
+    def detect(self, frames: Sequence[np.ndarray]) -> np.ndarray:
+        self.load()
+        landmarks = np.full((len(frames), POSE_LANDMARKS, 4), np.nan, dtype=np.float32)
+        for i, frame in enumerate(frames):
+            results = self.pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if results.pose_landmarks:
+                landmarks[i] = [[lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_landmarks.landmark]
+        return landmarks
+
+    def close(self) -> None:
+        if self.pose is not None:
+            self.pose.close()
+            self.pose = None
+
+
+class OnnxPoseBackend(PoseBackend):
+    """
+    MediaPipe's pose landmark model on ONNX Runtime, batched across frames.
+
+    Each batch is cropped around the pose found at the end of the previous
+    batch, or around the whole frame when there is none, so it works best for
+    a single person filling a good part of the frame, as in exercise videos.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path: str, batch_size: int = 8, intra_op_threads: int = 0,
+                 min_detection_confidence: float = 0.5):
+        """
+        Args:
+            model_path: ONNX pose landmark model with a dynamic batch dimension
+                (see prepare_model)
+            batch_size: Frames per inference call
+            intra_op_threads: ONNX Runtime threads per call; 0 uses every core
+            min_detection_confidence: Minimum pose presence score
+        """
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.intra_op_threads = intra_op_threads
+        self.min_detection_confidence = min_detection_confidence
+        self.session = None
+        self.roi = None
+
+    def load(self) -> None:
+        if self.session is not None:
+            return
+
+        key = (self.model_path, self.intra_op_threads)
+        with _sessions_lock:
+            if key not in _sessions:
+                try:
+                    import onnxruntime as ort
+                except ImportError:
+                    raise ImportError("The onnx pose backend requires onnxruntime: pip install onnxruntime")
+
+                options = ort.SessionOptions()
+                options.intra_op_num_threads = self.intra_op_threads
+                options.inter_op_num_threads = 1
+                options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+                _sessions[key] = ort.InferenceSession(self.model_path, options,
+                                                      providers=['CPUExecutionProvider'])
+            self.session = _sessions[key]
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_size = model_input.shape[1]
+        outputs = self.session.get_outputs()
+        # Landmarks (39 x, y, z, visibility, presence in input pixels) and pose presence
+        self.output_names = [outputs[0].name, outputs[1].name]
+        self.crop = np.empty((self.input_size, self.input_size, 3), dtype=np.uint8)
+        self.inputs = np.empty((self.batch_size, self.input_size, self.input_size, 3), dtype=np.float32)
+
+    def reset(self) -> None:
+        self.roi = None
+
+    def _roi(self, width: int, height: int) -> Tuple[float, float, float]:
+        """Centre and side length, in pixels, of the square crop for this batch."""
+        if self.roi is not None:
+            return self.roi
+        return width / 2.0, height / 2.0, float(max(width, height))
+
+    def detect(self, frames: Sequence[np.ndarray]) -> np.ndarray:
+        self.load()
+        count = len(frames)
+        if count > len(self.inputs):
+            self.inputs = np.empty((count,) + self.inputs.shape[1:], dtype=np.float32)
+        size = self.input_size
+        height, width = frames[0].shape[:2]
+        center_x, center_y, side = self._roi(width, height)
+        scale = size / side
+
+        # One affine crop per frame straight into the reusable input tensor;
+        # reversing the channels turns BGR into the RGB the model expects
+        transform = np.array([[scale, 0.0, size / 2.0 - scale * center_x],
+                              [0.0, scale, size / 2.0 - scale * center_y]])
+        inputs = self.inputs[:count]
+        for i, frame in enumerate(frames):
+            cv2.warpAffine(frame, transform, (size, size), dst=self.crop,
+                           flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+            np.multiply(self.crop[:, :, ::-1], 1.0 / 255.0, out=inputs[i], casting='unsafe')
+
+        raw, presence = self.session.run(self.output_names, {self.input_name: inputs})
+        raw = raw.reshape(count, -1, 5)[:, :POSE_LANDMARKS]
+
+        # Map from crop pixels back to coordinates normalized to the frame
+        landmarks = np.empty((count, POSE_LANDMARKS, 4), dtype=np.float32)
+        landmarks[..., 0] = ((raw[..., 0] - size / 2.0) / scale + center_x) / width
+        landmarks[..., 1] = ((raw[..., 1] - size / 2.0) / scale + center_y) / height
+        landmarks[..., 2] = raw[..., 2] / scale / width
+        # Visibility is a logit; this form of the sigmoid cannot overflow
+        landmarks[..., 3] = 0.5 + 0.5 * np.tanh(0.5 * raw[..., 3])
+        detected = presence.reshape(count) >= self.min_detection_confidence
+        landmarks[~detected] = np.nan
+
+        # Crop the next batch around the most recent pose
+        self.roi = None
+        if detected.any():
+            last = landmarks[np.flatnonzero(detected)[-1]]
+            xs = last[:, 0] * width
+            ys = last[:, 1] * height
+            self.roi = ((xs.min() + xs.max()) / 2.0, (ys.min() + ys.max()) / 2.0,
+                        max(xs.max() - xs.min(), ys.max() - ys.min()) * ROI_SCALE)
+        return landmarks
+
+    def close(self) -> None:
+        self.session = None
+
+
+def create_backend(name: str = 'mediapipe', model_path: Optional[str] = None, batch_size: int = 8,
+                   intra_op_threads: int = 0, model_complexity: int = 1) -> PoseBackend:
+    """
+    Create a pose backend by name.
+
+    Args:
+        name: 'mediapipe' or 'onnx'
+        model_path: ONNX model, required for 'onnx'
+        batch_size: Frames per inference call for 'onnx'
+        intra_op_threads: ONNX Runtime threads per call for 'onnx'; 0 uses every core
+        model_complexity: Model complexity for 'mediapipe'
+
+    Returns:
+        The backend, not yet loaded
+    """
+    if name == 'mediapipe':
+        return MediaPipeBackend(model_complexity=model_complexity)
+    if name == 'onnx':
+        if not model_path:
+            raise ValueError("The onnx pose backend requires a model path")
+        return OnnxPoseBackend(model_path, batch_size=batch_size, intra_op_threads=intra_op_threads)
+    raise ValueError(f"Unknown pose backend: {name}")
+
+
+def prepare_model(model_path: str, output_path: str) -> int:
+    """
+    Prepare a converted pose landmark model for OnnxPoseBackend.
+
+    Keeps only the landmark and pose presence outputs, and replaces the fixed
+    batch size of 1 that tf2onnx keeps from the TFLite model in the graph
+    inputs, outputs and constant reshape targets with a variable one.
+
+    Args:
+        model_path: ONNX model converted from pose_landmark_full.tflite
+        output_path: Where to save the prepared model
+
+    Returns:
+        Number of reshape targets rewritten
+    """
+    import onnx
+    from onnx import numpy_helper
+    from onnx.utils import Extractor
+
+    model = onnx.load(model_path)
+    outputs = [output.name for output in model.graph.output[:2]]
+    model = Extractor(model).extract_model([model.graph.input[0].name], outputs)
+
+    for value in list(model.graph.input) + list(model.graph.output):
+        value.type.tensor_type.shape.dim[0].dim_param = 'batch'
+    del model.graph.value_info[:]
+
+    initializers = {initializer.name: initializer for initializer in model.graph.initializer}
+    rewritten = 0
+    for node in model.graph.node:
+        if node.op_type == 'Reshape' and node.input[1] in initializers:
+            shape = numpy_helper.to_array(initializers[node.input[1]]).copy()
+            if shape.size and shape[0] == 1:
+                shape[0] = -1
+                initializers[node.input[1]].CopyFrom(numpy_helper.from_array(shape, node.input[1]))
+                rewritten += 1
+
+    onnx.save(model, output_path)
+    return rewritten
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Prepare a converted pose landmark model for batched inference')
+    parser.add_argument('model', help='ONNX model converted from pose_landmark_full.tflite')
+    parser.add_argument('--output', required=True, help='Path for the batched model')
+    args = parser.parse_args(argv)
+
+    rewritten = prepare_model(args.model, args.output)
+    print(f"Wrote {args.output} ({rewritten} reshape targets rewritten)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""
+Progress Store - Longitudinal index of analysis sessions and reps per patient
+
+Session summaries and per-rep metrics are stored in one SQLite database with
+indexes on (patient, metric, time), so trends such as "left knee range of
+motion per week over the last 8 weeks" are answered from the index instead of
+re-reading exported files. WAL mode lets several API workers write and read
+the same file.
+"""
+
+import json
+import numbers
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA_VERSION = 1
+
+# Per-session statistics fields (see running_stats.RunningStats.to_dict)
+STAT_FIELDS = ('count', 'mean', 'std', 'min', 'max', 'p5', 'p50', 'p95', 'rom')
+
+# Session-level values that can be trended like statistics
+SESSION_FIELDS = ('duration', 'frame_count', 'accuracy', 'reps', 'sets', 'avg_rom')
+
+# Per-rep values that can be trended (see RepCounter._record_rep)
+REP_FIELDS = ('duration', 'rom', 'min_angle', 'max_angle', 'symmetry',
+              'eccentric_duration', 'concentric_duration')
+
+# SQL expressions grouping epoch timestamps into trend periods (UTC). Weeks run
+# Monday to Sunday and are labelled by their Monday, so a week spanning New Year
+# stays one period.
+BUCKETS = {
+    'day': "strftime('%Y-%m-%d', started_at, 'unixepoch')",
+    'week': "date(started_at, 'unixepoch', 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m', started_at, 'unixepoch')",
+    'year': "strftime('%Y', started_at, 'unixepoch')"
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    exercise TEXT,
+    source TEXT,
+    duration REAL,
+    frame_count INTEGER,
+    accuracy REAL,
+    reps INTEGER,
+    sets INTEGER,
+    avg_rom REAL,
+    primary_joint TEXT,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_by_patient ON sessions (patient_id, started_at);
+
+CREATE TABLE IF NOT EXISTS session_stats (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    patient_id TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER, mean REAL, std REAL, min REAL, max REAL,
+    p5 REAL, p50 REAL, p95 REAL, rom REAL
+);
+CREATE INDEX IF NOT EXISTS stats_by_patient ON session_stats (patient_id, name, started_at);
+CREATE INDEX IF NOT EXISTS stats_by_session ON session_stats (session_id);
+
+CREATE TABLE IF NOT EXISTS reps (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    patient_id TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    rep INTEGER,
+    set_number INTEGER,
+    primary_joint TEXT,
+    duration REAL, rom REAL, min_angle REAL, max_angle REAL, symmetry REAL,
+    eccentric_duration REAL, concentric_duration REAL,
+    template TEXT,
+    template_distance REAL
+);
+CREATE INDEX IF NOT EXISTS reps_by_patient ON reps (patient_id, started_at);
+CREATE INDEX IF NOT EXISTS reps_by_session ON reps (session_id);
+"""
+
+
+def _require_number(value, name: str) -> None:
+    """Raise ValueError unless value is a number or None."""
+    if value is not None and (isinstance(value, bool) or not isinstance(value, numbers.Real)):
+        raise ValueError(f"{name} must be a number")
+
+
+def _require_dict(value, name: str) -> Dict:
+    """Return value, or {} if it is None; raise ValueError unless it is a dictionary."""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(f"{name} must be an object")
+    return value
+
+
+class ProgressStore:
+    """
+    SQLite store of analysis sessions, their statistics and their reps.
+
+    One connection is shared by the threads of a process and serialized with
+    a lock; every query is a single indexed statement, so contention is short.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open or create the store.
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("PRAGMA foreign_keys=ON")
+            self.db.executescript(_SCHEMA)
+            self.db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self.db.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def add_session(self, patient_id: str, summary: Dict, reps: Optional[List[Dict]] = None,
+                    started_at: Optional[float] = None, exercise: Optional[str] = None,
+                    source: Optional[str] = None) -> int:
+        """
+        Store a session summary and its reps.
+
+        Args:
+            patient_id: Patient the session belongs to
+            summary: OpenPoseAnalyzer.get_analysis_summary() of the session
+            reps: Completed reps (see RepCounter._record_rep), optionally with
+                'template' and 'template_distance' from template matching
+            started_at: Session start as epoch seconds; defaults to now minus the duration
+            exercise: Exercise name, e.g. a recognized activity or template name
+            source: Where the session came from, e.g. 'live' or a video file name
+
+        Returns:
+            Id of the stored session
+        """
+        if not patient_id:
+            raise ValueError("A patient id is required")
+
+        # Summaries can be imported through the API, so check their shape
+        summary = _require_dict(summary, 'summary')
+        for field in ('duration', 'frame_count', 'accuracy'):
+            _require_number(summary.get(field), f"summary.{field}")
+        repetitions = _require_dict(summary.get('repetitions'), 'summary.repetitions')
+        for field in ('reps', 'sets', 'avg_rom'):
+            _require_number(repetitions.get(field), f"summary.repetitions.{field}")
+        statistics = _require_dict(summary.get('statistics'), 'summary.statistics')
+        if reps is not None and not isinstance(reps, list):
+            raise ValueError("reps must be a list")
+        for index, rep in enumerate(reps or []):
+            if not isinstance(rep, dict):
+                raise ValueError(f"reps[{index}] must be an object")
+            if rep.get('template') is not None and not isinstance(rep['template'], str):
+                raise ValueError(f"reps[{index}].template must be a string")
+            for field in REP_FIELDS + ('start', 'rep', 'set', 'template_distance'):
+                _require_number(rep.get(field), f"reps[{index}].{field}")
+
+        duration = summary.get('duration') or 0.0
+        if started_at is None:
+            started_at = time.time() - duration
+
+        stat_rows = []
+        for group in ('joints', 'metrics'):
+            for name, stats in _require_dict(statistics.get(group), f"summary.statistics.{group}").items():
+                stats = _require_dict(stats, f"summary.statistics.{group}.{name}")
+                for field in STAT_FIELDS:
+                    _require_number(stats.get(field), f"summary.statistics.{group}.{name}.{field}")
+                if stats.get('count'):
+                    stat_rows.append((name,) + tuple(stats.get(field) for field in STAT_FIELDS))
+
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO sessions (patient_id, started_at, exercise, source, duration, frame_count, "
+                "accuracy, reps, sets, avg_rom, primary_joint, summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (patient_id, started_at, exercise, source, duration, summary.get('frame_count', 0),
+                 summary.get('accuracy'), repetitions.get('reps', 0), repetitions.get('sets', 0),
+                 repetitions.get('avg_rom'), repetitions.get('primary_joint'),
+                 json.dumps(summary, separators=(',', ':'), default=float)))
+            session_id = cursor.lastrowid
+
+            self.db.executemany(
+                "INSERT INTO session_stats (session_id, patient_id, started_at, name, "
+                + ", ".join(STAT_FIELDS) + ") VALUES (?, ?, ?" + ", ?" * (len(STAT_FIELDS) + 1) + ")",
+                [(session_id, patient_id, started_at) + row for row in stat_rows])
+
+            self.db.executemany(
+                "INSERT INTO reps (session_id, patient_id, started_at, rep, set_number, primary_joint, "
+                + ", ".join(REP_FIELDS) + ", template, template_distance) VALUES (?, ?, ?, ?, ?, ?"
+                + ", ?" * (len(REP_FIELDS) + 2) + ")",
+                [(session_id, patient_id, started_at + (rep.get('start') or 0.0), rep.get('rep'), rep.get('set'),
+                  repetitions.get('primary_joint'))
+                 + tuple(rep.get(field) for field in REP_FIELDS)
+                 + (rep.get('template'), rep.get('template_distance'))
+                 for rep in reps or []])
+
+        return session_id
+
+    def delete_session(self, session_id: int) -> bool:
+        """Delete a session with its statistics and reps; returns whether it existed."""
+        with self.lock, self.db:
+            return self.db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def get_session(self, session_id: int) -> Optional[Dict]:
+        """A stored session with its full summary, or None."""
+        with self.lock:
+            row = self.db.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        session['summary'] = json.loads(session['summary']) if session['summary'] else None
+        return session
+
+    def list_sessions(self, patient_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                      limit: int = 100) -> List[Dict]:
+        """
+        A patient's sessions in a time range, newest first, without full summaries.
+
+        Args:
+            patient_id: Patient id
+            start: Earliest start time (epoch seconds), inclusive
+            end: Latest start time (epoch seconds), exclusive
+            limit: Maximum number of sessions
+
+        Returns:
+            List of session dictionaries
+        """
+        where, params = self._range(patient_id, start, end)
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, patient_id, started_at, exercise, source, duration, frame_count, accuracy, "
+                f"reps, sets, avg_rom, primary_joint FROM sessions WHERE {where} "
+                "ORDER BY started_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def trend(self, patient_id: str, name: str, field: str = 'mean', bucket: Optional[str] = 'week',
+              start: Optional[float] = None, end: Optional[float] = None) -> List[Dict]:
+        """
+        How a per-session value changed over time.
+
+        Args:
+            patient_id: Patient id
+            name: Joint or metric name from the summary statistics (e.g.
+                'left_knee', 'balance'), or 'session' for SESSION_FIELDS
+            field: Statistic of each session (STAT_FIELDS), or a session field
+                when name is 'session'
+            bucket: Group sessions by 'day', 'week', 'month' or 'year'; None
+                returns one point per session
+            start: Earliest session start (epoch seconds), inclusive
+            end: Latest session start (epoch seconds), exclusive
+
+        Returns:
+            Points in time order with period, start, sessions and the mean, min
+            and max of the field over the sessions in the period
+        """
+        if name == 'session':
+            if field not in SESSION_FIELDS:
+                raise ValueError(f"Unknown session field: {field}")
+            table, where, params = 'sessions', *self._range(patient_id, start, end)
+        else:
+            if field not in STAT_FIELDS:
+                raise ValueError(f"Unknown statistic: {field}")
+            where, params = self._range(patient_id, start, end)
+            table, where, params = 'session_stats', f"name = ? AND {where}", [name] + params
+        return self._aggregate(table, field, where, params, bucket, 'sessions')
+
+    def rep_trend(self, patient_id: str, field: str = 'rom', bucket: Optional[str] = 'week',
+                  start: Optional[float] = None, end: Optional[float] = None,
+                  primary_joint: Optional[str] = None) -> List[Dict]:
+        """
+        How a per-rep value changed over time.
+
+        Args:
+            patient_id: Patient id
+            field: Rep value (REP_FIELDS)
+            bucket: Group reps by 'day', 'week', 'month' or 'year'; None
+                returns one point per rep
+            start: Earliest rep start (epoch seconds), inclusive
+            end: Latest rep start (epoch seconds), exclusive
+            primary_joint: Only reps counted on this joint
+
+        Returns:
+            Points in time order with period, start, reps and the mean, min
+            and max of the field over the reps in the period
+        """
+        if field not in REP_FIELDS:
+            raise ValueError(f"Unknown rep field: {field}")
+        where, params = self._range(patient_id, start, end)
+        if primary_joint:
+            where, params = f"{where} AND primary_joint = ?", params + [primary_joint]
+        return self._aggregate('reps', field, where, params, bucket, 'reps')
+
+    def aggregate(self, patient_id: str, start: Optional[float] = None, end: Optional[float] = None) -> Dict:
+        """
+        Totals and averages over a patient's sessions and reps in a time range.
+
+        Returns:
+            Dictionary with session, rep and time totals, average accuracy and
+            rep range of motion, and the first and last session times
+        """
+        where, params = self._range(patient_id, start, end)
+        with self.lock:
+            sessions = self.db.execute(
+                "SELECT COUNT(*) AS sessions, TOTAL(duration) AS total_duration, TOTAL(reps) AS total_reps, "
+                "AVG(accuracy) AS avg_accuracy, MIN(started_at) AS first_session, "
+                f"MAX(started_at) AS last_session FROM sessions WHERE {where}", params).fetchone()
+            reps = self.db.execute(
+                "SELECT AVG(rom) AS avg_rom, MAX(rom) AS max_rom, AVG(duration) AS avg_rep_duration, "
+                f"AVG(symmetry) AS avg_symmetry FROM reps WHERE {where}", params).fetchone()
+
+        result = dict(sessions)
+        result['total_reps'] = int(result['total_reps'])
+        result.update(dict(reps))
+        return result
+
+    @staticmethod
+    def _range(patient_id: str, start: Optional[float], end: Optional[float]):
+        """WHERE clause and parameters selecting a patient's rows in a time range."""
+        clauses = ["patient_id = ?"]
+        params = [patient_id]
+        if start is not None:
+            clauses.append("started_at >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("started_at < ?")
+            params.append(end)
+        return " AND ".join(clauses), params
+
+    def _aggregate(self, table: str, field: str, where: str, params: List, bucket: Optional[str],
+                   count_name: str) -> List[Dict]:
+        """Group a field by time period, or list it per row when bucket is None."""
+        if bucket is None:
+            with self.lock:
+                rows = self.db.execute(
+                    f"SELECT started_at, {field} AS value FROM {table} "
+                    f"WHERE {where} AND {field} IS NOT NULL ORDER BY started_at", params).fetchall()
+            return [{'start': row['started_at'], 'value': row['value']} for row in rows]
+
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {BUCKETS[bucket]} AS period, "
+                f"MIN(started_at) AS start, COUNT(*) AS n, AVG({field}) AS mean, "
+                f"MIN({field}) AS min, MAX({field}) AS max FROM {table} "
+                f"WHERE {where} AND {field} IS NOT NULL GROUP BY period ORDER BY period", params).fetchall()
+        return [{'period': row['period'], 'start': row['start'], count_name: row['n'],
+                 'mean': row['mean'], 'min': row['min'], 'max': row['max']} for row in rows]
@@ -0,0 +1,265 @@
+"""
+Rep Counter - Streaming repetition counting and exercise-phase segmentation
+"""
+
+from collections import deque
+from typing import Dict, Optional
+
+from running_stats import JOINT_ANGLE_RANGE, RunningStats
+
+# States of the peak/valley detector
+SEEKING_VALLEY = 'eccentric'   # Joint is closing, waiting for the bottom of the rep
+SEEKING_PEAK = 'concentric'    # Joint is opening, waiting for the top of the rep
+
+
+class RepCounter:
+    """
+    Counts repetitions from a stream of joint angles in constant time and memory.
+
+    A repetition is peak -> valley -> peak on the primary joint angle, e.g. knee
+    extended -> bent -> extended for a squat. Turning points are confirmed with
+    hysteresis: a valley once the angle rises `hysteresis` degrees above the
+    running minimum, a peak once it falls that far below the running maximum.
+    A rep completes once the angle is back within `hysteresis` of its starting
+    peak, so the last rep of a set counts without waiting for another descent.
+    Only reps whose range of motion reaches `min_rom` are counted.
+    """
+
+    def __init__(self,
+                 primary_joint: str = 'left_knee',
+                 min_rom: float = 30.0,
+                 hysteresis: float = 10.0,
+                 smoothing: float = 0.5,
+                 set_rest_seconds: float = 10.0,
+                 recent_reps: int = 10):
+        """
+        Initialize the counter.
+
+        Args:
+            primary_joint: Joint angle that drives rep detection (a key of OpenPoseAnalyzer.angle_joints)
+            min_rom: Minimum range of motion in degrees for a rep to count
+            hysteresis: Degrees the angle must reverse before a turning point is confirmed
+            smoothing: Exponential smoothing factor for the angle (1.0 disables smoothing)
+            set_rest_seconds: Pause after which the next rep starts a new set
+            recent_reps: Number of most recent reps kept in detail
+        """
+        self.primary_joint = primary_joint
+        self.mirror_joint = self._mirror(primary_joint)
+        self.min_rom = min_rom
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing
+        self.set_rest_seconds = set_rest_seconds
+        self.recent = deque(maxlen=recent_reps)
+        self.reset()
+
+    @staticmethod
+    def _mirror(joint: str) -> Optional[str]:
+        if joint.startswith('left_'):
+            return 'right_' + joint[len('left_'):]
+        if joint.startswith('right_'):
+            return 'left_' + joint[len('right_'):]
+        return None
+
+    def reset(self) -> None:
+        """Clear all counts and detector state."""
+        self.angle = None
+        self.state = None
+        self.extreme = None
+        self.extreme_time = None
+        self.hold_time = None  # Last time the angle was within hysteresis of a peak
+
+        # Turning points of the rep in progress
+        self.peak_angle = None
+        self.peak_time = None
+        self.valley_angle = None
+        self.valley_time = None
+
+        # Mirror joint range within the rep in progress, for symmetry
+        self.mirror_min = None
+        self.mirror_max = None
+
+        # Aggregates
+        self.rep_count = 0
+        self.set_count = 0
+        self.reps_in_set = 0
+        self.reps_per_set = []
+        self.rom_stats = RunningStats(*JOINT_ANGLE_RANGE)
+        self.duration_sum = 0.0
+        self.symmetry_sum = 0.0
+        self.symmetry_count = 0
+        self.last_rep_time = None
+        self.recent.clear()
+
+    def update(self, joint_angles: Dict[str, float], timestamp: float) -> Optional[Dict]:
+        """
+        Feed the joint angles of one frame.
+
+        Args:
+            joint_angles: Dictionary of joint angles for the frame
+            timestamp: Frame time in seconds
+
+        Returns:
+            The completed rep if this frame finished one, otherwise None
+        """
+        raw = joint_angles.get(self.primary_joint)
+        if raw is None:
+            return None
+
+        if self.angle is None:
+            self.angle = raw
+        else:
+            self.angle += self.smoothing * (raw - self.angle)
+        angle = self.angle
+
+        mirror = joint_angles.get(self.mirror_joint) if self.mirror_joint else None
+        if mirror is not None:
+            self.mirror_min = mirror if self.mirror_min is None else min(self.mirror_min, mirror)
+            self.mirror_max = mirror if self.mirror_max is None else max(self.mirror_max, mirror)
+
+        if self.state is None:
+            # Wait for the first peak before counting
+            self.state = SEEKING_PEAK
+            self.extreme = angle
+            self.extreme_time = timestamp
+            self.hold_time = timestamp
+            return None
+
+        if self.state == SEEKING_PEAK:
+            if angle > self.extreme:
+                self.extreme = angle
+                self.extreme_time = timestamp
+            if angle >= self.extreme - self.hysteresis:
+                # Still at the top, e.g. resting between sets; the next rep starts
+                # when the joint leaves it
+                self.hold_time = timestamp
+
+            # The rep is complete as soon as the joint is back near its starting angle
+            if (self.valley_angle is not None and
+                    angle >= self.peak_angle - self.hysteresis):
+                rom = min(self.peak_angle, angle) - self.valley_angle
+                completed = self._record_rep(rom, angle, timestamp) if rom >= self.min_rom else None
+                self.valley_angle = None
+                return completed
+
+            if angle < self.extreme - self.hysteresis:
+                completed = self._on_peak(self.extreme, self.extreme_time, self.hold_time)
+                self.state = SEEKING_VALLEY
+                self.extreme = angle
+                self.extreme_time = timestamp
+                return completed
+        else:
+            if angle < self.extreme:
+                self.extreme = angle
+                self.extreme_time = timestamp
+            elif angle > self.extreme + self.hysteresis:
+                self.valley_angle = self.extreme
+                self.valley_time = self.extreme_time
+                self.state = SEEKING_PEAK
+                self.extreme = angle
+                self.extreme_time = timestamp
+                self.hold_time = timestamp
+
+        return None
+
+    def _on_peak(self, angle: float, timestamp: float, hold_time: float) -> Optional[Dict]:
+        """
+        Handle a confirmed peak, completing a rep if a valley preceded it and the
+        joint never got back near its starting angle.
+
+        Args:
+            angle: Peak angle
+            timestamp: Time the peak was first reached, which ends the previous rep
+            hold_time: Last time the angle was near the peak, which starts the next
+                rep, so a pause at the top belongs to neither
+        """
+        completed = None
+
+        if self.peak_angle is not None and self.valley_angle is not None:
+            rom = min(self.peak_angle, angle) - self.valley_angle
+            if rom >= self.min_rom:
+                completed = self._record_rep(rom, angle, timestamp)
+
+        # This peak starts the next rep
+        self.peak_angle = angle
+        self.peak_time = hold_time
+        self.valley_angle = None
+        self.valley_time = None
+        self.mirror_min = None
+        self.mirror_max = None
+        return completed
+
+    def _record_rep(self, rom: float, end_angle: float, end_time: float) -> Dict:
+        duration = end_time - self.peak_time
+        symmetry = None
+        if self.mirror_min is not None:
+            mirror_rom = self.mirror_max - self.mirror_min
+            largest = max(rom, mirror_rom)
+            symmetry = 1 - abs(rom - mirror_rom) / largest if largest > 0 else 1.0
+
+        # A long pause since the previous rep starts a new set
+        if self.last_rep_time is None or self.peak_time - self.last_rep_time > self.set_rest_seconds:
+            if self.reps_in_set:
+                self.reps_per_set.append(self.reps_in_set)
+            self.set_count += 1
+            self.reps_in_set = 0
+
+        self.rep_count += 1
+        self.reps_in_set += 1
+        self.rom_stats.update(rom)
+        self.duration_sum += duration
+        if symmetry is not None:
+            self.symmetry_sum += symmetry
+            self.symmetry_count += 1
+        self.last_rep_time = end_time
+
+        rep = {
+            'rep': self.rep_count,
+            'set': self.set_count,
+            'start': self.peak_time,
+            'end': end_time,
+            'duration': duration,
+            'eccentric_duration': self.valley_time - self.peak_time,
+            'concentric_duration': end_time - self.valley_time,
+            'rom': float(rom),
+            'min_angle': float(self.valley_angle),
+            'max_angle': float(max(self.peak_angle, end_angle)),
+            'symmetry': float(symmetry) if symmetry is not None else None
+        }
+        self.recent.append(rep)
+        return rep
+
+    def get_state(self) -> Dict:
+        """Live counts for the current session."""
+        if self.state is None or self.peak_angle is None:
+            phase = 'idle'
+        elif self.state == SEEKING_PEAK and self.valley_angle is None:
+            phase = 'top'
+        else:
+            phase = self.state
+
+        return {
+            'primary_joint': self.primary_joint,
+            'reps': self.rep_count,
+            'sets': self.set_count,
+            'reps_in_set': self.reps_in_set,
+            'phase': phase,
+            'angle': self.angle,
+            'last_rep': self.recent[-1] if self.recent else None
+        }
+
+    def get_summary(self) -> Dict:
+        """Aggregate rep statistics for the session."""
+        count = self.rep_count
+        reps_per_set = self.reps_per_set + ([self.reps_in_set] if self.reps_in_set else [])
+
+        return {
+            'primary_joint': self.primary_joint,
+            'reps': count,
+            'sets': self.set_count,
+            'reps_per_set': reps_per_set,
+            'avg_rom': self.rom_stats.mean if count else 0,
+            'rom': self.rom_stats.to_dict(),
+            'avg_duration': self.duration_sum / count if count else 0,
+            'avg_symmetry': self.symmetry_sum / self.symmetry_count if self.symmetry_count else None,
+            'recent_reps': list(self.recent)
+        }
@@ -0,0 +1,143 @@
+"""
+Running Stats - Constant-memory streaming statistics for long analysis sessions
+"""
+
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+SUMMARY_QUANTILES = (0.05, 0.5, 0.95)
+
+# Value ranges of the per-frame metrics. Values outside a range are counted
+# in the edge bins; min and max stay exact.
+JOINT_ANGLE_RANGE = (0.0, 180.0)
+METRIC_RANGES = {
+    'accuracy': (0.0, 100.0),
+    'symmetry': (0.0, 1.0),
+    'balance': (0.0, 1.0),
+    'movement_speed': (0.0, 0.5),
+    'fatigue': (0.0, 1.0)
+}
+
+
+class RunningStats:
+    """
+    Mean, variance, min/max and quantiles of a stream in O(1) time and memory.
+
+    Mean and variance use Welford's algorithm. Quantiles come from a fixed-bin
+    histogram over [low, high], linearly interpolated within a bin, so their
+    error is at most one bin width ((high - low) / bins).
+    """
+
+    __slots__ = ('low', 'high', 'bins', 'scale', 'counts', 'count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self, low: float, high: float, bins: int = 360):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.scale = bins / (high - low)
+        self.counts = [0] * bins
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value: float) -> None:
+        """Add one observation."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        index = int((value - self.low) * self.scale)
+        if index < 0:
+            index = 0
+        elif index >= self.bins:
+            index = self.bins - 1
+        self.counts[index] += 1
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-th quantile (0 <= q <= 1)."""
+        if not self.count:
+            return None
+
+        target = q * self.count
+        cumulative = 0
+        for index, bin_count in enumerate(self.counts):
+            if bin_count and cumulative + bin_count >= target:
+                fraction = (target - cumulative) / bin_count
+                value = self.low + (index + fraction) / self.scale
+                return float(min(max(value, self.min), self.max))
+            cumulative += bin_count
+        return float(self.max)
+
+    def to_dict(self, quantiles: Sequence[float] = SUMMARY_QUANTILES) -> Dict:
+        if not self.count:
+            return {'count': 0}
+
+        result = {
+            'count': self.count,
+            'mean': float(self.mean),
+            'std': math.sqrt(self.variance),
+            'min': float(self.min),
+            'max': float(self.max)
+        }
+        for q in quantiles:
+            result[f"p{q * 100:g}"] = self.quantile(q)
+        return result
+
+
+class SessionStats:
+    """Running statistics for every joint angle and per-frame metric of a session."""
+
+    def __init__(self,
+                 joint_range: Tuple[float, float] = JOINT_ANGLE_RANGE,
+                 metric_ranges: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.joint_range = joint_range
+        self.metric_ranges = metric_ranges if metric_ranges is not None else METRIC_RANGES
+        self.reset()
+
+    def reset(self) -> None:
+        self.joints = {}
+        self.metrics = {}
+
+    def update(self, joint_angles: Dict[str, float], metrics: Dict[str, float]) -> None:
+        """Add one frame's joint angles and metrics."""
+        for joint, angle in joint_angles.items():
+            stats = self.joints.get(joint)
+            if stats is None:
+                stats = self.joints[joint] = RunningStats(*self.joint_range)
+            stats.update(angle)
+
+        for name, value in metrics.items():
+            stats = self.metrics.get(name)
+            if stats is None:
+                stats = self.metrics[name] = RunningStats(*self.metric_ranges.get(name, (0.0, 1.0)))
+            stats.update(value)
+
+    def summary(self) -> Dict:
+        """
+        Summarize the session.
+
+        Each joint also reports its range of motion as p95 - p5, which ignores
+        isolated outlier frames.
+        """
+        joints = {}
+        for joint, stats in self.joints.items():
+            joints[joint] = stats.to_dict()
+            if stats.count:
+                joints[joint]['rom'] = joints[joint]['p95'] - joints[joint]['p5']
+
+        return {
+            'joints': joints,
+            'metrics': {name: stats.to_dict() for name, stats in self.metrics.items()}
+        }
@@ -0,0 +1,131 @@
+"""
+Serving - Helpers that keep the API responsive under threaded and gevent workers
+
+Under gunicorn's gevent worker (see gunicorn.conf.py) every connection is a
+greenlet, so idle streams and long polls cost almost nothing, but anything that
+holds the GIL in C code (pose inference, video decoding, JPEG encoding) would
+stall every other connection of the process. offload() and start_background()
+move that work to native threads in cooperative mode and are plain calls and
+threads otherwise.
+"""
+
+import threading
+from typing import Callable, Optional, Tuple
+
+# Native threads for long background jobs in cooperative mode. They are kept
+# apart from the hub pool that offload() uses for per-frame work, so a few
+# uploads cannot take every thread and freeze the live streams.
+_job_threads = 2
+_job_pool = None
+
+
+def is_cooperative() -> bool:
+    """Whether threading has been monkey-patched by gevent."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def configure_threadpool(size: int, job_threads: int = 2) -> None:
+    """
+    Size the native thread pools used in cooperative mode.
+
+    Args:
+        size: Threads running offloaded per-frame work (offload)
+        job_threads: Threads running background jobs (start_background); more
+            jobs wait for a free thread
+    """
+    global _job_threads
+
+    _job_threads = job_threads
+    if _job_pool is not None:
+        _job_pool.maxsize = job_threads
+    if is_cooperative():
+        import gevent
+        gevent.get_hub().threadpool.maxsize = size
+
+
+def offload(func: Callable, *args, **kwargs):
+    """
+    Call a CPU-bound or blocking function without stalling other connections.
+
+    In cooperative mode the call runs on gevent's native thread pool while the
+    calling greenlet yields; otherwise it runs inline.
+    """
+    if is_cooperative():
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+
+def start_background(func: Callable, *args) -> None:
+    """
+    Run a long job, such as analyzing an uploaded video, on a native thread.
+
+    In cooperative mode jobs run on their own pool of configure_threadpool()'s
+    job_threads threads, never on the one offload() uses.
+    """
+    global _job_pool
+
+    if is_cooperative():
+        if _job_pool is None:
+            from gevent.threadpool import ThreadPool
+            _job_pool = ThreadPool(_job_threads)
+        _job_pool.spawn(func, *args)
+    else:
+        threading.Thread(target=func, args=args, daemon=True).start()
+
+
+class FrameBroadcaster:
+    """
+    Fan-out of the latest frame from one producer to any number of viewers.
+
+    Viewers always receive the newest frame, so a slow viewer skips frames
+    instead of delaying the producer or other viewers.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.sequence = 0
+        self.timestamp = None
+        self.closed = True
+
+    def open(self) -> None:
+        with self.condition:
+            self.closed = False
+
+    def close(self) -> None:
+        """Wake every waiting viewer and mark the stream as finished."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def publish(self, frame: bytes, timestamp: Optional[float] = None) -> None:
+        """Replace the latest frame; timestamp is when it was captured (epoch seconds)."""
+        with self.condition:
+            self.frame = frame
+            self.timestamp = timestamp
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def wait(self, after: int, timeout: float) -> Tuple[int, Optional[bytes]]:
+        """
+        Wait for a frame newer than `after`.
+
+        Args:
+            after: Sequence number of the last frame the caller has seen
+            timeout: Seconds to wait
+
+        Returns:
+            Tuple of the latest sequence number and its frame, or None as the
+            frame if nothing newer arrived before the timeout or close()
+        """
+        with self.condition:
+            if self.sequence <= after:
+                self.condition.wait(timeout)
+            if self.sequence <= after:
+                return self.sequence, None
+            return self.sequence, self.frame
@@ -0,0 +1,285 @@
+"""
+Telemetry - Lightweight Prometheus-style metrics for the pose analyzer
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond metric code up to inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _NullTimer:
+    """Timer used when metrics are disabled; does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Context manager that observes its elapsed time on a histogram."""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: 'Histogram'):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """
+    Collection of metrics rendered together in the Prometheus text format.
+
+    When disabled, every update returns immediately so instrumented code
+    costs a single attribute check.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def register(self, metric: '_Metric') -> None:
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for labels, child in metric.samples():
+                lines.extend(child.render(metric.name, labels))
+        return "\n".join(lines) + "\n"
+
+
+class _Metric:
+    """Base class for metrics with optional labels."""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry if registry is not None else REGISTRY
+        self._children = {}
+        self._lock = threading.Lock()
+        self._init_state()
+        self.registry.register(self)
+
+    def _init_state(self) -> None:
+        pass
+
+    def labels(self, *values: str) -> '_Metric':
+        """Return the child metric for the given label values."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    child._init_state()
+                    self._children[values] = child
+        return child
+
+    def _new_child(self) -> '_Metric':
+        child = type(self).__new__(type(self))
+        child.registry = self.registry
+        child._lock = threading.Lock()
+        return child
+
+    def samples(self) -> List[Tuple[Dict[str, str], '_Metric']]:
+        if not self.labelnames:
+            return [({}, self)]
+        return [(dict(zip(self.labelnames, values)), child)
+                for values, child in sorted(self._children.items())]
+
+    @staticmethod
+    def _format_labels(labels: Dict[str, str]) -> str:
+        if not labels:
+            return ''
+        pairs = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        return '{' + pairs + '}'
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    metric_type = 'counter'
+
+    def _init_state(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+    def render(self, name: str, labels: Dict[str, str]) -> List[str]:
+        return [f"{name}{self._format_labels(labels)} {self.value}"]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, such as active sessions."""
+
+    metric_type = 'gauge'
+
+    def _init_state(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        if not self.registry.enabled:
+            return
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def render(self, name: str, labels: Dict[str, str]) -> List[str]:
+        return [f"{name}{self._format_labels(labels)} {self.value}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed cumulative buckets."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> 'Histogram':
+        child = super()._new_child()
+        child.buckets = self.buckets
+        return child
+
+    def _init_state(self) -> None:
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        if not self.registry.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Return a context manager that observes the duration of its block."""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self)
+
+    def render(self, name: str, labels: Dict[str, str]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{name}_bucket{self._format_labels({**labels, 'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{self._format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{self._format_labels(labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = Registry(enabled=os.environ.get('OPENPOSE_METRICS', '1').lower() not in ('0', 'false', 'no'))
+
+# Per-frame pipeline
+STAGE_SECONDS = Histogram('openpose_stage_seconds',
+                          'Time spent in each stage of the per-frame pipeline',
+                          ['stage'])
+FRAME_SECONDS = Histogram('openpose_frame_seconds',
+                          'Total time spent in analyze_frame')
+FRAMES_ANALYZED = Counter('openpose_frames_analyzed_total',
+                          'Frames passed through pose analysis')
+DETECTIONS = Counter('openpose_detections_total',
+                     'Frames in which pose inference detected a pose; frames reused by the motion gate are not counted')
+FRAMES_REUSED = Counter('openpose_frames_reused_total',
+                        'Frames the motion gate found unchanged, answered with the previous result')
+FRAMES_DROPPED = Counter('openpose_frames_dropped_total',
+                         'Frames that could not be read from their source',
+                         ['source'])
+ANALYSIS_ACTIVE = Gauge('openpose_analysis_active',
+                        'Whether an analysis session is running (1) or not (0)')
+INFERENCE_QUEUE_DEPTH = Gauge('openpose_inference_queue_depth',
+                              'Frames submitted to inference worker processes whose results are pending')
+
+# Live streaming
+STREAM_FRAMES = Counter('openpose_stream_frames_total',
+                        'Frames delivered to webcam stream viewers')
+ACTIVE_STREAMS = Gauge('openpose_active_streams',
+                       'Open /api/webcam_stream responses')
+
+# Offline video jobs
+VIDEO_JOBS = Counter('openpose_video_jobs_total',
+                     'Finished video analysis jobs',
+                     ['status'])
+ACTIVE_VIDEO_JOBS = Gauge('openpose_video_jobs_active',
+                          'Video analysis jobs currently running')
+VIDEO_JOB_SECONDS = Histogram('openpose_video_job_seconds',
+                              'Wall-clock duration of video analysis jobs',
+                              buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+
+COLOR_CONVERSION_SECONDS = STAGE_SECONDS.labels('color_conversion')
+INFERENCE_SECONDS = STAGE_SECONDS.labels('inference')
+METRICS_SECONDS = STAGE_SECONDS.labels('metrics')
+FEEDBACK_SECONDS = STAGE_SECONDS.labels('feedback')
+DRAWING_SECONDS = STAGE_SECONDS.labels('drawing')
+ENCODE_SECONDS = STAGE_SECONDS.labels('encode')
+MOTION_GATE_SECONDS = STAGE_SECONDS.labels('motion_gate')
+
+# Stages of analyze_frame that inference worker processes time and send back
+# with each result, so they appear in the API process's /metrics
+FRAME_STAGES = ('motion_gate', 'color_conversion', 'inference', 'metrics', 'feedback', 'drawing')
+_FRAME_HISTOGRAMS = [STAGE_SECONDS.labels(stage) for stage in FRAME_STAGES] + [FRAME_SECONDS]
+
+
+def frame_timings() -> List[Tuple[int, float]]:
+    """Snapshot of the observation count and total of each FRAME_STAGES histogram and FRAME_SECONDS."""
+    return [(sum(histogram.counts), histogram.sum) for histogram in _FRAME_HISTOGRAMS]
+
+
+def frame_timings_since(snapshot: List[Tuple[int, float]]) -> List[float]:
+    """
+    Seconds spent in each of FRAME_STAGES, then in all of analyze_frame, since a snapshot.
+
+    Stages that did not run, or all of them with metrics disabled, are NaN.
+    """
+    return [histogram.sum - total if sum(histogram.counts) > count else float('nan')
+            for histogram, (count, total) in zip(_FRAME_HISTOGRAMS, snapshot)]
+
+
+def observe_frame_timings(timings: Sequence[float]) -> None:
+    """Record timings measured in another process with frame_timings_since()."""
+    for histogram, seconds in zip(_FRAME_HISTOGRAMS, timings):
+        if seconds == seconds:
+            histogram.observe(seconds)
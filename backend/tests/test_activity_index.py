@@ -0,0 +1,79 @@
+"""
+Tests for the activity_index KD-tree against brute-force nearest neighbours.
+"""
+
+import numpy as np
+import pytest
+
+from activity_index import ActivityIndex, build_kdtree
+
+
+def make_index(size=2000, features=24, dimensions=8, leaf_size=16, seed=0):
+    """An index over clustered random embeddings with three labels."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0.0, 1.0, (3, features))
+    label_ids = rng.integers(0, 3, size)
+    embeddings = centres[label_ids] + rng.normal(0.0, 0.3, (size, features))
+    labels = [f"exercise_{label}" for label in label_ids]
+    return ActivityIndex.build(embeddings, labels, dimensions, leaf_size), rng
+
+
+def brute_force_query(index, embedding, k):
+    """Squared distances and label ids of the k nearest indexed points."""
+    target = index.project(embedding).astype(np.float32)
+    distances = np.sum((index.points - target) ** 2, axis=1)
+    nearest = np.argsort(distances, kind='stable')[:k]
+    return distances[nearest], index.point_labels[nearest]
+
+
+@pytest.mark.parametrize('k', [1, 5, 40])
+def test_query_matches_brute_force(k):
+    index, rng = make_index()
+
+    for _ in range(50):
+        embedding = rng.normal(0.0, 1.0, 24)
+        distances, labels = index.query(embedding, k)
+        expected_distances, expected_labels = brute_force_query(index, embedding, k)
+
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-5)
+        np.testing.assert_array_equal(labels, expected_labels)
+
+
+def test_query_of_an_indexed_point_finds_it_first():
+    index, _ = make_index(size=500)
+    embedding = index.points[123] @ index.components + index.mean
+
+    distances, labels = index.query(embedding, 3)
+
+    assert distances[0] == pytest.approx(0.0, abs=1e-6)
+    assert labels[0] == index.point_labels[123]
+
+
+def test_saved_index_answers_like_the_original(tmp_path):
+    index, rng = make_index(size=500)
+    index.save(str(tmp_path))
+    loaded = ActivityIndex.load(str(tmp_path))
+
+    assert loaded.labels == index.labels
+    for _ in range(10):
+        embedding = rng.normal(0.0, 1.0, 24)
+        for original, reloaded in zip(index.query(embedding), loaded.query(embedding)):
+            np.testing.assert_array_equal(original, reloaded)
+
+
+def test_kdtree_partitions_every_point_once():
+    points = np.random.default_rng(0).normal(0.0, 1.0, (1000, 4)).astype(np.float32)
+    order, nodes, splits = build_kdtree(points, leaf_size=8)
+
+    assert sorted(order.tolist()) == list(range(len(points)))
+    leaves = nodes[nodes[:, 2] < 0]
+    assert leaves[:, 1].max() == len(points)
+    assert np.all(leaves[:, 1] - leaves[:, 0] <= 8)
+    assert sum(leaves[:, 1] - leaves[:, 0]) == len(points)
+
+    # Every point left of a split is at most the split value, every point right at least
+    ordered = points[order]
+    for (start, end, left, right, dim), split in zip(nodes, splits):
+        if left >= 0:
+            assert ordered[nodes[left][0]:nodes[left][1], dim].max() <= split
+            assert ordered[nodes[right][0]:nodes[right][1], dim].min() >= split
@@ -0,0 +1,79 @@
+"""
+Tests for the banded DTW and LB_Keogh bound in motion_templates against brute force.
+"""
+
+import numpy as np
+import pytest
+
+from motion_templates import dtw_distance, envelope, lb_keogh, resample
+
+
+def brute_force_dtw(query, template, radius):
+    """Textbook O(n^2) DTW over cells with |i - j| <= radius."""
+    n = len(query)
+    acc = np.full((n + 1, n + 1), np.inf)
+    acc[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(max(1, i - radius), min(n, i + radius) + 1):
+            cost = np.sum((query[i - 1] - template[j - 1]) ** 2)
+            acc[i, j] = cost + min(acc[i - 1, j - 1], acc[i - 1, j], acc[i, j - 1])
+    return acc[n, n]
+
+
+def random_pairs(count, length=24, joints=3, seed=0):
+    """Pairs of random-walk trajectories, like joint angles over a rep."""
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        yield (np.cumsum(rng.normal(0.0, 5.0, (length, joints)), axis=0),
+               np.cumsum(rng.normal(0.0, 5.0, (length, joints)), axis=0))
+
+
+@pytest.mark.parametrize('radius', [0, 1, 2, 5, 23])
+def test_dtw_matches_brute_force(radius):
+    for query, template in random_pairs(10, seed=radius):
+        assert dtw_distance(query, template, radius) == pytest.approx(brute_force_dtw(query, template, radius))
+
+
+def test_dtw_of_identical_trajectories_is_zero():
+    query, _ = next(random_pairs(1))
+    assert dtw_distance(query, query, 3) == 0.0
+
+
+def test_dtw_cutoff_only_abandons_costs_above_it():
+    for query, template in random_pairs(20, seed=1):
+        exact = brute_force_dtw(query, template, 3)
+        assert dtw_distance(query, template, 3, cutoff=exact * 1.01) == pytest.approx(exact)
+        assert dtw_distance(query, template, 3, cutoff=exact * 0.99) > exact * 0.99
+
+
+def test_envelope_matches_brute_force():
+    trajectory, _ = next(random_pairs(1))
+    radius = 3
+    upper, lower = envelope(trajectory, radius)
+
+    for i in range(len(trajectory)):
+        window = trajectory[max(0, i - radius):i + radius + 1]
+        np.testing.assert_array_equal(upper[i], window.max(axis=0))
+        np.testing.assert_array_equal(lower[i], window.min(axis=0))
+
+
+@pytest.mark.parametrize('radius', [0, 2, 5])
+def test_lb_keogh_is_a_lower_bound_of_dtw(radius):
+    for query, template in random_pairs(50, seed=radius):
+        bound = lb_keogh(query, *envelope(template, radius))
+        assert bound <= brute_force_dtw(query, template, radius) + 1e-9
+
+
+def test_lb_keogh_is_zero_inside_the_envelope():
+    template, _ = next(random_pairs(1))
+    upper, lower = envelope(template, 2)
+    assert lb_keogh((upper + lower) / 2, upper, lower) == 0.0
+
+
+def test_resample_keeps_end_points_and_shape():
+    trajectory = np.array([[0.0, 10.0], [10.0, 20.0], [20.0, 40.0]])
+    resampled = resample(trajectory, 5)
+
+    assert resampled.shape == (5, 2)
+    np.testing.assert_allclose(resampled[:, 0], [0.0, 5.0, 10.0, 15.0, 20.0])
+    np.testing.assert_allclose(resampled[[0, -1], 1], [10.0, 40.0])
@@ -0,0 +1,165 @@
+"""
+Tests for progress_store.ProgressStore: trend bucketing and input validation.
+"""
+
+import calendar
+
+import pytest
+
+from progress_store import ProgressStore
+
+
+def epoch(year, month, day, hour=12):
+    """Epoch seconds of a UTC time."""
+    return float(calendar.timegm((year, month, day, hour, 0, 0)))
+
+
+def make_summary(knee_mean, reps=3, duration=60.0):
+    """A minimal analyzer summary with left knee statistics."""
+    return {
+        'duration': duration,
+        'frame_count': 1800,
+        'accuracy': 0.9,
+        'repetitions': {'primary_joint': 'left_knee', 'reps': reps, 'sets': 1, 'avg_rom': 80.0},
+        'statistics': {
+            'joints': {'left_knee': {'count': 1800, 'mean': knee_mean, 'std': 5.0, 'min': knee_mean - 40,
+                                     'max': knee_mean + 40, 'p5': knee_mean - 30, 'p50': knee_mean,
+                                     'p95': knee_mean + 30, 'rom': 80.0}},
+            'metrics': {'balance': {'count': 0}}
+        }
+    }
+
+
+def make_rep(start, rom):
+    return {'rep': 1, 'set': 1, 'start': start, 'duration': 2.0, 'rom': rom, 'min_angle': 90.0,
+            'max_angle': 90.0 + rom, 'symmetry': 0.95, 'eccentric_duration': 1.0, 'concentric_duration': 1.0}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProgressStore(str(tmp_path / 'progress.sqlite3'))
+    yield store
+    store.close()
+
+
+def test_week_spanning_new_year_is_one_period(store):
+    # Monday 29 December 2025 to Sunday 4 January 2026, then Monday 5 January
+    store.add_session('p1', make_summary(100.0), started_at=epoch(2025, 12, 29))
+    store.add_session('p1', make_summary(110.0), started_at=epoch(2026, 1, 1))
+    store.add_session('p1', make_summary(120.0), started_at=epoch(2026, 1, 4, hour=23))
+    store.add_session('p1', make_summary(130.0), started_at=epoch(2026, 1, 5, hour=0))
+
+    points = store.trend('p1', 'left_knee', 'mean', 'week')
+
+    assert [point['period'] for point in points] == ['2025-12-29', '2026-01-05']
+    assert [point['sessions'] for point in points] == [3, 1]
+    assert points[0]['mean'] == pytest.approx(110.0)
+    assert (points[0]['min'], points[0]['max']) == (100.0, 120.0)
+    assert points[0]['start'] == epoch(2025, 12, 29)
+
+
+@pytest.mark.parametrize('bucket, periods', [
+    ('day', ['2025-12-31', '2026-01-01', '2026-02-01']),
+    ('month', ['2025-12', '2026-01', '2026-02']),
+    ('year', ['2025', '2026']),
+])
+def test_calendar_buckets(store, bucket, periods):
+    for when in (epoch(2025, 12, 31), epoch(2026, 1, 1), epoch(2026, 2, 1)):
+        store.add_session('p1', make_summary(100.0), started_at=when)
+
+    assert [point['period'] for point in store.trend('p1', 'session', 'reps', bucket)] == periods
+
+
+def test_trend_without_bucket_lists_sessions_in_time_order(store):
+    store.add_session('p1', make_summary(120.0), started_at=epoch(2026, 3, 2))
+    store.add_session('p1', make_summary(100.0), started_at=epoch(2026, 3, 1))
+    store.add_session('p2', make_summary(90.0), started_at=epoch(2026, 3, 1))
+
+    points = store.trend('p1', 'left_knee', 'mean', None)
+
+    assert points == [{'start': epoch(2026, 3, 1), 'value': 100.0},
+                      {'start': epoch(2026, 3, 2), 'value': 120.0}]
+
+
+def test_trend_range_is_start_inclusive_end_exclusive(store):
+    for day in (1, 2, 3):
+        store.add_session('p1', make_summary(100.0 + day), started_at=epoch(2026, 3, day))
+
+    points = store.trend('p1', 'left_knee', 'mean', None, start=epoch(2026, 3, 2), end=epoch(2026, 3, 3))
+
+    assert [point['value'] for point in points] == [102.0]
+
+
+def test_empty_statistics_are_not_trended(store):
+    store.add_session('p1', make_summary(100.0), started_at=epoch(2026, 3, 1))
+
+    assert store.trend('p1', 'balance', 'mean', 'week') == []
+
+
+def test_rep_trend_buckets_reps_by_their_own_start(store):
+    # The second rep starts after midnight, so it belongs to the next week
+    started_at = epoch(2026, 1, 4, hour=23)
+    store.add_session('p1', make_summary(100.0), [make_rep(0.0, 70.0), make_rep(7200.0, 90.0)],
+                      started_at=started_at)
+
+    points = store.rep_trend('p1', 'rom', 'week')
+
+    assert [(point['period'], point['reps'], point['mean']) for point in points] == [
+        ('2025-12-29', 1, 70.0), ('2026-01-05', 1, 90.0)]
+    assert store.rep_trend('p1', 'rom', 'week', primary_joint='right_knee') == []
+
+
+def test_aggregate_and_delete(store):
+    first = store.add_session('p1', make_summary(100.0, reps=2), [make_rep(0.0, 60.0)], started_at=epoch(2026, 3, 1))
+    store.add_session('p1', make_summary(100.0, reps=4), [make_rep(0.0, 80.0)], started_at=epoch(2026, 3, 2))
+
+    progress = store.aggregate('p1')
+    assert (progress['sessions'], progress['total_reps']) == (2, 6)
+    assert progress['avg_rom'] == pytest.approx(70.0)
+
+    assert store.delete_session(first)
+    assert not store.delete_session(first)
+    assert store.get_session(first) is None
+    assert store.aggregate('p1')['avg_rom'] == pytest.approx(80.0)
+    assert [point['value'] for point in store.trend('p1', 'left_knee', 'mean', None)] == [100.0]
+
+
+def test_get_session_returns_the_full_summary(store):
+    session_id = store.add_session('p1', make_summary(100.0), started_at=epoch(2026, 3, 1),
+                                   exercise='squat', source='live')
+
+    session = store.get_session(session_id)
+
+    assert (session['exercise'], session['source'], session['reps']) == ('squat', 'live', 3)
+    assert session['summary'] == make_summary(100.0)
+
+
+@pytest.mark.parametrize('patient_id, summary, reps', [
+    ('', make_summary(100.0), None),
+    ('p1', [], None),
+    ('p1', {'duration': '60'}, None),
+    ('p1', {'accuracy': True}, None),
+    ('p1', {'repetitions': {'reps': '3'}}, None),
+    ('p1', {'statistics': {'joints': []}}, None),
+    ('p1', {'statistics': {'joints': {'left_knee': {'mean': 'high'}}}}, None),
+    ('p1', make_summary(100.0), {'rom': 80.0}),
+    ('p1', make_summary(100.0), ['rep']),
+    ('p1', make_summary(100.0), [{'rom': '80'}]),
+    ('p1', make_summary(100.0), [{'template': 3}]),
+])
+def test_malformed_sessions_are_rejected_and_not_stored(store, patient_id, summary, reps):
+    with pytest.raises(ValueError):
+        store.add_session(patient_id, summary, reps, started_at=epoch(2026, 3, 1))
+
+    assert store.list_sessions('p1') == []
+
+
+@pytest.mark.parametrize('call', [
+    lambda store: store.trend('p1', 'left_knee', 'median'),
+    lambda store: store.trend('p1', 'session', 'mean'),
+    lambda store: store.trend('p1', 'left_knee', 'mean', 'fortnight'),
+    lambda store: store.rep_trend('p1', 'summary'),
+])
+def test_unknown_fields_and_buckets_are_rejected(store, call):
+    with pytest.raises(ValueError):
+        call(store)
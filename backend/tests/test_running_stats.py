@@ -0,0 +1,52 @@
+"""
+Tests for running_stats.RunningStats against exact numpy statistics.
+"""
+
+import numpy as np
+import pytest
+
+from running_stats import RunningStats, SessionStats
+
+
+def test_moments_and_quantiles_match_numpy():
+    values = np.random.default_rng(0).normal(100.0, 20.0, 5000)
+    stats = RunningStats(0.0, 180.0)
+    for value in values:
+        stats.update(float(value))
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.variance == pytest.approx(values.var(ddof=1))
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+    bin_width = 180.0 / stats.bins
+    for q in (0.05, 0.5, 0.95):
+        assert abs(stats.quantile(q) - np.quantile(values, q)) <= bin_width
+
+
+def test_values_outside_the_range_keep_exact_extremes():
+    stats = RunningStats(0.0, 1.0, bins=10)
+    for value in (-5.0, 0.5, 7.0):
+        stats.update(value)
+
+    # Out-of-range values fall in the edge bins, so quantiles stay within the range
+    assert (stats.min, stats.max) == (-5.0, 7.0)
+    assert stats.quantile(0.0) == 0.0
+    assert stats.quantile(1.0) == 1.0
+
+
+def test_empty_stats():
+    stats = RunningStats(0.0, 1.0)
+
+    assert stats.quantile(0.5) is None
+    assert stats.to_dict() == {'count': 0}
+
+
+def test_session_summary_reports_range_of_motion():
+    session = SessionStats()
+    for angle in np.linspace(90.0, 170.0, 1001):
+        session.update({'left_knee': float(angle)}, {'balance': 0.5})
+
+    knee = session.summary()['joints']['left_knee']
+    assert knee['rom'] == pytest.approx(knee['p95'] - knee['p5'])
+    assert knee['rom'] == pytest.approx(72.0, abs=1.0)